@@ -0,0 +1,101 @@
+"""Compare camel_case_to_snake_case and the typed builders with the previous converter on ongoing payloads.
+
+    python -m benchmarks.bench_camel_case [--orders 10000] [--lines 3] [--repeat 5]
+
+Orders are shaped like the ones the fake Ongoing service returns. For every case it prints the best time over
+--repeat runs, the memory held by the result, measured with tracemalloc in a separate run, and the number of keys
+converted. The previous converter left the order lines, a list of dicts, as they were, so it converts fewer keys.
+"""
+import argparse
+import re
+import time
+import tracemalloc
+from typing import Callable, List
+
+from benchmarks.fakes import FakeServiceConfig, make_order
+from wms.common.utility import camel_case_to_snake_case
+from wms.ongoing.interface import OngoingReturnOrder
+from wms.ongoing.utility import parse_order
+
+
+def legacy_camel_case_to_snake_case(camel_case_object):
+    # the converter as it was: compiled per string, dicts in lists converted but strings in lists dropped
+    if isinstance(camel_case_object, str):
+        pattern = re.compile(r'(?<!^)(?=[A-Z])')
+        return pattern.sub('_', camel_case_object).lower()
+
+    if isinstance(camel_case_object, dict):
+        snake_case: dict = {}
+        for k, v in camel_case_object.items():
+            v = legacy_camel_case_to_snake_case(v) if isinstance(v, dict) else v
+            snake_case[legacy_camel_case_to_snake_case(k)] = v
+        return snake_case
+
+    if isinstance(camel_case_object, list):
+        return [legacy_camel_case_to_snake_case(camel_case_entry) for camel_case_entry in camel_case_object if
+                not isinstance(camel_case_entry, str)]
+
+    return camel_case_object
+
+
+def make_return_order_webhook(return_order_id: int) -> dict:
+    return {"returnOrderId": return_order_id, "returnOrderNumber": f"R{return_order_id}",
+            "returnOrderLine": {"returnOrderLineId": return_order_id * 10, "returnOrderRowNumber": "1"},
+            "customerOrderInfo": {"orderId": return_order_id, "orderNumber": str(return_order_id)}}
+
+
+def count_snake_case_keys(value) -> int:
+    if isinstance(value, dict):
+        return sum(("_" in key) + count_snake_case_keys(entry) for key, entry in value.items())
+    if isinstance(value, list):
+        return sum(count_snake_case_keys(entry) for entry in value)
+    return 0
+
+
+def measure(convert: Callable, payloads: List[dict], repeat: int):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for payload in payloads:
+            convert(payload)
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    results = [convert(payload) for payload in payloads]
+    held, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, held, sum(count_snake_case_keys(result) for result in results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=10000)
+    parser.add_argument("--lines", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    config = FakeServiceConfig(lines_per_order=args.lines)
+    orders = [make_order(order_id, config) for order_id in range(1, args.orders + 1)]
+    return_orders = [make_return_order_webhook(order_id) for order_id in range(1, args.orders + 1)]
+
+    cases = [
+        ("orders to snake case dicts, previous", legacy_camel_case_to_snake_case, orders),
+        ("orders to snake case dicts, current", camel_case_to_snake_case, orders),
+        ("orders to Order, parse_order", parse_order, orders),
+        ("return orders, OngoingReturnOrder by hand",
+         lambda return_order: OngoingReturnOrder(return_order["returnOrderId"], return_order["returnOrderNumber"],
+                                                 return_order["returnOrderLine"]), return_orders),
+        ("return orders, into=OngoingReturnOrder",
+         lambda return_order: camel_case_to_snake_case(return_order, into=OngoingReturnOrder), return_orders),
+    ]
+
+    print(f"{args.orders:,} orders of {args.lines} lines")
+    print(f"{'case':<42} {'ms':>9} {'us/order':>9} {'held MB':>8} {'snake keys':>11}")
+    for name, convert, payloads in cases:
+        seconds, held, keys = measure(convert, payloads, args.repeat)
+        print(f"{name:<42} {seconds * 1000:>9.1f} {seconds / len(payloads) * 10 ** 6:>9.2f} {held / 2 ** 20:>8.1f} "
+              f"{keys:>11,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Measure the import cost a cold lambda container pays before each sqs handler can run.
+
+    python -m benchmarks.bench_cold_start [--runs 5] [--top 10]
+
+Every handler is imported in a fresh interpreter (like a cold start), ``--runs`` times. The median wall time of
+the import is reported per handler, followed by the modules with the highest cumulative import time according
+to ``python -X importtime``.
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ZAPPA_SETTINGS = os.path.join(ROOT, "github_action_zappa_settings.json")
+
+IMPORT_HANDLER = """
+import importlib, time
+start = time.perf_counter()
+module_name, _, function_name = {handler!r}.rpartition(".")
+getattr(importlib.import_module(module_name), function_name)
+print(time.perf_counter() - start)
+"""
+
+IMPORT_TIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s+)(\S+)")
+
+
+def get_sqs_handlers() -> List[str]:
+    with open(ZAPPA_SETTINGS) as settings_file:
+        settings: dict = json.load(settings_file)
+
+    handlers = {event["function"] for stage in settings.values() for event in stage.get("events", [])}
+    handlers.add("wms.ongoing.controller.ongoing_return_on_delivery_order_webhook")
+    return sorted(handlers)
+
+
+def import_handler(handler: str) -> Tuple[float, Dict[str, int]]:
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", IMPORT_HANDLER.format(handler=handler)],
+                            cwd=ROOT, capture_output=True, text=True)
+    if result.returncode:
+        raise RuntimeError(f"Importing {handler} failed:\n{result.stderr[-2000:]}")
+
+    cumulative_us: Dict[str, int] = {}
+    for match in IMPORT_TIME_LINE.finditer(result.stderr):
+        cumulative_us[match.group(4)] = int(match.group(2))
+    return float(result.stdout.strip().splitlines()[-1]), cumulative_us
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("handlers", nargs="*", help="dotted handler paths, defaults to the zappa sqs events")
+    args = parser.parse_args()
+
+    for handler in args.handlers or get_sqs_handlers():
+        timings, cumulative_us = [], {}
+        for _ in range(args.runs):
+            seconds, cumulative_us = import_handler(handler)
+            timings.append(seconds)
+
+        print(f"{handler}: median {statistics.median(timings) * 1000:.1f} ms "
+              f"(min {min(timings) * 1000:.1f} ms, max {max(timings) * 1000:.1f} ms, {len(cumulative_us)} modules)")
+        top_modules = sorted(cumulative_us.items(), key=lambda item: item[1], reverse=True)[:args.top]
+        for module_name, microseconds in top_modules:
+            print(f"    {microseconds / 1000:>8.1f} ms  {module_name}")
+
+
+if __name__ == "__main__":
+    main()
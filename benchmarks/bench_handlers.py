@@ -0,0 +1,176 @@
+"""Offline throughput benchmark of the sqs handlers against local Ongoing/RPLATFORM stand-ins.
+
+    python -m benchmarks.bench_handlers --handler ongoing_return_order_webhook --batches 50 --batch-size 10
+
+The handler runs through ``process_sqs_messages_return_batch_failures`` exactly as on lambda, with a SQLite
+database standing in for the ymodel integration tables and synthetic sqs events. It reports messages/sec,
+p50/p99 batch latency, peak RSS and the average stage timings and counters of a batch. ``--output`` also
+writes them as json, tagged with the git commit, so runs of different commits can be compared.
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from typing import Dict, List
+
+from benchmarks.fakes import FakeServiceConfig, start_fake_services
+
+HANDLERS = ("return_request_queue_listener", "ongoing_return_order_webhook",
+            "ongoing_return_on_delivery_order_webhook")
+
+
+def build_message(handler: str, retailer_id: int, config: FakeServiceConfig) -> dict:
+    order_id = random.randint(1, config.orders_per_day)
+    if handler == "return_request_queue_listener":
+        return {"retailer_id": retailer_id, "ext_internal_order_id": str(order_id),
+                "order_date": "2022-03-24T12:00:00"}
+
+    if handler == "ongoing_return_order_webhook":
+        return {"goodsOwnerId": retailer_id + 1000,
+                "returnOrder": {"returnOrderId": order_id, "returnOrderNumber": f"R{order_id}",
+                                "returnOrderLine": {"returnOrderLineId": 1, "returnOrderRowNumber": "1"}},
+                "customerOrderInfo": {"orderId": order_id, "orderNumber": str(order_id)}}
+
+    return {"article": {"articleSystemId": 21305, "articleNumber": "107 01 04 6", "barCode": "7350126330172"},
+            "articleItem": {"articleItemId": 177357, "numberOfItems": 1},
+            "order": {"orderId": order_id, "orderNumber": str(order_id),
+                      "orderLine": {"orderLineId": order_id * 1000, "rowNumber": f"{order_id}000"}},
+            "webhookPickingId": 1, "webhookEventId": random.randint(1, 10 ** 9), "goodsOwnerId": retailer_id + 1000,
+            "timestamp": "2022-03-24T11:35:29.9324850Z", "isReturned": True, "isDeleted": False}
+
+
+def build_event(handler: str, batch_size: int, retailer_ids: List[int], config: FakeServiceConfig) -> dict:
+    return {"Records": [{"messageId": str(uuid.uuid4()),
+                         "body": json.dumps(build_message(handler, random.choice(retailer_ids), config))}
+                        for _ in range(batch_size)]}
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on linux and in bytes on macos
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def average_batch_metrics(metrics_backend) -> Dict[str, float]:
+    totals: Dict[str, float] = {}
+    for _, batch in metrics_backend.batches:
+        for name, (value, _) in batch.items():
+            totals[name] = totals.get(name, 0) + value
+    return {name: round(total / len(metrics_backend.batches), 2) for name, total in sorted(totals.items())}
+
+
+def git_commit() -> str:
+    result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True)
+    return result.stdout.strip() or "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--handler", choices=HANDLERS, default="ongoing_return_order_webhook")
+    parser.add_argument("--batches", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=10)
+    parser.add_argument("--warmup-batches", type=int, default=2)
+    parser.add_argument("--retailers", type=int, default=3)
+    parser.add_argument("--ongoing-latency-ms", type=float, default=50)
+    parser.add_argument("--rplatform-latency-ms", type=float, default=30)
+    parser.add_argument("--orders-per-day", type=int, default=500)
+    parser.add_argument("--lines-per-order", type=int, default=3)
+    parser.add_argument("--order-padding-bytes", type=int, default=0)
+    parser.add_argument("--cold-caches", action="store_true", help="drop the warm-container caches between batches")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="also write the results to this json file")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    config = FakeServiceConfig(ongoing_latency=args.ongoing_latency_ms / 1000,
+                               rplatform_latency=args.rplatform_latency_ms / 1000,
+                               orders_per_day=args.orders_per_day, lines_per_order=args.lines_per_order,
+                               order_padding_bytes=args.order_padding_bytes)
+    ongoing_url, rplatform_url, fake_services = start_fake_services(config)
+    database_dir = tempfile.mkdtemp(prefix="yenrich-bench-")
+
+    # wms reads its settings at import time
+    os.environ.update(ONGOING_API_URL=ongoing_url, RPLATFORM_URL=rplatform_url,
+                      DATABASE_URL=f"sqlite:///{os.path.join(database_dir, 'bench.db')}")
+
+    from benchmarks.standin import install_ymodel_standin, seed_integrations
+    install_ymodel_standin()
+
+    import wms
+    from wms.cli import init_db
+    from wms.common.metrics import InMemoryMetricsBackend, set_metrics_backend
+    from wms.ongoing import controller
+    from wms.ongoing.integration import invalidate_integration_cache
+    from wms.ongoing.order_index import invalidate_order_indexes
+
+    # sqlite doesn't take the pool settings meant for mysql
+    wms._triggered_event_app = wms.create_app_for_triggered_event(test_config={"SQLALCHEMY_ENGINE_OPTIONS": {}})
+    retailer_ids = list(range(1, args.retailers + 1))
+    with wms._triggered_event_app.app_context():
+        init_db()
+        seed_integrations(retailer_ids)
+
+    handler = getattr(controller, args.handler)
+    metrics_backend = InMemoryMetricsBackend()
+    set_metrics_backend(metrics_backend)
+    for _ in range(args.warmup_batches):
+        handler(build_event(args.handler, args.batch_size, retailer_ids, config))
+    metrics_backend.batches.clear()
+
+    latencies: List[float] = []
+    failures = 0
+    started = time.perf_counter()
+    for _ in range(args.batches):
+        if args.cold_caches:
+            invalidate_integration_cache()
+            invalidate_order_indexes()
+
+        event = build_event(args.handler, args.batch_size, retailer_ids, config)
+        batch_started = time.perf_counter()
+        result = handler(event)
+        latencies.append(time.perf_counter() - batch_started)
+        failures += len((result or {}).get("batchItemFailures", []))
+    elapsed = time.perf_counter() - started
+
+    fake_services.terminate()
+
+    results = {
+        "commit": git_commit(),
+        "handler": args.handler,
+        "batches": args.batches,
+        "batch_size": args.batch_size,
+        "failed_messages": failures,
+        "messages_per_second": round(args.batches * args.batch_size / elapsed, 2),
+        "batch_latency_p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "batch_latency_p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "per_batch": average_batch_metrics(metrics_backend),
+        "settings": {key: value for key, value in vars(args).items() if key not in ("output", "handler")},
+    }
+
+    for key, value in results.items():
+        if key not in ("settings", "per_batch"):
+            print(f"{key:>22}: {value}")
+    print("    per batch averages:")
+    for name, value in results["per_batch"].items():
+        print(f"{name:>30}: {value}")
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
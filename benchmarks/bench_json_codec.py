@@ -0,0 +1,79 @@
+"""Compare the json codecs on the payloads of the sqs, ongoing and rplatform paths.
+
+    python -m benchmarks.bench_json_codec [--orders 10000] [--lines 3] [--repeat 5]
+
+"previous" is how the handlers did it before wms.common.codec: json.loads for sqs bodies and ongoing responses,
+asdict and json.dumps for the inspections posted to RPLATFORM. Codecs that aren't installed are skipped, install
+orjson or msgspec to compare them. Every case prints the best time over --repeat runs.
+"""
+import argparse
+import json
+import time
+from dataclasses import asdict
+from typing import Callable, Dict, List
+
+from benchmarks.fakes import FakeServiceConfig, day_listing, make_order
+from wms.common.codec import JsonCodec, get_json_codec
+from wms.integration.interface import Inspection
+from wms.ongoing.inspection import build_returned_order_inspection
+
+
+def best_seconds(run: Callable[[], object], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def get_cases(listing: bytes, sqs_bodies: List[str], inspections: List[Inspection], codec: JsonCodec = None) \
+        -> Dict[str, Callable[[], object]]:
+    if codec is None:
+        return {
+            "ongoing order listing": lambda: json.loads(listing),
+            "sqs bodies": lambda: [json.loads(body) for body in sqs_bodies],
+            "rplatform inspections": lambda: [json.dumps(asdict(inspection)).encode() for inspection in inspections],
+        }
+
+    return {
+        "ongoing order listing": lambda: codec.loads(listing),
+        "sqs bodies": lambda: [codec.loads(body) for body in sqs_bodies],
+        "rplatform inspections": lambda: [codec.dumps(inspection) for inspection in inspections],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=10000)
+    parser.add_argument("--lines", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    config = FakeServiceConfig(lines_per_order=args.lines)
+    listing = day_listing(args.orders, args.lines, 0)
+    orders = [make_order(order_id, config) for order_id in range(1, args.orders + 1)]
+    sqs_bodies = [json.dumps({"goodsOwnerId": 1000, "order": order["orderInfo"], "isReturned": True})
+                  for order in orders]
+    inspections = [build_returned_order_inspection(order) for order in orders]
+
+    codecs: Dict[str, JsonCodec] = {}
+    for name in ("json", "orjson", "msgspec"):
+        try:
+            codecs[name] = get_json_codec(name)
+        except ImportError:
+            print(f"{name} isn't installed, skipped")
+
+    print(f"{args.orders:,} orders of {args.lines} lines, the listing is {len(listing) / 2 ** 20:.1f} MB")
+    print(f"{'case':<24} {'codec':<9} {'ms':>9} {'speedup':>8}")
+    previous_cases = get_cases(listing, sqs_bodies, inspections)
+    for case, run_previous in previous_cases.items():
+        previous = best_seconds(run_previous, args.repeat)
+        print(f"{case:<24} {'previous':<9} {previous * 1000:>9.1f} {1:>8.2f}")
+        for name, codec in codecs.items():
+            seconds = best_seconds(get_cases(listing, sqs_bodies, inspections, codec)[case], args.repeat)
+            print(f"{case:<24} {name:<9} {seconds * 1000:>9.1f} {previous / seconds:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
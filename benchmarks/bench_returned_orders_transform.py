@@ -0,0 +1,92 @@
+"""Compare the returned order -> inspection transform with the previous per-line one.
+
+    python -m benchmarks.bench_returned_orders_transform [--lines 10 100 500 1000] [--orders 5]
+
+For every order size it prints the time to transform and encode the orders and the size of the json payload sent to
+RPLATFORM.
+Both grow linearly with the number of lines for the current transform and quadratically for the previous one,
+which is why the previous one is only run up to --legacy-max-lines.
+"""
+import argparse
+import json
+import time
+from dataclasses import asdict
+from typing import List
+
+from wms.integration.interface import Inspection, InspectionDetail
+from wms.ongoing.inspection import build_returned_order_inspection
+
+
+def legacy_returned_order_inspections(ongoing_order: dict) -> List[Inspection]:
+    # the transform as it was: one inspection per line, all sharing the growing list of lines
+    raw_orders: List[Inspection] = []
+    order = ongoing_order.get("orderInfo")
+    inspection_lines: List[InspectionDetail] = []
+    for order_line in ongoing_order.get("orderLines"):
+        if "220221" in order.get("orderRemark"):
+            inspection_result = "OK"
+        else:
+            inspection_result = "Not OK"
+        inspection_lines.append(InspectionDetail(
+            ext_internal_order_detail_id=order_line.get("rowNumber"),
+            order_detail_id=None,
+            inspection_result=inspection_result,
+            comment=order.get("orderRemark"),
+            last_changed=order_line.get("pickedArticleItems")[0].get("returnDate")
+        ))
+        raw_orders.append(Inspection(ext_order_id=None,
+                                     ext_internal_order_id=order.get("goodsOwnerOrderId"),
+                                     inspected_order_details=inspection_lines))
+    return raw_orders
+
+
+def current_returned_order_inspections(ongoing_order: dict) -> List[Inspection]:
+    return [build_returned_order_inspection(ongoing_order)]
+
+
+def make_returned_order(order_id: int, number_of_lines: int) -> dict:
+    return {
+        "orderInfo": {
+            "orderId": order_id,
+            "goodsOwnerOrderId": str(4000000 + order_id),
+            "orderRemark": "220221 kan lagerföras",
+        },
+        "orderLines": [
+            {
+                "rowNumber": str(10833312710721 + line),
+                "pickedArticleItems": [{"returnDate": "2022-03-24T11:35:29.9324850Z", "returnCause": None}],
+            }
+            for line in range(number_of_lines)
+        ],
+    }
+
+
+def measure(transform, orders: List[dict]):
+    # includes encoding the RPLATFORM payload, which is where the repeated lines hurt most
+    start = time.perf_counter()
+    inspections = [inspection for order in orders for inspection in transform(order)]
+    payload_bytes = len(json.dumps([asdict(inspection) for inspection in inspections]))
+    return time.perf_counter() - start, payload_bytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", type=int, nargs="+", default=[10, 100, 250, 500, 1000])
+    parser.add_argument("--orders", type=int, default=5)
+    parser.add_argument("--legacy-max-lines", type=int, default=250)
+    args = parser.parse_args()
+
+    print(f"{'lines':>6} {'legacy ms':>10} {'legacy payload':>15} {'current ms':>11} {'current payload':>16}")
+    for number_of_lines in args.lines:
+        orders = [make_returned_order(order_id, number_of_lines) for order_id in range(args.orders)]
+        current_seconds, current_bytes = measure(current_returned_order_inspections, orders)
+        if number_of_lines <= args.legacy_max_lines:
+            legacy_seconds, legacy_bytes = measure(legacy_returned_order_inspections, orders)
+            legacy = f"{legacy_seconds * 1000:>10.1f} {legacy_bytes:>15,}"
+        else:
+            legacy = f"{'-':>10} {'-':>15}"
+        print(f"{number_of_lines:>6} {legacy} {current_seconds * 1000:>11.1f} {current_bytes:>16,}")
+
+
+if __name__ == "__main__":
+    main()
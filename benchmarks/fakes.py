@@ -0,0 +1,166 @@
+"""Local stand-ins for the Ongoing api and RPLATFORM, with configurable latency and payload size.
+
+Both servers run in a separate process, so that their memory and cpu don't show up in the measurements of the
+handlers under test.
+"""
+import gzip
+import json
+import multiprocessing
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+from typing import List, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+
+@dataclass
+class FakeServiceConfig:
+    ongoing_latency: float = 0.05
+    rplatform_latency: float = 0.03
+    orders_per_day: int = 500
+    lines_per_order: int = 3
+    returned_orders: int = 200
+    order_padding_bytes: int = 0
+    gzip: bool = True
+
+
+def make_order(order_id: int, config: FakeServiceConfig) -> dict:
+    return {
+        "orderInfo": {
+            "orderId": order_id,
+            "orderNumber": str(order_id),
+            "goodsOwnerOrderId": str(order_id),
+            "orderRemark": "220221 kan lagerföras" if order_id % 2 else "Skadad",
+            "shippedTime": "2022-03-24T11:35:29.9324850Z",
+            "deliveryInstruction": "x" * config.order_padding_bytes,
+        },
+        "orderLines": [
+            {
+                "orderLineId": order_id * 1000 + line,
+                "rowNumber": f"{order_id}{line:03}",
+                "articleSystemId": 21305 + line,
+                "articleNumber": f"107 01 04 {line}",
+                "articleName": "Article",
+                "productCode": f"73501263301{line:02}",
+                "pickedArticleItems": [{"returnDate": f"2022-03-24T11:{order_id % 60:02}:29.9324850Z",
+                                        "returnCause": "Fel storlek"}],
+            }
+            for line in range(config.lines_per_order)
+        ],
+    }
+
+
+def make_return_order(return_order_number: str) -> dict:
+    return {
+        "returnOrderInfo": {
+            "returnOrderId": abs(hash(return_order_number)) % 1000000,
+            "returnOrderNumber": return_order_number,
+            "comment": "Ok",
+            "inDate": "2022-03-24T11:35:29.9324850Z",
+            "returnOrderStatus": {"text": "Returnerad"},
+        },
+        "returnOrderLines": [{"returnOrderRowNumber": f"{return_order_number}-1"}],
+    }
+
+
+class FakeHandler(BaseHTTPRequestHandler, ABC):
+    config: FakeServiceConfig = FakeServiceConfig()
+    latency: float = 0
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self._handle()
+
+    def do_POST(self):
+        self._handle()
+
+    def do_PUT(self):
+        self._handle()
+
+    def _handle(self):
+        if length := int(self.headers.get("Content-Length") or 0):
+            self.rfile.read(length)
+
+        time.sleep(self.latency)
+        url = urlsplit(self.path)
+        body = self.respond(self.command, url.path, parse_qs(url.query))
+
+        headers = {"Content-Type": "application/json"}
+        if self.config.gzip and "gzip" in (self.headers.get("Accept-Encoding") or ""):
+            body = gzip.compress(body, compresslevel=1)
+            headers["Content-Encoding"] = "gzip"
+
+        self.send_response(200)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    @abstractmethod
+    def respond(self, method: str, path: str, query: dict) -> bytes:
+        pass
+
+
+class FakeOngoingHandler(FakeHandler):
+    def respond(self, method: str, path: str, query: dict) -> bytes:
+        if path.endswith("/returnOrders"):
+            if method == "PUT":
+                return b'{"returnOrderId": 1}'
+            return json.dumps([make_return_order(number) for number in query.get("returnOrderNumbers", [])]).encode()
+
+        if "orderNumber" in query:
+            return json.dumps([make_order(int(query["orderNumber"][0]), self.config)]).encode()
+
+        if "lastReturnedFrom" in query or "shippedTimeFrom" in query:
+            last_order_id = self.config.returned_orders if "lastReturnedFrom" in query else self.config.orders_per_day
+            order_id_from = int(query.get("orderIdFrom", ["1"])[0])
+            max_orders = int(query.get("maxOrdersToGet", [str(last_order_id)])[0])
+            order_ids = range(max(order_id_from, 1), min(order_id_from + max_orders, last_order_id + 1))
+            return json.dumps([make_order(order_id, self.config) for order_id in order_ids]).encode()
+
+        return day_listing(self.config.orders_per_day, self.config.lines_per_order, self.config.order_padding_bytes)
+
+
+class FakeRplatformHandler(FakeHandler):
+    def respond(self, method: str, path: str, query: dict) -> bytes:
+        return b"{}"
+
+
+@lru_cache(maxsize=4)
+def day_listing(orders_per_day: int, lines_per_order: int, order_padding_bytes: int) -> bytes:
+    config = FakeServiceConfig(orders_per_day=orders_per_day, lines_per_order=lines_per_order,
+                               order_padding_bytes=order_padding_bytes)
+    return json.dumps([make_order(order_id, config) for order_id in range(1, orders_per_day + 1)]).encode()
+
+
+def _serve(config: FakeServiceConfig, ports: multiprocessing.Queue):
+    servers: List[ThreadingHTTPServer] = []
+    for handler, latency in ((FakeOngoingHandler, config.ongoing_latency),
+                             (FakeRplatformHandler, config.rplatform_latency)):
+        configured = type(handler.__name__, (handler,), {"config": config, "latency": latency})
+        server = ThreadingHTTPServer(("127.0.0.1", 0), configured)
+        server.daemon_threads = True
+        servers.append(server)
+        Thread(target=server.serve_forever, daemon=True).start()
+
+    ports.put(tuple(server.server_address[1] for server in servers))
+    while True:
+        time.sleep(3600)
+
+
+def start_fake_services(config: FakeServiceConfig) -> Tuple[str, str, multiprocessing.Process]:
+    """Start both fakes in a child process and return the ongoing and rplatform base urls."""
+    context = multiprocessing.get_context("spawn")
+    ports = context.Queue()
+    process = context.Process(target=_serve, args=(config, ports), daemon=True)
+    process.start()
+    ongoing_port, rplatform_port = ports.get(timeout=30)
+    return f"http://127.0.0.1:{ongoing_port}", f"http://127.0.0.1:{rplatform_port}", process
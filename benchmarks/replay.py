@@ -0,0 +1,280 @@
+"""Replay recorded sqs batches offline, against the http responses they got, and profile them.
+
+    python -m benchmarks.replay RECORDING [RECORDING ...] [--profiler sample|cprofile|none] [--output replay]
+        [--interval-ms 5] [--idle] [--network-time] [--repeat 1]
+
+Batches are recorded with RECORDING=true, see wms.common.recording. Every batch runs through the same sqs batch
+helper, processing function and options as when it was recorded, with a lambda context giving it the time it had
+left then. Ongoing and RPLATFORM requests get the recorded responses, taking as long as they did with
+--network-time, and the integrations the batch looked up are set up in a SQLite stand-in of the ymodel tables.
+
+--profiler sample takes wall clock samples of the stacks of every thread, leaving out threads blocked on a lock or
+queue unless --idle is given, and writes them collapsed to <output>.folded, ready for flamegraph.pl or speedscope.
+--profiler cprofile profiles the main thread into <output>.prof, for pstats or snakeviz, and prints the top
+functions. The batch helper runs on the main thread unless SQS_BATCH_MAX_WORKERS is set above 1.
+"""
+import argparse
+import cProfile
+import gzip
+import hashlib
+import importlib
+import io
+import json
+import os
+import pstats
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+# the headers of the decoded content the recording holds don't apply to what is served
+SKIPPED_RESPONSE_HEADERS = ("content-encoding", "content-length", "transfer-encoding")
+IDLE_FILES = ("threading.py", "queue.py", "selectors.py")
+
+
+class ReplayHTTPAdapter(HTTPAdapter):
+    """Answers requests with the recorded responses to the same request, in the order they were recorded."""
+
+    def __init__(self, exchanges: List[dict], network_time: bool = False):
+        super().__init__()
+        self.network_time = network_time
+        self.unmatched = 0
+        self._by_request: Dict[tuple, List[dict]] = {}
+        self._by_url: Dict[tuple, List[dict]] = {}
+        self._positions: Counter = Counter()
+        self._lock = threading.Lock()
+        for exchange in exchanges:
+            self._by_request.setdefault(self._request_key(exchange["method"], exchange["url"], exchange["body"]),
+                                        []).append(exchange)
+            self._by_url.setdefault((exchange["method"], exchange["url"]), []).append(exchange)
+
+    def send(self, request: requests.PreparedRequest, **kwargs) -> requests.Response:
+        from wms.common.recording import encode_body
+
+        exchange = self._next_exchange(self._request_key(request.method, request.url, encode_body(request.body)),
+                                       (request.method, request.url))
+        if exchange is None:
+            self.unmatched += 1
+            raise requests.ConnectionError(f"No recorded response to {request.method} {request.url}", request=request)
+
+        if self.network_time:
+            time.sleep(exchange["seconds"])
+        if "status" not in exchange:
+            raise requests.ConnectionError(exchange.get("error"), request=request)
+        return self._build_response(request, exchange)
+
+    def close(self):
+        pass
+
+    def _next_exchange(self, *keys: tuple) -> Optional[dict]:
+        # the same request again gets the next response recorded for it, starting over after the last one
+        for key, exchanges in zip(keys, (self._by_request, self._by_url)):
+            if key in exchanges:
+                with self._lock:
+                    position = self._positions[key]
+                    self._positions[key] += 1
+                return exchanges[key][position % len(exchanges[key])]
+        return None
+
+    @staticmethod
+    def _request_key(method: str, url: str, body: Optional[dict]) -> tuple:
+        return method, url, hashlib.sha1(repr(body).encode()).hexdigest()
+
+    @staticmethod
+    def _build_response(request: requests.PreparedRequest, exchange: dict) -> requests.Response:
+        from wms.common.recording import decode_body
+
+        response = requests.Response()
+        response.status_code = exchange["status"]
+        response.reason = exchange.get("reason")
+        response.headers = CaseInsensitiveDict({name: value for name, value in exchange["headers"].items()
+                                                if name.lower() not in SKIPPED_RESPONSE_HEADERS})
+        response.raw = io.BytesIO(decode_body(exchange["content"]))
+        response.url = request.url
+        response.request = request
+        return response
+
+
+class ReplayContext:
+    """Lambda context with the time the recorded batch had left when it started."""
+
+    def __init__(self, remaining_ms: Optional[int]):
+        self._deadline = time.monotonic() + (remaining_ms if remaining_ms is not None else 15 * 60 * 1000) / 1000
+
+    def get_remaining_time_in_millis(self) -> int:
+        return int((self._deadline - time.monotonic()) * 1000)
+
+
+class StackSampler(threading.Thread):
+    """Samples the stacks of the other threads every ``interval`` seconds into collapsed stack counts."""
+
+    def __init__(self, interval: float, idle: bool = False):
+        super().__init__(name="stack-sampler", daemon=True)
+        self.interval = interval
+        self.idle = idle
+        self.stacks: Counter = Counter()
+        self._stopped = threading.Event()
+
+    def run(self):
+        own_ident = threading.get_ident()
+        while not self._stopped.wait(self.interval):
+            thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident:
+                    continue
+                if not self.idle and os.path.basename(frame.f_code.co_filename) in IDLE_FILES:
+                    continue
+
+                stack = []
+                while frame is not None:
+                    stack.append(frame_label(frame))
+                    frame = frame.f_back
+                stack.append(thread_names.get(ident, "thread").replace(" ", "_"))
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+    def write_folded(self, path: str):
+        with open(path, "w") as folded_file:
+            for stack, count in self.stacks.most_common():
+                folded_file.write(f"{stack} {count}\n")
+
+
+def frame_label(frame) -> str:
+    code = frame.f_code
+    path = code.co_filename
+    for root in sys.path:
+        if root and path.startswith(root + os.sep):
+            path = path[len(root) + 1:]
+            break
+    return f"{code.co_name} ({path}:{code.co_firstlineno})".replace(";", ":")
+
+
+def read_recording(path: str) -> dict:
+    # read without wms.common.recording, importing wms would read its settings before they're set up for the replay
+    with gzip.open(path, "rb") as recording_file:
+        return json.load(recording_file)
+
+
+def resolve(qualified_name: Optional[str]) -> Optional[Callable]:
+    if qualified_name is None:
+        return None
+
+    module_name, _, attribute_path = qualified_name.partition(":")
+    value = importlib.import_module(module_name)
+    for attribute in attribute_path.split("."):
+        value = getattr(value, attribute)
+    return value
+
+
+def setup(recordings: List[dict], network_time: bool) -> ReplayHTTPAdapter:
+    # wms reads its settings at import time
+    database_dir = tempfile.mkdtemp(prefix="yenrich-replay-")
+    os.environ.update(DATABASE_URL=f"sqlite:///{os.path.join(database_dir, 'replay.db')}", RECORDING="false",
+                      SQS_IDEMPOTENCY="false", METRICS_BACKEND="null")
+    if recordings[0]["ongoing_api_url"]:
+        os.environ["ONGOING_API_URL"] = recordings[0]["ongoing_api_url"]
+    if recordings[0]["rplatform_url"]:
+        os.environ["RPLATFORM_URL"] = recordings[0]["rplatform_url"]
+
+    from benchmarks.standin import add_integration, install_ymodel_standin
+    install_ymodel_standin()
+
+    import wms
+    from wms import db
+    from wms.cli import init_db
+    from wms.common.http import set_http_adapter_factory
+
+    # sqlite doesn't take the pool settings meant for mysql
+    wms._triggered_event_app = wms.create_app_for_triggered_event(test_config={"SQLALCHEMY_ENGINE_OPTIONS": {}})
+    with wms._triggered_event_app.app_context():
+        init_db()
+        integrations = {integration["retailer_id"]: integration
+                        for recording in recordings for integration in recording["integrations"]}
+        for integration in integrations.values():
+            add_integration(integration["retailer_id"], integration["goods_owner_id"], integration["warehouse_name"])
+        db.session.commit()
+
+    adapter = ReplayHTTPAdapter([exchange for recording in recordings for exchange in recording["exchanges"]],
+                                network_time)
+    set_http_adapter_factory(lambda: adapter)
+    return adapter
+
+
+def replay_batch(recording: dict) -> Tuple[float, int]:
+    from wms.common.utility import process_sqs_message_groups_return_batch_failures, \
+        process_sqs_messages_return_batch_failures
+
+    processing = recording["processing"]
+    context = ReplayContext(recording["remaining_ms"])
+    started = time.perf_counter()
+    if processing["mode"] == "groups":
+        result = process_sqs_message_groups_return_batch_failures(
+            recording["event"], resolve(processing["group_key"]), resolve(processing["function"]),
+            max_workers=processing["max_workers"], context=context,
+            idempotency_key=resolve(processing["idempotency_key"]))
+    else:
+        result = process_sqs_messages_return_batch_failures(
+            recording["event"], resolve(processing["function"]), ordering_key=resolve(processing["ordering_key"]),
+            max_workers=processing["max_workers"], context=context,
+            idempotency_key=resolve(processing["idempotency_key"]))
+    return time.perf_counter() - started, len((result or {}).get("batchItemFailures", []))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("recordings", nargs="+")
+    parser.add_argument("--profiler", choices=("sample", "cprofile", "none"), default="sample")
+    parser.add_argument("--output", default="replay", help="path of the profile, without its extension")
+    parser.add_argument("--interval-ms", type=float, default=5)
+    parser.add_argument("--idle", action="store_true", help="also sample threads blocked on a lock or queue")
+    parser.add_argument("--network-time", action="store_true", help="answer requests as slowly as recorded")
+    parser.add_argument("--repeat", type=int, default=1)
+    args = parser.parse_args()
+
+    recordings = [read_recording(path) for path in args.recordings]
+    if len({(recording["ongoing_api_url"], recording["rplatform_url"]) for recording in recordings}) > 1:
+        parser.error("the recordings were made against different Ongoing or RPLATFORM urls, replay them separately")
+    adapter = setup(recordings, args.network_time)
+    truncated = sum(exchange.get("truncated", False) for recording in recordings for exchange in recording["exchanges"])
+    if truncated:
+        print(f"{truncated} responses were recorded truncated, see RECORDING_MAX_BODY_BYTES, and replay cut off")
+
+    sampler = StackSampler(args.interval_ms / 1000, args.idle) if args.profiler == "sample" else None
+    profile = cProfile.Profile() if args.profiler == "cprofile" else None
+    if sampler:
+        sampler.start()
+    if profile:
+        profile.enable()
+
+    print(f"{'batch':<60} {'messages':>8} {'recorded s':>10} {'replay s':>9} {'failed':>7} {'replay failed':>13}")
+    for _ in range(args.repeat):
+        for path, recording in zip(args.recordings, recordings):
+            seconds, failed = replay_batch(recording)
+            recorded_failed = len((recording["result"] or {}).get("batchItemFailures", []))
+            print(f"{os.path.basename(path):<60} {len(recording['event']['Records']):>8} "
+                  f"{recording['seconds']:>10.3f} {seconds:>9.3f} {recorded_failed:>7} {failed:>13}")
+
+    if profile:
+        profile.disable()
+        profile.dump_stats(f"{args.output}.prof")
+        pstats.Stats(profile).sort_stats("cumulative").print_stats(25)
+        print(f"Profile written to {args.output}.prof")
+    if sampler:
+        sampler.stop()
+        sampler.write_folded(f"{args.output}.folded")
+        print(f"{sum(sampler.stacks.values())} stack samples written to {args.output}.folded")
+    if adapter.unmatched:
+        print(f"{adapter.unmatched} requests had no recorded response")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""SQLite backed stand-in for the ymodel integration tables used by the Ongoing handlers.
+
+``install_ymodel_standin`` has to run before ``wms.ongoing`` is imported.
+"""
+import sys
+import types
+from typing import List
+
+from wms import db
+from wms.common.constants import RetailerWarehouseIntegrationType
+
+
+class RetailerWarehouseIntegration(db.Model):
+    __tablename__ = 'retailer_warehouse_integration'
+
+    id = db.Column(db.Integer, primary_key=True)
+    retailer_id = db.Column(db.Integer, nullable=False, index=True)
+    warehouse_integration_type_id = db.Column(db.Integer, nullable=False)
+
+    @classmethod
+    def get(cls, id: int):
+        return cls.query.get(id)
+
+    @classmethod
+    def get_first(cls, **filters):
+        return cls.query.filter_by(**filters).first()
+
+
+class OngoingIntegration(db.Model):
+    __tablename__ = 'ongoing_integration'
+
+    id = db.Column(db.Integer, primary_key=True)
+    warehouse_integration_id = db.Column(db.Integer, nullable=False, index=True)
+    goods_owner_id = db.Column(db.Integer, nullable=False, index=True)
+    warehouse_name = db.Column(db.String(64), nullable=False)
+    username = db.Column(db.String(64), nullable=False)
+    password = db.Column(db.String(64), nullable=False)
+
+    @classmethod
+    def get(cls, id: int):
+        return cls.query.get(id)
+
+    @classmethod
+    def get_first(cls, **filters):
+        return cls.query.filter_by(**filters).first()
+
+
+def install_ymodel_standin():
+    module = types.ModuleType('ymodel.integration.warehouse_integration')
+    module.RetailerWarehouseIntegration = RetailerWarehouseIntegration
+    module.OngoingIntegration = OngoingIntegration
+    sys.modules.setdefault('ymodel', types.ModuleType('ymodel'))
+    sys.modules.setdefault('ymodel.integration', types.ModuleType('ymodel.integration'))
+    sys.modules['ymodel.integration.warehouse_integration'] = module
+
+
+def seed_integrations(retailer_ids: List[int]):
+    """One Ongoing integration per retailer, goods owner id = retailer id + 1000."""
+    for retailer_id in retailer_ids:
+        add_integration(retailer_id, retailer_id + 1000, f"warehouse{retailer_id}")
+    db.session.commit()
+
+
+def add_integration(retailer_id: int, goods_owner_id: int, warehouse_name: str):
+    warehouse_integration = RetailerWarehouseIntegration(
+        retailer_id=retailer_id, warehouse_integration_type_id=RetailerWarehouseIntegrationType.ONGOING)
+    db.session.add(warehouse_integration)
+    db.session.flush()
+    db.session.add(OngoingIntegration(warehouse_integration_id=warehouse_integration.id,
+                                      goods_owner_id=goods_owner_id, warehouse_name=warehouse_name,
+                                      username="bench", password="bench"))
@@ -0,0 +1,33 @@
+import os
+import tempfile
+
+import pytest
+
+# wms reads its settings at import time. The handlers' own tables and a stand-in of the ymodel integration tables
+# live in a throwaway SQLite database, whatever DATABASE_URL the environment has.
+os.environ.update(DATABASE_URL=f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='yenrich-tests-'), 'tests.db')}",
+                  METRICS_BACKEND="null", RECORDING="false")
+
+from benchmarks.standin import install_ymodel_standin  # noqa: E402
+
+install_ymodel_standin()
+
+import wms  # noqa: E402
+from wms import db  # noqa: E402
+from wms.cli import init_db  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def app():
+    # sqlite doesn't take the pool settings meant for mysql
+    wms._triggered_event_app = wms.create_app_for_triggered_event(test_config={"SQLALCHEMY_ENGINE_OPTIONS": {}})
+    with wms._triggered_event_app.app_context():
+        init_db()
+    return wms._triggered_event_app
+
+
+@pytest.fixture
+def app_context(app):
+    with app.app_context():
+        yield
+        db.session.rollback()
@@ -0,0 +1,55 @@
+import os
+import subprocess
+import sys
+import types
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+
+import wms
+from wms import db
+from wms.common.utility import get_app_context
+
+
+def test_one_triggered_event_app_per_container(app):
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        apps = list(executor.map(lambda _: wms.get_triggered_event_app(), range(8)))
+
+    assert all(triggered_event_app is app for triggered_event_app in apps)
+
+
+def test_app_contexts_share_the_engine_but_not_the_session(app):
+    with get_app_context():
+        engine, session = db.engine, db.session()
+        assert current_app._get_current_object() is app
+
+    with get_app_context():
+        assert db.engine is engine
+        assert db.session() is not session
+
+
+def test_handlers_import_without_aws_clients():
+    script = "import sys\n" \
+             "from benchmarks.standin import install_ymodel_standin\n" \
+             "install_ymodel_standin()\n" \
+             "import wms.ongoing.controller\n" \
+             "print('boto3' in sys.modules)"
+    imported = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    assert imported.returncode == 0, imported.stderr
+    assert imported.stdout.strip() == "False"
+
+
+def test_aws_clients_are_created_once(monkeypatch):
+    created = []
+    monkeypatch.setitem(sys.modules, "boto3", types.SimpleNamespace(
+        client=lambda service_name, region_name: created.append(service_name) or object()))
+    monkeypatch.setattr(wms, "_aws_clients", {})
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        clients = list(executor.map(wms.get_aws_client, ["sqs"] * 8))
+
+    assert created == ["sqs"]
+    assert all(client is clients[0] for client in clients)
+    assert wms.sqs is clients[0]
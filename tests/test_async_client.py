@@ -0,0 +1,118 @@
+import asyncio
+import json
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+from typing import List
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+from wms.common import recording, resilience
+from wms.common.constants import OngoingRequestSettings, OngoingSettings
+from wms.common.resilience import DeadlineExceeded, deadline
+from wms.ongoing import async_client
+from wms.ongoing.async_client import SyncOngoingApi, _get_loop_state, client_session, close_background_loop, \
+    run_sync
+from wms.ongoing.integration import OngoingCredentials
+
+
+async def get_state():
+    return _get_loop_state()
+
+
+def test_client_session_is_closed_with_its_block():
+    async def use_session():
+        async with client_session():
+            state = _get_loop_state()
+            assert not state.session.closed
+        with pytest.raises(RuntimeError):
+            _get_loop_state()
+        return state
+
+    assert asyncio.run(use_session()).session.closed
+
+
+def test_background_loop_shares_one_state_until_closed():
+    state = run_sync(get_state())
+    assert run_sync(get_state()) is state
+
+    close_background_loop()
+    assert state.session.closed
+    assert async_client._background_state is None
+
+    try:
+        assert run_sync(get_state()) is not state
+    finally:
+        close_background_loop()
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    requests: List[str] = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.requests.append(self.path)
+        # every first request of a warehouse is throttled
+        if sum(path.split("/")[1] == self.path.split("/")[1] for path in self.requests) == 1:
+            status, body = 429, b""
+        else:
+            query = parse_qs(urlsplit(self.path).query)
+            status, body = 200, json.dumps([{"returnOrderNumber": number}
+                                            for number in query.get("returnOrderNumbers", [])]).encode()
+        self.send_response(status)
+        self.send_header("Retry-After", "0")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture(scope="module")
+def api_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    close_background_loop()
+
+
+def make_api(api_url: str, warehouse_name: str, monkeypatch) -> SyncOngoingApi:
+    monkeypatch.setattr(OngoingSettings, "API_URL", api_url)
+    monkeypatch.setattr(resilience, "backoff_delay", lambda attempt: 0)
+    return SyncOngoingApi(1, OngoingCredentials(1, 96, warehouse_name, "user", "password"))
+
+
+def test_requests_go_through_the_warehouse_scheduler(api_url, monkeypatch):
+    api = make_api(api_url, "throttled", monkeypatch)
+
+    assert api.get_return_orders(["R1", "R2"]) == [{"returnOrderNumber": "R1"}, {"returnOrderNumber": "R2"}]
+    assert [path for path in Handler.requests if path.startswith("/throttled/")] \
+        == ["/throttled/api/v1/returnOrders?goodsOwnerId=96&returnOrderNumbers=R1&returnOrderNumbers=R2"] * 2
+    assert resilience.get_request_scheduler(api.base_url).bucket.rate < OngoingRequestSettings.RATE
+
+
+def test_requests_are_bounded_by_the_deadline(api_url, monkeypatch):
+    api = make_api(api_url, "late", monkeypatch)
+
+    with deadline(-1), pytest.raises(DeadlineExceeded):
+        api.get_order("3990")
+    assert not [path for path in Handler.requests if path.startswith("/late/")]
+
+
+def test_requests_are_recorded(api_url, monkeypatch):
+    documents = []
+    monkeypatch.setattr(recording.RecordingSettings, "ENABLED", True)
+    monkeypatch.setattr(recording.RecordingSettings, "SAMPLE_RATE", 1)
+    monkeypatch.setattr(recording, "save_recording", documents.append)
+    api = make_api(api_url, "recorded", monkeypatch)
+
+    with recording.record_batch({"Records": []}, None, None, "messages", make_api):
+        api.get_return_orders(["R1"])
+
+    assert [(exchange["status"], exchange["url"]) for exchange in documents[0]["exchanges"]] \
+        == [(429, f"{api.base_url}/returnOrders?goodsOwnerId=96&returnOrderNumbers=R1"),
+            (200, f"{api.base_url}/returnOrders?goodsOwnerId=96&returnOrderNumbers=R1")]
+    assert recording.decode_body(documents[0]["exchanges"][1]["content"]) == b'[{"returnOrderNumber": "R1"}]'
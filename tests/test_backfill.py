@@ -0,0 +1,65 @@
+from datetime import date
+
+import pytest
+
+from wms import db
+from wms.ongoing import backfill
+from wms.ongoing.backfill import BackfillResult, backfill_returns_for_day, get_pending_chunks, run_backfill, \
+    save_checkpoint
+from wms.ongoing.model import BackfillCheckpoint
+
+
+@pytest.fixture
+def checkpoints(app_context):
+    yield
+    BackfillCheckpoint.query.delete()
+    db.session.commit()
+
+
+def test_checkpointed_days_are_skipped_unless_restarted(checkpoints):
+    save_checkpoint(BackfillResult(1, date(2022, 3, 2), inspections=4))
+
+    chunks = [(1, date(2022, 3, 1)), (1, date(2022, 3, 3)), (2, date(2022, 3, 1)), (2, date(2022, 3, 2)),
+              (2, date(2022, 3, 3))]
+    assert get_pending_chunks([1, 2], date(2022, 3, 1), date(2022, 3, 3)) == chunks
+    assert len(get_pending_chunks([1, 2], date(2022, 3, 1), date(2022, 3, 3), restart=True)) == 6
+
+
+def test_checkpointing_again_keeps_one_row(checkpoints):
+    save_checkpoint(BackfillResult(1, date(2022, 3, 2), inspections=4))
+    save_checkpoint(BackfillResult(1, date(2022, 3, 2), inspections=5))
+
+    assert [checkpoint.inspections for checkpoint in BackfillCheckpoint.query.all()] == [5]
+
+
+def test_inspections_are_handed_off_in_chunks(app, monkeypatch):
+    handed_off = []
+
+    def write_back_inspections(retailer_id):
+        return lambda pending: handed_off.append((retailer_id, list(pending)))
+
+    monkeypatch.setattr(backfill.ReturnedOrdersSyncSettings, "HANDOFF_SIZE", 2)
+    monkeypatch.setattr(backfill, "write_back_inspections", write_back_inspections)
+    monkeypatch.setattr(backfill, "iter_returned_outgoing_orders",
+                        lambda retailer_id, day_from, day_to: iter([f"{day_from}-{day_to}-{n}" for n in range(5)]))
+
+    result = backfill_returns_for_day(7, date(2022, 3, 1))
+
+    assert result.error is None
+    assert result.inspections == 5
+    assert [len(pending) for _, pending in handed_off] == [2, 2, 1]
+    assert handed_off[0] == (7, ["2022-03-01-2022-03-02-0", "2022-03-01-2022-03-02-1"])
+
+
+def test_failed_days_are_reported_not_raised(app, monkeypatch):
+    def fail(retailer_id, day_from, day_to):
+        raise ConnectionError("ongoing is down")
+
+    monkeypatch.setattr(backfill, "write_back_inspections", lambda retailer_id: lambda pending: None)
+    monkeypatch.setattr(backfill, "iter_returned_outgoing_orders", fail)
+
+    results = []
+    run_backfill([(1, date(2022, 3, 1)), (2, date(2022, 3, 1))], processes=1, on_result=results.append)
+
+    assert [(result.retailer_id, result.error) for result in results] \
+        == [(1, "ConnectionError: ongoing is down"), (2, "ConnectionError: ongoing is down")]
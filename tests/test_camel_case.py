@@ -0,0 +1,68 @@
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import List, Optional
+
+import pytest
+
+from wms.common.utility import _get_build_fields, camel_case_to_snake_case
+from wms.ongoing.interface import OngoingReturnOrder, OngoingReturnOrderLine
+
+
+@dataclass
+class Line:
+    row_number: str
+    article_number: str = None
+
+
+@dataclass
+class Order:
+    order_id: int
+    order_lines: List[Line]
+
+
+@dataclass
+class Picking:
+    order_line: Optional[Line] = None
+
+
+def test_keys_are_converted_all_the_way_down():
+    assert camel_case_to_snake_case("goodsOwnerOrderId") == "goods_owner_order_id"
+    assert camel_case_to_snake_case({"orderInfo": {"orderId": 1}, "orderLines": [{"rowNumber": "1"}], 5: "x"}) \
+        == {"order_info": {"order_id": 1}, "order_lines": [{"row_number": "1"}], 5: "x"}
+
+
+def test_dicts_are_built_into_dataclasses():
+    order = camel_case_to_snake_case({"orderId": 1, "orderLines": [{"rowNumber": "1", "articleNumber": "A"}],
+                                      "unknownKey": {"a": 1}}, into=Order)
+
+    assert order == Order(order_id=1, order_lines=[Line(row_number="1", article_number="A")])
+
+
+def test_camel_case_fields_match_as_they_are():
+    return_order = camel_case_to_snake_case({"returnOrderId": 7, "returnOrderNumber": "R7", "comment": "Ok",
+                                             "returnOrderLine": {"returnOrderLineId": 1, "returnOrderRowNumber": "1"}},
+                                            into=OngoingReturnOrder)
+
+    assert return_order == OngoingReturnOrder(7, "R7", OngoingReturnOrderLine(1, "1"))
+
+
+def test_optional_dataclasses_are_built():
+    assert camel_case_to_snake_case({"orderLine": {"rowNumber": "1"}}, into=Picking) == Picking(Line(row_number="1"))
+    assert camel_case_to_snake_case({"orderLine": None}, into=Picking) == Picking(None)
+
+
+def test_field_map_is_read_only():
+    with pytest.raises(TypeError):
+        _get_build_fields(Order)["orderId"] = ("order_id", None)
+
+
+def test_concurrent_builds_with_many_unknown_keys():
+    def build(position: int) -> Order:
+        return camel_case_to_snake_case({"orderId": position, "orderLines": [], f"extra{position}": position},
+                                        into=Order)
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        orders = list(executor.map(build, range(2000)))
+
+    assert [order.order_id for order in orders] == list(range(2000))
+    assert set(_get_build_fields(Order)) == {"order_id", "order_lines"}
@@ -0,0 +1,44 @@
+import json
+from dataclasses import asdict, dataclass
+from typing import List
+
+import pytest
+
+from wms.common.codec import JsonCodec, StdlibJsonCodec, get_json_codec
+
+
+@dataclass
+class Line:
+    row_number: str
+    cause: str
+
+
+@dataclass
+class Inspection:
+    retailer_id: int
+    lines: List[Line]
+
+
+INSPECTION = Inspection(1, [Line("1", "Fel storlek"), Line("2", "Skadad på vägen")])
+
+
+def test_codec_needs_loads_and_dumps():
+    with pytest.raises(TypeError):
+        JsonCodec()
+
+
+def test_stdlib_dumps_compact_json_dumps():
+    assert StdlibJsonCodec().dumps(INSPECTION) == json.dumps(asdict(INSPECTION), separators=(",", ":")).encode()
+    assert json.loads(StdlibJsonCodec().dumps(INSPECTION)) == json.loads(json.dumps(asdict(INSPECTION)))
+    assert b"\\u00e5" in StdlibJsonCodec().dumps(INSPECTION)
+
+
+@pytest.mark.parametrize("name", ["json", "orjson", "msgspec"])
+def test_codecs_round_trip(name):
+    try:
+        codec = get_json_codec(name)
+    except ImportError:
+        pytest.skip(f"{name} isn't installed")
+
+    assert codec.loads(codec.dumps(INSPECTION)) == asdict(INSPECTION)
+    assert codec.loads(memoryview(codec.dumps({"a": "ö"}))) == {"a": "ö"}
@@ -0,0 +1,39 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from requests.adapters import HTTPAdapter
+
+from wms.common import http
+from wms.common.http import close_http_sessions, get_http_session, set_http_adapter_factory
+
+
+@pytest.fixture(autouse=True)
+def sessions():
+    yield
+    set_http_adapter_factory(http._create_adapter)
+
+
+def test_one_session_per_host():
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        sessions = list(executor.map(get_http_session, ["https://api.ongoingsystems.se/a/b"] * 32))
+
+    assert all(session is sessions[0] for session in sessions)
+    assert get_http_session("https://api.ongoingsystems.se/other?query=1") is sessions[0]
+    assert get_http_session("http://api.ongoingsystems.se/a/b") is not sessions[0]
+    assert sessions[0].headers["Accept-Encoding"] == http.HttpClientSettings.ACCEPT_ENCODING
+
+
+def test_closed_sessions_are_created_again():
+    session = get_http_session("https://api.ongoingsystems.se")
+    close_http_sessions()
+
+    assert get_http_session("https://api.ongoingsystems.se") is not session
+
+
+def test_adapter_factory_applies_to_new_sessions():
+    adapter = HTTPAdapter()
+    set_http_adapter_factory(lambda: adapter)
+
+    session = get_http_session("https://api.ongoingsystems.se")
+    assert session.get_adapter("https://api.ongoingsystems.se/x") is adapter
+    assert session.get_adapter("http://rplatform/x") is adapter
@@ -0,0 +1,78 @@
+import json
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+from wms import db
+from wms.common import idempotency
+from wms.common.idempotency import get_idempotency_key, get_processed_keys, mark_processed
+from wms.common.model import ProcessedSqsMessage
+from wms.ongoing import controller
+
+
+def expiry_of(key: str) -> datetime:
+    return db.session.query(ProcessedSqsMessage.expires_at).filter(ProcessedSqsMessage.key == key).scalar()
+
+
+def test_content_key_or_message_id():
+    by_content = get_idempotency_key("handler", "m1", {"id": 1}, lambda message: message["id"])
+    assert by_content == get_idempotency_key("handler", "m2", {"id": 1}, lambda message: message["id"])
+    assert by_content != get_idempotency_key("other_handler", "m1", {"id": 1}, lambda message: message["id"])
+    assert get_idempotency_key("handler", "m1", {}, lambda message: message["id"]) \
+        == get_idempotency_key("handler", "m1", {"id": 2})
+
+
+def test_marked_keys_are_processed(app_context):
+    mark_processed(["marked-1", "marked-2"])
+    idempotency._processed.clear()
+
+    assert get_processed_keys(["marked-1", "marked-2", "unmarked"]) == {"marked-1", "marked-2"}
+
+
+def test_marking_again_extends_the_expiry(app_context):
+    db.session.add(ProcessedSqsMessage(key="again", expires_at=datetime.utcnow() + timedelta(seconds=5)))
+    db.session.commit()
+
+    mark_processed(["again"])
+
+    assert expiry_of("again") > datetime.utcnow() + timedelta(days=1)
+
+
+def test_concurrently_recorded_key_keeps_the_batch(app_context):
+    # another container records one of the keys between this one's lookup and its insert
+    engine = db.get_engine()
+    raced = []
+
+    def insert_first(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("INSERT INTO processed_sqs_message") and not raced:
+            raced.append(True)
+            with engine.begin() as other:
+                other.execute(ProcessedSqsMessage.__table__.insert().values(
+                    key="race-2", processed_at=datetime.utcnow(), expires_at=datetime.utcnow()))
+
+    event.listen(engine, "before_cursor_execute", insert_first)
+    try:
+        mark_processed(["race-1", "race-2", "race-3"])
+    finally:
+        event.remove(engine, "before_cursor_execute", insert_first)
+
+    assert raced
+    assert {key for (key,) in db.session.query(ProcessedSqsMessage.key)
+            .filter(ProcessedSqsMessage.key.in_(["race-1", "race-2", "race-3"]))} == {"race-1", "race-2", "race-3"}
+    assert expiry_of("race-2") > datetime.utcnow()
+
+
+def test_return_requests_are_only_skipped_when_redelivered(app, monkeypatch):
+    pushed = []
+    monkeypatch.setattr(controller, "push_to_ongoing", lambda sqs_message: pushed.append(sqs_message))
+    body = json.dumps({"retailer_id": 1, "ext_internal_order_id": "1001", "order_date": "2022-03-24T12:00:00"})
+
+    # the same order returned again is a new message with the same content
+    event = {"Records": [{"messageId": "return-request-1", "body": body}]}
+    assert controller.return_request_queue_listener(event) == {"batchItemFailures": []}
+    assert controller.return_request_queue_listener({"Records": [{"messageId": "return-request-2", "body": body}]}) \
+        == {"batchItemFailures": []}
+    assert len(pushed) == 2
+
+    assert controller.return_request_queue_listener(event) == {"batchItemFailures": []}
+    assert len(pushed) == 2
@@ -0,0 +1,110 @@
+import json
+from unittest import mock
+
+import pytest
+
+from wms.integration.write_back import batch_write_back
+from wms.ongoing import controller
+from wms.ongoing.controller import parse_picking_webhook_payload, \
+    update_inspection_status_for_return_on_delivery_orders
+from wms.ongoing.inspection import build_returned_order_inspection
+from wms.ongoing.interface import OngoingPicking, OngoingPickingOrder, OngoingPickingOrderLine
+
+ONGOING_ORDER = {
+    "orderInfo": {"orderId": 70029, "orderNumber": "3990", "goodsOwnerOrderId": "1001",
+                  "orderRemark": "220221 kan lagerföras"},
+    "orderLines": [
+        {"rowNumber": "1", "pickedArticleItems": [{"returnDate": "2022-03-24T11:35:29Z"},
+                                                  {"returnDate": "2022-03-25T08:00:00Z"}]},
+        {"rowNumber": "2", "pickedArticleItems": [{"returnDate": None}]},
+        {"rowNumber": "3", "pickedArticleItems": []},
+        {"rowNumber": "4"},
+        {"rowNumber": "5", "pickedArticleItems": [{}, {"returnDate": "2022-03-24T12:00:00Z"}]},
+    ],
+}
+
+
+def picking_webhook(webhook_picking_id: int, row_number: str = None, order_number: str = "3990") -> dict:
+    order = {"orderId": 70029, "orderNumber": order_number}
+    if row_number is not None:
+        order["orderLine"] = {"orderLineId": int(row_number) * 10, "rowNumber": row_number}
+    return {"goodsOwnerId": 96, "webhookEventId": 8, "webhookPickingId": webhook_picking_id, "order": order,
+            "isReturned": True, "isDeleted": False}
+
+
+def test_picking_webhooks_are_parsed():
+    picking = parse_picking_webhook_payload(picking_webhook(1, "2"))
+    assert picking == OngoingPicking(OngoingPickingOrder(70029, "3990", OngoingPickingOrderLine(20, "2")), True, False)
+
+    picking = parse_picking_webhook_payload({"order": {"orderId": 70029, "orderNumber": "3990", "orderLine": None}})
+    assert picking == OngoingPicking(OngoingPickingOrder(70029, "3990"), False, False)
+
+
+def test_only_returned_items_are_inspected():
+    inspection = build_returned_order_inspection(ONGOING_ORDER)
+
+    assert inspection.ext_internal_order_id == "1001"
+    assert [(detail.ext_internal_order_detail_id, detail.last_changed, detail.inspection_result)
+            for detail in inspection.inspected_order_details] == [
+        ("1", "2022-03-25T08:00:00Z", "OK"), ("5", "2022-03-24T12:00:00Z", "OK")]
+
+
+def test_only_the_given_rows_are_inspected():
+    inspection = build_returned_order_inspection(ONGOING_ORDER, row_numbers={"5", "3"})
+
+    assert [detail.ext_internal_order_detail_id for detail in inspection.inspected_order_details] == ["5"]
+
+
+class FakeOngoingApi:
+    goods_owner_id = 96
+    warehouse_name = "warehouse"
+
+    def __init__(self, orders):
+        self.orders = orders
+        self.requested = []
+
+    def get_order(self, order_number):
+        self.requested.append(order_number)
+        return mock.Mock(content=json.dumps(self.orders.get(order_number, [])).encode())
+
+
+@pytest.fixture
+def ongoing_api(monkeypatch):
+    ongoing_api = FakeOngoingApi({"3990": [ONGOING_ORDER]})
+    monkeypatch.setattr(controller, "get_ongoing_api", lambda retailer_id: ongoing_api)
+    monkeypatch.setattr(controller, "get_retailer_id_from_goods_owner_id", lambda goods_owner_id: 1)
+    return ongoing_api
+
+
+def run_handler(sqs_messages: dict):
+    posted = []
+    with batch_write_back() as write_back, \
+            mock.patch("wms.integration.write_back.post_inspection",
+                       lambda retailer_id, inspection: posted.append(inspection)):
+        failed = update_inspection_status_for_return_on_delivery_orders(sqs_messages)
+        failed += write_back.flush()
+    return failed, posted
+
+
+def test_webhooks_inspect_their_own_lines_once_per_order(ongoing_api):
+    failed, posted = run_handler({"m0": picking_webhook(1, "1"), "m1": picking_webhook(2, "5"),
+                                  "m2": picking_webhook(3, "2")})
+
+    assert failed == []
+    assert ongoing_api.requested == ["3990"]
+    [inspection] = posted
+    assert [detail.ext_internal_order_detail_id for detail in inspection.inspected_order_details] == ["1", "5"]
+
+
+def test_webhook_without_its_line_inspects_every_returned_line(ongoing_api):
+    failed, [inspection] = run_handler({"m0": picking_webhook(1, "1"), "m1": picking_webhook(2)})
+
+    assert failed == []
+    assert [detail.ext_internal_order_detail_id for detail in inspection.inspected_order_details] == ["1", "5"]
+
+
+def test_line_without_returned_items_is_retried(ongoing_api):
+    failed, posted = run_handler({"m0": picking_webhook(1, "3"), "m1": picking_webhook(2, "1", order_number="404")})
+
+    assert sorted(failed) == ["m0", "m1"]
+    assert posted == []
@@ -0,0 +1,39 @@
+from unittest import mock
+
+from benchmarks.standin import add_integration
+from wms import db
+from wms.ongoing import integration
+from wms.ongoing.integration import get_ongoing_credentials, invalidate_integration_cache
+
+
+def test_credentials_are_cached(app_context):
+    add_integration(201, 1201, "warehouse201")
+    db.session.commit()
+
+    assert get_ongoing_credentials(201).goods_owner_id == 1201
+    with mock.patch.object(integration, "_load_ongoing_credentials") as load:
+        assert get_ongoing_credentials(201).warehouse_name == "warehouse201"
+    load.assert_not_called()
+
+
+def test_missing_integration_is_cached_briefly(app_context):
+    with mock.patch.object(integration, "_load_ongoing_credentials",
+                           wraps=integration._load_ongoing_credentials) as load:
+        assert get_ongoing_credentials(202) is None
+        assert get_ongoing_credentials(202) is None
+    assert load.call_count == 1
+
+    with mock.patch.object(integration.IntegrationCacheSettings, "MISSING_TTL_SECONDS", 0):
+        invalidate_integration_cache(retailer_id=203)
+        assert get_ongoing_credentials(203) is None
+        add_integration(203, 1203, "warehouse203")
+        db.session.commit()
+        assert get_ongoing_credentials(203).goods_owner_id == 1203
+
+
+def test_invalidating_a_missing_integration(app_context):
+    assert get_ongoing_credentials(204) is None
+    invalidate_integration_cache(retailer_id=204)
+    add_integration(204, 1204, "warehouse204")
+    db.session.commit()
+    assert get_ongoing_credentials(204).goods_owner_id == 1204
@@ -0,0 +1,58 @@
+import json
+
+import pytest
+
+from wms.common.json_stream import JsonArrayStream, iter_json_array
+
+DOCUMENT = json.dumps([{"orderInfo": {"orderId": 1, "remark": "räksmörgås €"}}, 12, -3.5e2, "x", [1, [2]], None,
+                       True, 1000]).encode()
+
+
+def chunked(data: bytes, size: int):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, len(DOCUMENT)])
+def test_items_split_across_chunks(size):
+    assert list(iter_json_array(chunked(DOCUMENT, size))) == json.loads(DOCUMENT)
+
+
+def test_number_split_at_a_chunk_boundary():
+    assert list(iter_json_array([b"[12", b"34,5", b".5e", b"1]"])) == [1234, 55.0]
+
+
+def test_whitespace_around_the_array():
+    assert list(iter_json_array([b" \n[ 1 ,", b" 2 ] \r\n", b" "])) == [1, 2]
+    assert list(iter_json_array([b"[]"])) == []
+
+
+@pytest.mark.parametrize("chunks", [
+    [b""], [], [b"  \n"], [b"[1,2"], [b"[1,", b"2"], [b"[1,2,"], [b"[1"], [b"[", b"1", b"0"], [b"[{\"a\": 1}"],
+    [b"[1]x"], [b"[1] ", b"[2]"], [b"[1."], [b"[1", b"."], [b"[1.5", b"e"],
+])
+def test_truncated_array(chunks):
+    with pytest.raises(ValueError, match="Truncated json array"):
+        list(iter_json_array(chunks))
+
+
+def test_truncated_item():
+    with pytest.raises(ValueError):
+        list(iter_json_array([b'[{"a": ', b'"b"']))
+
+
+def test_malformed_number():
+    with pytest.raises(ValueError, match="Expected ',' or ']'"):
+        list(iter_json_array([b"[3,4.]"]))
+
+
+def test_not_an_array():
+    with pytest.raises(ValueError, match="Expected a json array"):
+        list(iter_json_array([b'{"a": 1}']))
+
+
+def test_stream_counts_bytes_and_closes():
+    closed = []
+    stream = JsonArrayStream(chunked(DOCUMENT, 5), close=lambda: closed.append(True))
+    assert list(stream) == json.loads(DOCUMENT)
+    assert stream.bytes_read == len(DOCUMENT)
+    assert closed == [True]
@@ -0,0 +1,27 @@
+import pytest
+
+from wms.common import metrics
+from wms.common.metrics import InMemoryMetricsBackend, MetricsBackend
+
+
+def test_backends_have_to_emit():
+    with pytest.raises(TypeError):
+        MetricsBackend()
+
+
+def test_batch_metrics_are_emitted_once(monkeypatch):
+    backend = InMemoryMetricsBackend()
+    monkeypatch.setattr(metrics, "_backend", backend)
+
+    metrics.incr("outside_a_batch")
+    with metrics.batch_metrics("handler"):
+        metrics.incr("messages", 2)
+        metrics.incr("messages")
+        with metrics.stage("transform"):
+            pass
+
+    [(dimensions, values)] = backend.batches
+    assert dimensions == {"Handler": "handler"}
+    assert values["messages"] == (3, "Count")
+    assert values["transform_count"] == (1, "Count")
+    assert "outside_a_batch" not in values
@@ -0,0 +1,35 @@
+from contextlib import contextmanager
+from datetime import date
+
+from wms.ongoing.order_index import build_day_order_index, scan_day_for_order
+
+
+class FakeOrderStream(list):
+    bytes_read = 100
+
+
+class FakeOngoingApi:
+    base_url = "https://ongoing.test/warehouse/api/v1"
+    goods_owner_id = 1000
+
+    def __init__(self, orders):
+        self.orders = orders
+
+    @contextmanager
+    def stream_outgoing_order_between_dates(self, from_date, to_date):
+        yield FakeOrderStream(self.orders)
+
+
+def make_order(order_number, goods_owner_order_id):
+    return {"orderInfo": {"orderNumber": order_number, "goodsOwnerOrderId": goods_owner_order_id},
+            "orderLines": [{"rowNumber": 1, "pickedArticleItems": []}]}
+
+
+def test_index_keeps_the_first_duplicate():
+    api = FakeOngoingApi([make_order("1", "A"), make_order("2", "B"), make_order("3", "A")])
+
+    index = build_day_order_index(api, date(2022, 3, 1))
+
+    assert index.orders["A"].order_number == "1"
+    assert index.orders["A"].order_number == scan_day_for_order(api, "A", date(2022, 3, 1)).order_number
+    assert index.orders["B"].order_number == "2"
@@ -0,0 +1,60 @@
+import threading
+import time
+from collections import Counter
+
+import pytest
+
+from wms.common.resilience import deadline
+from wms.integration import poller
+from wms.integration.poller import in_shard, sync_integrations
+from wms.ongoing.integration import OngoingCredentials
+
+
+def make_integrations(count: int, warehouses: int = 2):
+    return [OngoingCredentials(retailer_id=retailer_id, goods_owner_id=1000 + retailer_id,
+                               warehouse_name=f"warehouse{retailer_id % warehouses}", username="user",
+                               password="password")
+            for retailer_id in range(count)]
+
+
+def test_every_goods_owner_is_in_exactly_one_shard():
+    shards = Counter(shard_index for goods_owner_id in range(1000) for shard_index in range(4)
+                     if in_shard(goods_owner_id, shard_index, 4))
+
+    assert sum(shards.values()) == 1000
+    assert all(count > 150 for count in shards.values())
+
+
+def test_syncs_stay_within_the_warehouse_concurrency(app, monkeypatch):
+    running = Counter()
+    most_running = Counter()
+    lock = threading.Lock()
+
+    def sync_integration(app, credentials: OngoingCredentials) -> int:
+        with lock:
+            running[credentials.warehouse_name] += 1
+            most_running[credentials.warehouse_name] = max(most_running[credentials.warehouse_name],
+                                                           running[credentials.warehouse_name])
+        time.sleep(0.01)
+        with lock:
+            running[credentials.warehouse_name] -= 1
+        if credentials.retailer_id == 3:
+            raise ConnectionError("ongoing is down")
+        return 2
+
+    monkeypatch.setattr(poller, "_sync_integration", sync_integration)
+    summary = sync_integrations(make_integrations(10), max_workers=6, warehouse_concurrency=2)
+
+    assert summary == {"synced": 9, "failed": 1, "skipped": 0, "inspections": 18}
+    assert set(most_running) == {"warehouse0", "warehouse1"}
+    assert max(most_running.values()) <= 2
+
+
+def test_integrations_are_skipped_without_time_left(app, monkeypatch):
+    monkeypatch.setattr(poller, "_sync_integration", pytest.fail)
+    monkeypatch.setattr(poller.ReturnsPollerSettings, "MIN_SYNC_SECONDS", 10)
+
+    with deadline(5):
+        summary = sync_integrations(make_integrations(3), max_workers=2)
+
+    assert summary == {"synced": 0, "failed": 0, "skipped": 3, "inspections": 0}
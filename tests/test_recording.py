@@ -0,0 +1,108 @@
+import gzip
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+
+import pytest
+import requests
+
+from wms.common import recording
+from wms.common.recording import RecordingHTTPAdapter, decode_body, record_batch
+
+BODY = b'[{"orderId": 1}, {"orderId": 2}]' * 100
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        body = gzip.compress(BODY)
+        self.send_response(200)
+        self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture(scope="module")
+def url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/orders"
+    server.shutdown()
+
+
+@pytest.fixture
+def session():
+    session = requests.Session()
+    session.mount("http://", RecordingHTTPAdapter())
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def documents(monkeypatch):
+    documents = []
+    monkeypatch.setattr(recording.RecordingSettings, "ENABLED", True)
+    monkeypatch.setattr(recording.RecordingSettings, "SAMPLE_RATE", 1)
+    monkeypatch.setattr(recording, "save_recording", documents.append)
+    return documents
+
+
+def noop(message):
+    pass
+
+
+def test_responses_are_recorded_as_read(url, session, documents):
+    with record_batch({"Records": []}, None, None, "messages", noop) as batch_recording:
+        assert session.get(url).content == BODY
+
+    [exchange] = documents[0]["exchanges"]
+    assert batch_recording is not None
+    assert exchange["status"] == 200
+    assert decode_body(exchange["content"]) == BODY
+    assert "truncated" not in exchange
+
+
+def test_streamed_responses_are_recorded_once_read(url, session, documents):
+    with record_batch({"Records": []}, None, None, "messages", noop) as batch_recording:
+        response = session.get(url, stream=True)
+        assert batch_recording.exchanges == []
+
+        assert b"".join(response.iter_content(chunk_size=64)) == BODY
+        response.close()
+
+    [exchange] = documents[0]["exchanges"]
+    assert decode_body(exchange["content"]) == BODY
+
+
+def test_streamed_responses_closed_early_are_recorded_as_far_as_read(url, session, documents):
+    with record_batch({"Records": []}, None, None, "messages", noop):
+        response = session.get(url, stream=True)
+        first = next(response.iter_content(chunk_size=64))
+        response.close()
+
+    [exchange] = documents[0]["exchanges"]
+    assert decode_body(exchange["content"]) == first
+
+
+def test_large_bodies_are_truncated(url, session, documents, monkeypatch):
+    monkeypatch.setattr(recording.RecordingSettings, "MAX_BODY_BYTES", 100)
+    with record_batch({"Records": []}, None, None, "messages", noop):
+        assert session.get(url).content == BODY
+
+    [exchange] = documents[0]["exchanges"]
+    assert decode_body(exchange["content"]) == BODY[:100]
+    assert exchange["truncated"] is True
+
+
+def test_batches_outside_the_sample_are_not_recorded(url, session, documents, monkeypatch):
+    monkeypatch.setattr(recording.RecordingSettings, "SAMPLE_RATE", 0)
+    with record_batch({"Records": []}, None, None, "messages", noop) as batch_recording:
+        session.get(url)
+
+    assert batch_recording is None
+    assert documents == []
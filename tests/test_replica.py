@@ -0,0 +1,63 @@
+from wms import db
+from wms.ongoing.model import OngoingOrder
+from wms.ongoing.replica import find_replicated_order, get_replicated_order, replicate_orders
+
+WAREHOUSE = "warehouse"
+
+
+def make_order(order_id: int, goods_owner_order_id: str, remark: str = "", return_date: str = None) -> dict:
+    return {"orderInfo": {"orderId": order_id, "orderNumber": f"N{order_id}", "goodsOwnerOrderId": goods_owner_order_id,
+                          "orderRemark": remark},
+            "orderLines": [{"rowNumber": "1", "articleNumber": "A1",
+                            "pickedArticleItems": [{"returnDate": return_date, "returnCause": "Fel storlek"}]}]}
+
+
+def test_order_ids_are_per_goods_owner(app_context):
+    replicate_orders(WAREHOUSE, 3001, [make_order(1, "first")])
+    replicate_orders(WAREHOUSE, 3002, [make_order(1, "second")])
+    db.session.commit()
+
+    assert find_replicated_order(WAREHOUSE, 3001, "first").ext_internal_order_id == "first"
+    assert find_replicated_order(WAREHOUSE, 3002, "second").ext_internal_order_id == "second"
+    assert find_replicated_order(WAREHOUSE, 3001, "second") is None
+    assert OngoingOrder.query.filter_by(order_id=1).count() == 2
+
+
+def test_order_ids_are_per_warehouse(app_context):
+    replicate_orders(WAREHOUSE, 3005, [make_order(5, "first")])
+    replicate_orders("other", 3005, [make_order(5, "second")])
+    db.session.commit()
+
+    assert find_replicated_order(WAREHOUSE, 3005, "first").ext_internal_order_id == "first"
+    assert find_replicated_order("other", 3005, "second").ext_internal_order_id == "second"
+    assert find_replicated_order("other", 3005, "first") is None
+
+
+def test_a_reused_order_id_finds_the_first_order(app_context):
+    # as the day order index does
+    replicate_orders(WAREHOUSE, 3006, [make_order(7, "reused", remark="second"),
+                                       make_order(6, "reused", remark="first")])
+    db.session.commit()
+
+    assert find_replicated_order(WAREHOUSE, 3006, "reused").warehouse_remark == "first"
+
+
+def test_replicating_again_updates_the_order(app_context):
+    replicate_orders(WAREHOUSE, 3003, [make_order(2, "order", remark="first")])
+    db.session.commit()
+    replicate_orders(WAREHOUSE, 3003, [make_order(2, "order", remark="second"), make_order(3, "other")])
+    db.session.commit()
+
+    order = get_replicated_order(WAREHOUSE, 3003, "N2")
+    assert order.warehouse_remark == "second"
+    assert len(order.order_lines) == 1
+    assert OngoingOrder.query.filter_by(goods_owner_id=3003).count() == 2
+
+
+def test_return_data_is_not_served(app_context):
+    replicate_orders(WAREHOUSE, 3004, [make_order(4, "returned", return_date="2022-03-24T11:35:29Z")])
+    db.session.commit()
+
+    [order_line] = find_replicated_order(WAREHOUSE, 3004, "returned").order_lines
+    assert order_line.sku_number == "A1"
+    assert order_line.return_date is None and order_line.return_reason is None
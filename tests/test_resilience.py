@@ -0,0 +1,110 @@
+import io
+import time
+
+import pytest
+import requests
+from requests import Response
+
+from wms.common import resilience
+from wms.common.resilience import CircuitBreaker, CircuitOpenError, RequestScheduler
+
+
+class FastSettings:
+    MAX_RETRIES = 3
+    RATE = 1000
+    BURST = 100
+    MIN_RATE = 1
+    MAX_RATE = 1000
+    CIRCUIT_FAILURES = 2
+    CIRCUIT_RESET_SECONDS = 0.05
+
+
+def make_response(status_code: int, headers: dict = None) -> Response:
+    response = Response()
+    response.status_code = status_code
+    response.headers.update(headers or {})
+    response.raw = io.BytesIO(b"")
+    return response
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(resilience, "backoff_delay", lambda attempt: 0)
+
+
+def open_breaker(breaker: CircuitBreaker):
+    for _ in range(breaker.failure_threshold):
+        breaker.before_call()
+        breaker.failed()
+    assert breaker.is_open
+
+
+def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker("host", failure_threshold=3, reset_timeout=60)
+    breaker.failed()
+    breaker.failed()
+    breaker.succeeded()
+    breaker.failed()
+    breaker.failed()
+    assert not breaker.is_open
+
+    breaker.failed()
+    assert breaker.is_open
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_half_open_lets_one_probe_through():
+    breaker = CircuitBreaker("host", failure_threshold=1, reset_timeout=0.05)
+    open_breaker(breaker)
+    time.sleep(0.06)
+
+    breaker.before_call()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    breaker.succeeded()
+    assert not breaker.is_open
+    breaker.before_call()
+
+
+def test_failed_probe_opens_the_circuit_again():
+    breaker = CircuitBreaker("host", failure_threshold=3, reset_timeout=0.05)
+    open_breaker(breaker)
+    time.sleep(0.06)
+
+    breaker.before_call()
+    breaker.failed()
+    assert breaker.is_open
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_throttled_probe_closes_the_circuit():
+    scheduler = RequestScheduler("host", FastSettings)
+    open_breaker(scheduler.breaker)
+    time.sleep(0.06)
+
+    responses = iter([make_response(429, {"Retry-After": "0"}), make_response(200)])
+    assert scheduler.send("GET", lambda timeout: next(responses), (1, 1)).status_code == 200
+    assert not scheduler.breaker.is_open
+
+
+def test_server_errors_are_retried_for_idempotent_methods_only():
+    scheduler = RequestScheduler("host", FastSettings)
+    responses = iter([make_response(503), make_response(200)])
+    assert scheduler.send("GET", lambda timeout: next(responses), (1, 1)).status_code == 200
+
+    responses = iter([make_response(503), make_response(200)])
+    assert scheduler.send("PUT", lambda timeout: next(responses), (1, 1)).status_code == 503
+
+
+def test_connection_errors_open_the_circuit():
+    scheduler = RequestScheduler("host", FastSettings)
+
+    def send_request(timeout):
+        raise requests.ConnectionError("refused")
+
+    with pytest.raises(CircuitOpenError):
+        scheduler.send("GET", send_request, (1, 1))
+    assert scheduler.breaker.is_open
@@ -0,0 +1,70 @@
+from unittest import mock
+
+import pytest
+
+from benchmarks.fakes import make_return_order
+from wms.common import codec
+from wms.integration.write_back import batch_write_back
+from wms.ongoing import controller
+from wms.ongoing.controller import RETURN_ORDER_NUMBERS_PER_REQUEST, OngoingApi, \
+    update_inspection_status_for_goods_owner_return_orders
+
+
+def return_order_webhook(return_order_number: str, order_number: str) -> dict:
+    return {"goodsOwnerId": 96, "webhookEventId": 9,
+            "returnOrder": {"returnOrderId": 1, "returnOrderNumber": return_order_number,
+                            "returnOrderLine": {"returnOrderLineId": 1, "returnOrderRowNumber": "1"}},
+            "customerOrderInfo": {"orderId": int(order_number), "orderNumber": order_number}}
+
+
+class FakeOngoingApi:
+    def __init__(self):
+        self.requested = []
+
+    def get_return_orders(self, return_order_numbers):
+        self.requested.append(return_order_numbers)
+        return [make_return_order(number) for number in return_order_numbers if number != "R-missing"]
+
+
+@pytest.fixture
+def ongoing_api(monkeypatch):
+    ongoing_api = FakeOngoingApi()
+    monkeypatch.setattr(controller, "get_ongoing_api", lambda retailer_id: ongoing_api)
+    monkeypatch.setattr(controller, "get_retailer_id_from_goods_owner_id", lambda goods_owner_id: 1)
+    return ongoing_api
+
+
+def test_goods_owner_return_orders_are_fetched_at_once(ongoing_api):
+    posted = []
+    sqs_messages = {"m0": return_order_webhook("R1", "1001"), "m1": return_order_webhook("R2", "1002"),
+                    "m2": return_order_webhook("R1", "1001"), "m3": {"goodsOwnerId": 96},
+                    "m4": return_order_webhook("R-missing", "1004")}
+
+    with batch_write_back() as write_back, \
+            mock.patch("wms.integration.write_back.post_inspection",
+                       lambda retailer_id, inspection: posted.append(inspection)):
+        failed = update_inspection_status_for_goods_owner_return_orders(sqs_messages)
+        failed += write_back.flush()
+
+    assert failed == ["m3"]
+    assert ongoing_api.requested == [["R1", "R2", "R-missing"]]
+    assert [inspection.ext_order_id for inspection in posted if inspection] == ["1001", "1002", "1001"]
+    assert posted[1].inspected_order_details[0].inspection_result == "OK"
+
+
+def test_long_return_order_number_lists_are_split():
+    ongoing_api = OngoingApi.__new__(OngoingApi)
+    ongoing_api.goods_owner_id = 96
+    ongoing_api._return_order = "https://api/returnOrders"
+    requested = []
+
+    def make_request(req_type, url, params=None, payload=None):
+        requested.append(params["returnOrderNumbers"])
+        return_orders = [{"returnOrderNumber": number} for number in params["returnOrderNumbers"]]
+        return mock.Mock(content=codec.dumps(return_orders))
+
+    ongoing_api._make_request = make_request
+    numbers = [str(number) for number in range(RETURN_ORDER_NUMBERS_PER_REQUEST * 2 + 1)]
+
+    assert [return_order["returnOrderNumber"] for return_order in ongoing_api.get_return_orders(numbers)] == numbers
+    assert [len(chunk) for chunk in requested] == [RETURN_ORDER_NUMBERS_PER_REQUEST] * 2 + [1]
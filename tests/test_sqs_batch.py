@@ -0,0 +1,150 @@
+import json
+import threading
+from typing import List
+
+import pytest
+
+from wms.common import utility
+from wms.common.constants import OngoingRequestSettings
+from wms.common.resilience import CostEstimator
+from wms.common.utility import process_sqs_message_groups_return_batch_failures, \
+    process_sqs_messages_return_batch_failures
+
+
+def make_event(*messages: dict) -> dict:
+    return {"Records": [{"messageId": f"m{position}", "body": json.dumps(message)}
+                        for position, message in enumerate(messages)]}
+
+
+def failures(result: dict) -> List[str]:
+    return [failure["itemIdentifier"] for failure in result["batchItemFailures"]]
+
+
+@pytest.fixture(autouse=True)
+def no_idempotency(app, monkeypatch):
+    monkeypatch.setattr(utility.IdempotencySettings, "ENABLED", False)
+
+
+def test_failed_and_unparsable_messages_are_reported():
+    def process(message: dict):
+        if message["fail"]:
+            raise ValueError("failed")
+
+    event = make_event({"fail": False}, {"fail": True}, {"fail": False})
+    event["Records"].append({"messageId": "m3", "body": "{not json"})
+
+    assert failures(process_sqs_messages_return_batch_failures(event, process)) == ["m1", "m3"]
+
+
+def test_messages_run_concurrently_but_in_order_per_key():
+    processed = []
+    lock = threading.Lock()
+    # the first message of every order waits for the others', which only passes when they run concurrently
+    started_together = threading.Barrier(3, timeout=5)
+
+    def process(message: dict):
+        if message["position"] < 3:
+            started_together.wait()
+        with lock:
+            processed.append((message["order"], message["position"]))
+        if message["fail"]:
+            raise ValueError("failed")
+
+    event = make_event(*({"order": position % 3, "position": position, "fail": position == 4}
+                         for position in range(9)))
+    result = process_sqs_messages_return_batch_failures(event, process, ordering_key=lambda message: message["order"],
+                                                        max_workers=3)
+
+    # m7 shares the order of the failed m4, it isn't processed but reported too so that redelivery keeps the order
+    assert failures(result) == ["m4", "m7"]
+    for order in range(3):
+        positions = [position for processed_order, position in processed if processed_order == order]
+        assert positions == sorted(positions)
+    assert (1, 7) not in processed
+
+
+def test_groups_report_what_their_function_returns():
+    def process_group(messages: dict) -> List[str]:
+        if any(message["fail"] for message in messages.values()):
+            raise ValueError("failed")
+        return [message_id for message_id, message in messages.items() if message["skip"]]
+
+    event = make_event({"owner": 1, "fail": False, "skip": False}, {"owner": 2, "fail": True, "skip": False},
+                       {"owner": 1, "fail": False, "skip": True}, {"owner": 2, "fail": False, "skip": False})
+    result = process_sqs_message_groups_return_batch_failures(event, lambda message: message["owner"], process_group,
+                                                              max_workers=2)
+
+    assert failures(result) == ["m1", "m2", "m3"]
+
+
+class LambdaContext:
+    def __init__(self, remaining_ms: int):
+        self.remaining_ms = remaining_ms
+
+    def get_remaining_time_in_millis(self) -> int:
+        return self.remaining_ms
+
+
+@pytest.fixture
+def message_costs(monkeypatch):
+    message_costs = CostEstimator(alpha=1)
+    monkeypatch.setattr(utility, "_message_costs", message_costs)
+    return message_costs
+
+
+def test_messages_are_tried_before_their_cost_is_known(message_costs):
+    processed = []
+    result = process_sqs_messages_return_batch_failures(make_event({"id": 1}), processed.append,
+                                                        context=LambdaContext(100))
+
+    assert failures(result) == []
+    assert processed == [{"id": 1}]
+    assert message_costs.estimate("append") is not None
+
+
+def test_messages_without_time_left_are_not_started(message_costs):
+    processed = []
+
+    def process(message: dict):
+        processed.append(message)
+
+    message_costs.observe("process", 10)
+    headroom_ms = int(OngoingRequestSettings.DEADLINE_HEADROOM_SECONDS * 1000)
+    result = process_sqs_messages_return_batch_failures(make_event({"id": 1}, {"id": 2}), process,
+                                                        context=LambdaContext(headroom_ms + 12000))
+
+    # 12s are left, enough for a message of 10s but not with the margin, so neither is started
+    assert failures(result) == ["m0", "m1"]
+    assert processed == []
+
+
+def test_groups_without_time_left_are_not_started(message_costs):
+    def process_group(messages: dict) -> List[str]:
+        return []
+
+    message_costs.observe("process_group", 10)
+    headroom_ms = int(OngoingRequestSettings.DEADLINE_HEADROOM_SECONDS * 1000)
+    event = make_event({"owner": 1}, {"owner": 1}, {"owner": 2})
+    result = process_sqs_message_groups_return_batch_failures(event, lambda message: message["owner"], process_group,
+                                                              context=LambdaContext(headroom_ms + 20000))
+
+    # the group of two would take 30s with the margin, the single message 15s
+    assert failures(result) == ["m0", "m1"]
+
+
+def test_time_is_kept_for_the_end_of_the_batch(message_costs):
+    processed = []
+
+    def process(message: dict):
+        processed.append(message["id"])
+
+    message_costs.observe("process", 1)
+    message_costs.observe("process:finish", 3)
+    headroom_ms = int(OngoingRequestSettings.DEADLINE_HEADROOM_SECONDS * 1000)
+    result = process_sqs_messages_return_batch_failures(make_event(*({"id": n} for n in range(10))), process,
+                                                        context=LambdaContext(headroom_ms + 20000))
+
+    # the fifth message would take 1s and leave the write-back of five 15s, 24s with the margin
+    assert processed == [0, 1, 2, 3]
+    assert failures(result) == [f"m{n}" for n in range(4, 10)]
+    assert message_costs.estimate("process:finish") < 1
@@ -0,0 +1,76 @@
+from typing import List
+
+import pytest
+
+from benchmarks.fakes import FakeServiceConfig, make_order
+from wms import db
+from wms.ongoing import sync
+from wms.ongoing.model import OngoingSyncState
+from wms.ongoing.sync import sync_returned_outgoing_orders
+
+GOODS_OWNER_ID = 4711
+
+
+class FakeOngoingApi:
+    goods_owner_id = GOODS_OWNER_ID
+    warehouse_name = "warehouse"
+
+    def __init__(self):
+        self.orders: List[dict] = []
+        self.from_dates: List[str] = []
+
+    def iter_outgoing_orders_returned_since(self, from_date: str):
+        self.from_dates.append(from_date)
+        return iter(self.orders)
+
+
+def returned_order(order_id: int, minute: int) -> dict:
+    order = make_order(order_id, FakeServiceConfig(lines_per_order=1))
+    order["orderLines"][0]["pickedArticleItems"][0]["returnDate"] = f"2022-03-24T11:{minute:02}:00Z"
+    return order
+
+
+@pytest.fixture
+def ongoing_api(app_context, monkeypatch):
+    ongoing_api = FakeOngoingApi()
+    monkeypatch.setattr(sync, "get_ongoing_api", lambda retailer_id: ongoing_api)
+    monkeypatch.setattr(sync, "get_inspection_classifier", lambda warehouse_name: None)
+    monkeypatch.setattr(sync, "build_returned_order_inspection",
+                        lambda ongoing_order, classify: ongoing_order["orderInfo"]["orderId"])
+    yield ongoing_api
+    OngoingSyncState.query.delete()
+    db.session.commit()
+
+
+def test_syncs_pick_up_from_the_last_return(ongoing_api):
+    handed_off = []
+    ongoing_api.orders = [returned_order(1, 10), returned_order(2, 20), returned_order(3, 20)]
+
+    assert sync_returned_outgoing_orders(1, handed_off.extend, initial_from="2022-03-24") == 3
+    state = OngoingSyncState.query.get((ongoing_api.warehouse_name, GOODS_OWNER_ID, OngoingSyncState.RETURNED_ORDERS))
+    assert state.watermark.startswith("2022-03-24T11:20:00")
+    assert set(state.boundary) == {"2", "3"}
+    watermark = state.watermark
+
+    # the orders on the mark come back, only the changed and the new ones are handed off again
+    changed = returned_order(3, 20)
+    changed["orderInfo"]["orderRemark"] = "Changed"
+    ongoing_api.orders = [returned_order(2, 20), changed, returned_order(4, 30)]
+
+    assert sync_returned_outgoing_orders(1, handed_off.extend) == 2
+    assert handed_off == [1, 2, 3, 3, 4]
+    assert ongoing_api.from_dates[1] == watermark
+    assert state.watermark.startswith("2022-03-24T11:30:00")
+
+
+def test_failed_handoff_keeps_the_mark(ongoing_api):
+    def fail(inspections):
+        raise ConnectionError("rplatform is down")
+
+    ongoing_api.orders = [returned_order(1, 10)]
+    with pytest.raises(ConnectionError):
+        sync_returned_outgoing_orders(1, fail, initial_from="2022-03-24")
+    db.session.rollback()
+
+    assert sync_returned_outgoing_orders(1, lambda inspections: None, initial_from="2022-03-24") == 1
+    assert ongoing_api.from_dates == ["2022-03-24", "2022-03-24"]
@@ -0,0 +1,105 @@
+from concurrent.futures import Future
+from unittest import mock
+
+import pytest
+
+import wms
+from wms.common import codec
+from wms.ongoing import webhooks
+from wms.ongoing.controller import ongoing_picking_event_key, ongoing_webhook_event_key
+from wms.ongoing.webhooks import get_deduplication_id, validate_picking_webhook, validate_return_order_webhook
+
+PICKING = {"goodsOwnerId": 96, "webhookEventId": 8, "webhookPickingId": 1, "isReturned": True,
+           "order": {"orderId": 70029, "orderNumber": "3990"}}
+RETURN_ORDER = {"goodsOwnerId": 96, "webhookEventId": 9, "returnOrder": {"returnOrderNumber": "R1"}}
+
+
+class FakeSqsBatchSender:
+    def __init__(self):
+        self.entries = []
+
+    def send(self, entries):
+        self.entries += entries
+        futures = []
+        for position, _ in enumerate(entries):
+            future = Future()
+            future.set_result(f"sqs-{position}")
+            futures.append(future)
+        return futures
+
+
+@pytest.fixture
+def client():
+    return wms.create_app(test_config={"SQLALCHEMY_ENGINE_OPTIONS": {}}).test_client()
+
+
+@pytest.fixture
+def sender(monkeypatch):
+    sender = FakeSqsBatchSender()
+    monkeypatch.setattr(webhooks, "get_sqs_batch_sender", lambda queue_url, flush_seconds: sender)
+    monkeypatch.setattr(webhooks.WebhookSettings, "TOKEN", "secret")
+    monkeypatch.setattr(webhooks.WebhookSettings, "PICKING_QUEUE_URL", "https://sqs.test/picking.fifo")
+    monkeypatch.setattr(webhooks.WebhookSettings, "RETURN_ORDER_QUEUE_URL", "https://sqs.test/return-orders")
+    return sender
+
+
+def test_picking_webhooks_need_the_order_number():
+    assert validate_picking_webhook(PICKING) is None
+    assert validate_picking_webhook({**PICKING, "order": {"orderId": 70029}}) == "order.orderNumber is missing"
+    assert validate_picking_webhook({**PICKING, "order": {"orderNumber": "3990"}}) == "order.orderId is missing"
+    assert validate_return_order_webhook({**RETURN_ORDER, "returnOrder": {}}) is not None
+
+
+def test_deduplication_follows_the_idempotency_key():
+    body = codec.dumps(PICKING).decode()
+    other_item = {**PICKING, "webhookPickingId": 2}
+    assert get_deduplication_id(PICKING, body, ongoing_picking_event_key) \
+        != get_deduplication_id(other_item, codec.dumps(other_item).decode(), ongoing_picking_event_key)
+    assert get_deduplication_id(PICKING, body, ongoing_picking_event_key) \
+        == get_deduplication_id({**PICKING, "timestamp": "later"}, "resent", ongoing_picking_event_key)
+
+    other_return_order = {**RETURN_ORDER, "returnOrder": {"returnOrderNumber": "R2"}}
+    assert get_deduplication_id(RETURN_ORDER, "a", ongoing_webhook_event_key) \
+        != get_deduplication_id(other_return_order, "a", ongoing_webhook_event_key)
+
+    without_event = {key: value for key, value in PICKING.items() if key != "webhookEventId"}
+    assert get_deduplication_id(without_event, "a", ongoing_picking_event_key) \
+        != get_deduplication_id(without_event, "b", ongoing_picking_event_key)
+
+
+def test_picking_webhooks_are_queued_per_goods_owner(client, sender):
+    response = client.post("/ongoing/webhooks/picking?token=secret", json=[PICKING, {**PICKING, "webhookPickingId": 2}])
+
+    assert response.status_code == 202 and response.get_json() == {"queued": 2}
+    assert [entry["MessageGroupId"] for entry in sender.entries] == ["96", "96"]
+    assert len({entry["MessageDeduplicationId"] for entry in sender.entries}) == 2
+    assert codec.loads(sender.entries[0]["MessageBody"]) == PICKING
+
+
+def test_invalid_webhooks_are_rejected(client, sender):
+    response = client.post("/ongoing/webhooks/picking?token=secret", json={**PICKING, "order": {"orderId": 1}})
+
+    assert response.status_code == 400
+    assert sender.entries == []
+
+
+def test_unconfigured_queue(client, sender):
+    with mock.patch.object(webhooks.WebhookSettings, "RETURN_ORDER_QUEUE_URL", None):
+        assert client.post("/ongoing/webhooks/return-orders?token=secret", json=RETURN_ORDER).status_code == 503
+
+
+def test_webhooks_need_the_token(client, sender):
+    assert client.post("/ongoing/webhooks/picking?token=wrong", json=PICKING).status_code == 401
+    assert client.post("/ongoing/webhooks/picking", json=PICKING).status_code == 401
+    with mock.patch.object(webhooks.WebhookSettings, "TOKEN", None):
+        assert client.post("/ongoing/webhooks/picking", json=PICKING).status_code == 503
+    assert sender.entries == []
+
+
+def test_webhooks_are_left_out_of_cors(client, sender):
+    response = client.post("/ongoing/webhooks/picking?token=secret", json=PICKING,
+                           headers={"Origin": "https://example.com"})
+
+    assert response.status_code == 202
+    assert "Access-Control-Allow-Origin" not in response.headers
+    assert client.get("/other", headers={"Origin": "https://example.com"}).headers["Access-Control-Allow-Origin"]
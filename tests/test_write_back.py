@@ -0,0 +1,101 @@
+import json
+import threading
+from typing import Dict, List
+from unittest import mock
+
+from wms.common.resilience import deadline
+
+from wms.common.utility import process_sqs_message_groups_return_batch_failures
+from wms.integration import write_back
+from wms.integration.write_back import InspectionWriteBack, get_batch_write_back
+
+
+def make_event(*messages: dict) -> dict:
+    return {"Records": [{"messageId": f"m{position}", "body": json.dumps(message)}
+                        for position, message in enumerate(messages)]}
+
+
+def test_flush_reports_every_message_of_a_failed_inspection():
+    posted = []
+
+    def post_inspection(retailer_id, inspection):
+        if inspection["order"] == "B":
+            raise ConnectionError("rplatform is down")
+        posted.append((retailer_id, inspection["order"]))
+
+    inspections = InspectionWriteBack()
+    inspections.add(1, {"order": "A"}, "m0")
+    inspections.add(1, {"order": "B"}, "m1", "m2")
+    inspections.add(2, {"order": "C"}, "m3")
+    with mock.patch.object(write_back, "post_inspection", post_inspection):
+        assert inspections.flush() == ["m1", "m2"]
+        assert inspections.flush() == []
+
+    assert sorted(posted) == [(1, "A"), (2, "C")]
+
+
+def test_one_write_back_per_batch(app):
+    write_backs = []
+
+    def process_group(sqs_messages: Dict[str, dict]) -> List[str]:
+        write_backs.append(get_batch_write_back())
+        for message_id, sqs_message in sqs_messages.items():
+            get_batch_write_back().add(sqs_message["retailerId"], {"order": sqs_message["order"]}, message_id)
+        return []
+
+    posted = []
+    event = make_event({"retailerId": 1, "order": "A"}, {"retailerId": 2, "order": "B"},
+                       {"retailerId": 1, "order": "C"})
+    with mock.patch.object(write_back, "post_inspection", lambda retailer_id, inspection: posted.append(inspection)), \
+            mock.patch("wms.common.utility.IdempotencySettings.ENABLED", False):
+        result = process_sqs_message_groups_return_batch_failures(event, lambda message: message["retailerId"],
+                                                                  process_group, max_workers=2)
+
+    assert result == {"batchItemFailures": []}
+    assert len(write_backs) == 2 and write_backs[0] is write_backs[1]
+    assert sorted(inspection["order"] for inspection in posted) == ["A", "B", "C"]
+
+
+def test_failed_write_back_fails_the_messages(app):
+    def process_group(sqs_messages: Dict[str, dict]) -> List[str]:
+        get_batch_write_back().add(1, {"order": "A"}, *sqs_messages)
+        return []
+
+    def post_inspection(retailer_id, inspection):
+        raise ConnectionError("rplatform is down")
+
+    with mock.patch.object(write_back, "post_inspection", post_inspection), \
+            mock.patch("wms.common.utility.IdempotencySettings.ENABLED", False):
+        result = process_sqs_message_groups_return_batch_failures(make_event({"order": "A"}, {"order": "A"}),
+                                                                  lambda message: message["order"], process_group)
+
+    assert result == {"batchItemFailures": [{"itemIdentifier": "m0"}, {"itemIdentifier": "m1"}]}
+
+
+def test_inspections_are_posted_concurrently():
+    # every post waits for the others, which only passes when they run at the same time
+    posted_together = threading.Barrier(3, timeout=5)
+    inspections = InspectionWriteBack()
+    for position in range(3):
+        inspections.add(1, {"order": position}, f"m{position}")
+
+    with mock.patch.object(write_back, "post_inspection", lambda retailer_id, inspection: posted_together.wait()):
+        assert inspections.flush(max_workers=3) == []
+
+
+def test_inspections_without_time_left_are_not_posted():
+    inspections = InspectionWriteBack()
+    inspections.add(1, {"order": "A"}, "m0", "m1")
+
+    with mock.patch.object(write_back, "post_inspection", side_effect=AssertionError("posted")), \
+            mock.patch.object(write_back.WriteBackSettings, "MIN_POST_SECONDS", 10), deadline(5):
+        assert inspections.flush() == ["m0", "m1"]
+
+
+def test_posts_cannot_outlive_the_deadline():
+    session = mock.Mock()
+    with mock.patch.object(write_back, "get_http_session", return_value=session), deadline(2):
+        write_back.post_inspection(1, {"order": "A"})
+
+    connect_timeout, read_timeout = session.post.call_args.kwargs["timeout"]
+    assert connect_timeout <= 2 and read_timeout <= 2
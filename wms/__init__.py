@@ -1,34 +1,56 @@
 import logging
 import os
-
-import boto3
-import click
+import threading
+from typing import Optional
 
 from flask import Flask
-from flask.cli import with_appcontext
-from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
 
 __version__ = (1, 0, 0, "dev")
 
-# Log everything, and send it to stderr.
-from sqlalchemy.orm import close_all_sessions
-
-logging.basicConfig(filename="error.log", level=logging.INFO, format='%(asctime)s %(message)s')
+# Log everything, and send it to stderr. Outside of lambda (which ships stderr to CloudWatch) it goes to error.log.
+logging.basicConfig(filename=None if os.environ.get('AWS_LAMBDA_FUNCTION_NAME') else "error.log",
+                    level=logging.INFO, format='%(asctime)s %(message)s')
 logger = logging.getLogger()
 
 db: SQLAlchemy = SQLAlchemy()
 
-sqs = boto3.client('sqs', region_name='eu-west-1')
-sns = boto3.client('sns', region_name='eu-west-1')
-s3 = boto3.client('s3', region_name='eu-west-1')
 is_production: bool = os.environ.get('ENV_TYPE') == 'prod'
 
+# boto3 is slow to import and most sqs handlers never touch aws, so the clients are created on first use
+AWS_CLIENTS = ('sqs', 'sns', 's3')
+_aws_clients: dict = {}
+_aws_clients_lock = threading.Lock()
+
+
+def get_aws_client(service_name: str):
+    client = _aws_clients.get(service_name)
+    if client is None:
+        with _aws_clients_lock:
+            client = _aws_clients.get(service_name)
+            if client is None:
+                import boto3
+                client = boto3.client(service_name, region_name='eu-west-1')
+                _aws_clients[service_name] = client
+    return client
+
+
+def __getattr__(name: str):
+    # keeps `from wms import sqs` working
+    if name in AWS_CLIENTS:
+        return get_aws_client(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 def create_app(test_config=None):
     """Create and configure an instance of the Flask application."""
+    from flask_cors import CORS
+
+    from wms.cli import backfill_returns_command, init_db_command
+
     app = Flask(__name__, instance_relative_config=True)
-    CORS(app)
+    # ongoing posts its webhooks server to server, browsers have no business calling them
+    CORS(app, resources={r"^(?!/ongoing/webhooks/).*": {}})
 
     # some deploy systems set the database url in the environ
     db_url = os.environ.get("DATABASE_URL")
@@ -52,9 +74,10 @@ def create_app(test_config=None):
         # load the test config if passed in
         app.config.update(test_config)
 
-    # initialize Flask-SQLAlchemy and the init-db command
+    # initialize Flask-SQLAlchemy and the cli commands
     db.init_app(app)
     app.cli.add_command(init_db_command)
+    app.cli.add_command(backfill_returns_command)
 
     # apply the blueprints to the app
     # from dashboard import common, order, setting, retailer, auth, reason, statistic, communicate, shipmenttracker, \
@@ -86,7 +109,9 @@ def create_app(test_config=None):
     # app.register_blueprint(billing.bp)
     # app.register_blueprint(feedback.bp)
     # app.register_blueprint(intercom.bp)
+    from wms.ongoing import webhooks
 
+    app.register_blueprint(webhooks.bp)
 
     return app
 
@@ -107,6 +132,16 @@ def create_app_for_triggered_event(test_config=None):
         SECRET_KEY=os.environ.get("SECRET_KEY", "dev"),
         SQLALCHEMY_DATABASE_URI=db_url,
         SQLALCHEMY_TRACK_MODIFICATIONS=False,
+        # the engine lives as long as the lambda container: keep the pool small (RDS Proxy does the
+        # multiplexing), recycle connections before the proxy/server drops idle ones and ping on checkout
+        # since a frozen container can hold connections that died in between invocations
+        SQLALCHEMY_ENGINE_OPTIONS={
+            'pool_pre_ping': True,
+            'pool_recycle': int(os.environ.get('SQLALCHEMY_POOL_RECYCLE', "240")),
+            'pool_size': int(os.environ.get('SQLALCHEMY_POOL_SIZE', "2")),
+            'max_overflow': int(os.environ.get('SQLALCHEMY_MAX_OVERFLOW', "3")),
+            'pool_timeout': int(os.environ.get('SQLALCHEMY_POOL_TIMEOUT', "10")),
+        }
     )
 
     if test_config is None:
@@ -116,21 +151,21 @@ def create_app_for_triggered_event(test_config=None):
         # load the test config if passed in
         app.config.update(test_config)
 
-    # initialize Flask-SQLAlchemy and the init-db command
-    close_all_sessions()
+    # initialize Flask-SQLAlchemy
     db.init_app(app)
 
     return app
 
 
-def init_db():
-    # db.drop_all()
-    db.create_all()
+_triggered_event_app: Optional[Flask] = None
+_triggered_event_app_lock = threading.Lock()
 
 
-@click.command("init-db")
-@with_appcontext
-def init_db_command():
-    """Clear existing data and create new tables."""
-    init_db()
-    click.echo("Initialized the database.")
+def get_triggered_event_app() -> Flask:
+    """Return the app (and its engine) shared by every invocation of a warm lambda container."""
+    global _triggered_event_app
+    if _triggered_event_app is None:
+        with _triggered_event_app_lock:
+            if _triggered_event_app is None:
+                _triggered_event_app = create_app_for_triggered_event()
+    return _triggered_event_app
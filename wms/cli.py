@@ -0,0 +1,69 @@
+import os
+import time
+
+import click
+from flask.cli import with_appcontext
+
+from wms import db
+
+
+def init_db():
+    # register the tables owned by this service
+    import wms.common.model  # noqa: F401
+    import wms.ongoing.model  # noqa: F401
+
+    # db.drop_all()
+    db.create_all()
+
+
+@click.command("init-db")
+@with_appcontext
+def init_db_command():
+    """Clear existing data and create new tables."""
+    init_db()
+    click.echo("Initialized the database.")
+
+
+@click.command("backfill-returns")
+@click.option("--retailer-id", "retailer_ids", type=int, multiple=True, required=True,
+              help="Retailer to backfill, can be given several times.")
+@click.option("--from", "from_day", type=click.DateTime(formats=["%Y-%m-%d"]), required=True,
+              help="First day of returns.")
+@click.option("--to", "to_day", type=click.DateTime(formats=["%Y-%m-%d"]), required=True,
+              help="Last day of returns, included.")
+@click.option("--processes", type=int, default=min(4, os.cpu_count() or 1), show_default=True,
+              help="Retailer days backfilled in parallel.")
+@click.option("--restart", is_flag=True, help="Ignore the checkpoints of earlier runs.")
+@with_appcontext
+def backfill_returns_command(retailer_ids, from_day, to_day, processes, restart):
+    """Write back the inspections of returns between two days again, resuming where an earlier run stopped."""
+    from wms.ongoing.backfill import BackfillResult, get_pending_chunks, run_backfill, save_checkpoint
+
+    chunks = get_pending_chunks(list(retailer_ids), from_day.date(), to_day.date(), restart)
+    click.echo(f"Backfilling {len(chunks)} retailer days, {processes} at a time")
+
+    started = time.perf_counter()
+    progress = {"done": 0, "failed": 0, "inspections": 0}
+
+    def report(result: BackfillResult):
+        progress["done"] += 1
+        if result.error:
+            progress["failed"] += 1
+            click.echo(f"[{progress['done']}/{len(chunks)}] retailer {result.retailer_id} {result.day}: failed, "
+                       f"{result.error}", err=True)
+            return
+
+        save_checkpoint(result)
+        progress["inspections"] += result.inspections
+        elapsed = time.perf_counter() - started
+        click.echo(f"[{progress['done']}/{len(chunks)}] retailer {result.retailer_id} {result.day}: "
+                   f"{result.inspections} inspections in {result.seconds:.1f}s, "
+                   f"{progress['inspections'] / elapsed:.1f} inspections/s and "
+                   f"{progress['done'] / elapsed:.2f} days/s overall")
+
+    run_backfill(chunks, processes, report)
+
+    click.echo(f"Backfilled {progress['inspections']} inspections over {progress['done'] - progress['failed']} "
+               f"retailer days in {time.perf_counter() - started:.1f}s")
+    if progress["failed"]:
+        raise click.ClickException(f"{progress['failed']} retailer days failed, run the command again to retry them")
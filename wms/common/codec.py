@@ -0,0 +1,125 @@
+# JSON encoding and decoding of the sqs messages, ongoing responses and rplatform posts. orjson or msgspec are used
+# when installed, the standard library otherwise. Dataclasses are encoded as they are, without asdict copying them
+# into dicts first.
+#
+# Every codec writes compact json, without the spaces json.dumps puts after separators by default. The json module
+# escapes non-ascii characters, as json.dumps always did here, orjson and msgspec write them as utf-8. Either way
+# it's the same json but not the same bytes.
+#
+# Keys that are hashed and stored, like the idempotency keys and order fingerprints, keep using the json module:
+# they have to come out byte for byte the same whichever codec a container has.
+
+import dataclasses
+import json
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from typing import Any, Callable, Dict, Tuple, Union
+
+from wms import logger
+from wms.common.constants import JsonCodecSettings
+
+JsonInput = Union[str, bytes, bytearray, memoryview]
+
+
+class JsonCodec(ABC):
+    name: str = ""
+
+    @abstractmethod
+    def loads(self, data: JsonInput) -> Any:
+        pass
+
+    @abstractmethod
+    def dumps(self, obj: Any) -> bytes:
+        """Compact json of ``obj``, which may contain dataclasses."""
+        pass
+
+
+class StdlibJsonCodec(JsonCodec):
+    name = "json"
+
+    def __init__(self):
+        # ascii escaped like json.dumps, but without its spaces after separators, so compact like the other codecs.
+        # The bodies are the same json as before the codecs, not the same bytes
+        self._encoder = json.JSONEncoder(separators=(",", ":"), default=_dataclass_to_dict)
+
+    def loads(self, data: JsonInput) -> Any:
+        if isinstance(data, memoryview):
+            data = data.tobytes()
+        return json.loads(data)
+
+    def dumps(self, obj: Any) -> bytes:
+        return self._encoder.encode(obj).encode()
+
+
+class OrjsonJsonCodec(JsonCodec):
+    name = "orjson"
+
+    def __init__(self):
+        import orjson
+        self._loads = orjson.loads
+        self._dumps = orjson.dumps
+        # the json module turns e.g. int keys into strings too
+        self._options = orjson.OPT_NON_STR_KEYS
+
+    def loads(self, data: JsonInput) -> Any:
+        return self._loads(data)
+
+    def dumps(self, obj: Any) -> bytes:
+        return self._dumps(obj, option=self._options)
+
+
+class MsgspecJsonCodec(JsonCodec):
+    name = "msgspec"
+
+    def __init__(self):
+        import msgspec
+        self._decoder = msgspec.json.Decoder()
+        self._encoder = msgspec.json.Encoder()
+
+    def loads(self, data: JsonInput) -> Any:
+        return self._decoder.decode(data)
+
+    def dumps(self, obj: Any) -> bytes:
+        return self._encoder.encode(obj)
+
+
+_CODECS: Dict[str, Callable[[], JsonCodec]] = {
+    OrjsonJsonCodec.name: OrjsonJsonCodec,
+    MsgspecJsonCodec.name: MsgspecJsonCodec,
+    StdlibJsonCodec.name: StdlibJsonCodec,
+}
+
+
+def get_json_codec(name: str = "auto") -> JsonCodec:
+    """The codec called ``name``, or with "auto" the fastest one installed."""
+    if name != "auto":
+        return _CODECS[name]()
+
+    for codec in _CODECS.values():
+        try:
+            return codec()
+        except ImportError:
+            continue
+    return StdlibJsonCodec()
+
+
+def _dataclass_to_dict(obj: Any) -> dict:
+    # only the top level is copied, the encoder calls back for nested dataclasses
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        return {name: getattr(obj, name) for name in _field_names(type(obj))}
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+@lru_cache(maxsize=None)
+def _field_names(dataclass_type: type) -> Tuple[str, ...]:
+    return tuple(field.name for field in dataclasses.fields(dataclass_type))
+
+
+try:
+    codec: JsonCodec = get_json_codec(JsonCodecSettings.BACKEND)
+except (ImportError, KeyError):
+    logger.exception(f"Json codec {JsonCodecSettings.BACKEND} isn't available, using the json module")
+    codec = StdlibJsonCodec()
+
+loads: Callable[[JsonInput], Any] = codec.loads
+dumps: Callable[[Any], bytes] = codec.dumps
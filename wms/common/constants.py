@@ -1,3 +1,4 @@
+import tempfile
 from os import getenv
 
 
@@ -7,3 +8,137 @@ class RetailerWarehouseIntegrationType:
 
 class YaylohServices:
     RPLATFORM = getenv("RPLATFORM_URL")
+
+
+class WriteBackSettings:
+    # concurrent inspection posts to RPLATFORM at the end of a batch, within HTTP_POOL_MAXSIZE
+    MAX_WORKERS = int(getenv("RPLATFORM_WRITE_BACK_MAX_WORKERS", "8"))
+    # no post is started with less time than this left, its messages are left for sqs to redeliver
+    MIN_POST_SECONDS = float(getenv("RPLATFORM_WRITE_BACK_MIN_POST_SECONDS", "1"))
+
+
+class OngoingSettings:
+    API_URL = getenv("ONGOING_API_URL", "https://api.ongoingsystems.se")
+
+
+class HttpClientSettings:
+    POOL_CONNECTIONS = int(getenv("HTTP_POOL_CONNECTIONS", "4"))
+    POOL_MAXSIZE = int(getenv("HTTP_POOL_MAXSIZE", "10"))
+    CONNECT_TIMEOUT = float(getenv("HTTP_CONNECT_TIMEOUT", "3.05"))
+    READ_TIMEOUT = float(getenv("HTTP_READ_TIMEOUT", "25"))
+    ACCEPT_ENCODING = getenv("HTTP_ACCEPT_ENCODING", "gzip, deflate")
+
+
+class OngoingRequestSettings:
+    # requests/second per warehouse to start from, the rate adapts to the 429s ongoing answers with
+    RATE = float(getenv("ONGOING_RATE", "10"))
+    MIN_RATE = float(getenv("ONGOING_MIN_RATE", "1"))
+    MAX_RATE = float(getenv("ONGOING_MAX_RATE", "50"))
+    BURST = int(getenv("ONGOING_BURST", "10"))
+    MAX_RETRIES = int(getenv("ONGOING_MAX_RETRIES", "3"))
+    BACKOFF_BASE_SECONDS = float(getenv("ONGOING_BACKOFF_BASE_SECONDS", "0.2"))
+    BACKOFF_MAX_SECONDS = float(getenv("ONGOING_BACKOFF_MAX_SECONDS", "5"))
+    # consecutive failures that open a warehouse's circuit, and how long it stays open before a probe
+    CIRCUIT_FAILURES = int(getenv("ONGOING_CIRCUIT_FAILURES", "5"))
+    CIRCUIT_RESET_SECONDS = float(getenv("ONGOING_CIRCUIT_RESET_SECONDS", "30"))
+    # lambda time kept back for reporting the batch failures after the last request
+    DEADLINE_HEADROOM_SECONDS = float(getenv("DEADLINE_HEADROOM_SECONDS", "2"))
+
+
+class AsyncHttpClientSettings:
+    # total connections of the shared aiohttp connector
+    POOL_SIZE = int(getenv("ASYNC_HTTP_POOL_SIZE", "100"))
+    # concurrent requests to one ongoing warehouse, whatever the number of goods owners fanned out to it
+    WAREHOUSE_CONCURRENCY = int(getenv("ONGOING_WAREHOUSE_CONCURRENCY", "8"))
+    DNS_CACHE_SECONDS = int(getenv("ASYNC_HTTP_DNS_CACHE_SECONDS", "300"))
+
+
+class IntegrationCacheSettings:
+    TTL_SECONDS = float(getenv("INTEGRATION_CACHE_TTL_SECONDS", "300"))
+    MAX_SIZE = int(getenv("INTEGRATION_CACHE_MAX_SIZE", "1024"))
+    # retailers without an integration are remembered for a short while only, so a new one is picked up quickly
+    MISSING_TTL_SECONDS = float(getenv("INTEGRATION_CACHE_MISSING_TTL_SECONDS", "30"))
+
+
+class SqsBatchSettings:
+    # 1 keeps the records of a batch strictly sequential
+    MAX_WORKERS = int(getenv("SQS_BATCH_MAX_WORKERS", "1"))
+    PRESERVE_ORDER = getenv("SQS_BATCH_PRESERVE_ORDER", "true").lower() == "true"
+    # a record is only started while the time it takes on average, with this margin, is left before the deadline
+    COST_MARGIN = float(getenv("SQS_BATCH_COST_MARGIN", "1.5"))
+    COST_EWMA_ALPHA = float(getenv("SQS_BATCH_COST_EWMA_ALPHA", "0.2"))
+
+
+class IdempotencySettings:
+    # skip redeliveries of sqs messages that were processed already
+    ENABLED = getenv("SQS_IDEMPOTENCY", "true").lower() == "true"
+    # as long as sqs may redeliver a message, its default retention is 4 days
+    TTL_SECONDS = int(getenv("SQS_IDEMPOTENCY_TTL_SECONDS", str(4 * 24 * 3600)))
+    CACHE_MAX_SIZE = int(getenv("SQS_IDEMPOTENCY_CACHE_MAX_SIZE", "10000"))
+    PURGE_INTERVAL_SECONDS = float(getenv("SQS_IDEMPOTENCY_PURGE_INTERVAL_SECONDS", "3600"))
+
+
+class OrderIndexSettings:
+    TTL_SECONDS = float(getenv("ORDER_INDEX_TTL_SECONDS", "900"))
+    # bounded by the size of the ongoing responses the indexes were built from
+    MAX_BYTES = int(getenv("ORDER_INDEX_MAX_BYTES", str(64 * 1024 * 1024)))
+    # a miss in an index older than this refetches the day, since orders keep coming in for recent days
+    MISS_REFRESH_SECONDS = float(getenv("ORDER_INDEX_MISS_REFRESH_SECONDS", "60"))
+
+
+class OrderReplicaSettings:
+    # look orders up by goodsOwnerOrderId in the local replica first, before downloading a day of orders
+    ENABLED = getenv("ONGOING_ORDER_REPLICA", "false").lower() == "true"
+    # where the first sync of a goods owner starts when no from date is given
+    INITIAL_LOOKBACK_DAYS = int(getenv("ONGOING_ORDER_REPLICA_INITIAL_LOOKBACK_DAYS", "7"))
+    COMMIT_SIZE = int(getenv("ONGOING_ORDER_REPLICA_COMMIT_SIZE", "200"))
+
+
+class ReturnedOrdersSyncSettings:
+    # where the first sync of a goods owner starts when no from date is given
+    INITIAL_LOOKBACK_DAYS = int(getenv("RETURNED_ORDERS_INITIAL_LOOKBACK_DAYS", "1"))
+    HANDOFF_SIZE = int(getenv("RETURNED_ORDERS_HANDOFF_SIZE", "100"))
+
+
+class ReturnsPollerSettings:
+    # every sync holds a db connection, stay within SQLALCHEMY_POOL_SIZE + SQLALCHEMY_MAX_OVERFLOW
+    MAX_WORKERS = int(getenv("RETURNS_POLLER_MAX_WORKERS", "5"))
+    # concurrent syncs against one ongoing warehouse
+    WAREHOUSE_CONCURRENCY = int(getenv("RETURNS_POLLER_WAREHOUSE_CONCURRENCY", "2"))
+    # no sync is started with less time than this left, the goods owners left over are polled next time
+    MIN_SYNC_SECONDS = float(getenv("RETURNS_POLLER_MIN_SYNC_SECONDS", "10"))
+
+
+class WebhookSettings:
+    RETURN_ORDER_QUEUE_URL = getenv("ONGOING_RETURN_ORDER_QUEUE_URL")
+    PICKING_QUEUE_URL = getenv("ONGOING_PICKING_QUEUE_URL")
+    # webhooks have to carry it as ?token=, without it they're all refused
+    TOKEN = getenv("ONGOING_WEBHOOK_TOKEN")
+    # how long a webhook waits for others to share its send_message_batch call. A lambda container serves one
+    # request at a time, so there it only batches the webhooks of one request
+    FLUSH_SECONDS = float(getenv("WEBHOOK_SQS_FLUSH_SECONDS", "0" if getenv("AWS_LAMBDA_FUNCTION_NAME") else "0.05"))
+    SEND_TIMEOUT_SECONDS = float(getenv("WEBHOOK_SQS_SEND_TIMEOUT_SECONDS", "10"))
+
+
+class JsonCodecSettings:
+    # "auto" picks orjson or msgspec when installed, "json" forces the standard library
+    BACKEND = getenv("JSON_CODEC", "auto")
+
+
+class RecordingSettings:
+    # record sqs batches with the http responses they got, to replay them with benchmarks/replay.py
+    ENABLED = getenv("RECORDING", "false").lower() == "true"
+    # share of the batches recorded
+    SAMPLE_RATE = float(getenv("RECORDING_SAMPLE_RATE", "0.01"))
+    # response bodies are recorded up to this size, larger ones are cut off and marked truncated
+    MAX_BODY_BYTES = int(getenv("RECORDING_MAX_BODY_BYTES", str(5 * 1024 * 1024)))
+    DIRECTORY = getenv("RECORDING_DIR", tempfile.gettempdir())
+    # when set, recordings go to this bucket instead of the directory
+    S3_BUCKET = getenv("RECORDING_S3_BUCKET")
+    S3_PREFIX = getenv("RECORDING_S3_PREFIX", "recordings/")
+
+
+class MetricsSettings:
+    # "emf" writes CloudWatch embedded metric format lines to stdout, "null" drops everything
+    BACKEND = getenv("METRICS_BACKEND", "emf")
+    NAMESPACE = getenv("METRICS_NAMESPACE", "yenrich")
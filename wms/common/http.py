@@ -0,0 +1,63 @@
+import threading
+from typing import Callable, Dict, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from wms.common.constants import HttpClientSettings, RecordingSettings
+from wms.common.recording import RecordingHTTPAdapter
+
+# one keep-alive session per host, living as long as the (warm) lambda container
+_sessions: Dict[str, requests.Session] = {}
+_sessions_lock = threading.Lock()
+
+
+def get_http_session(url: str) -> requests.Session:
+    parts = urlsplit(url)
+    host = f"{parts.scheme}://{parts.netloc}"
+
+    session = _sessions.get(host)
+    if session is None:
+        with _sessions_lock:
+            session = _sessions.get(host)
+            if session is None:
+                session = _create_session()
+                _sessions[host] = session
+    return session
+
+
+def get_http_timeout() -> Tuple[float, float]:
+    return HttpClientSettings.CONNECT_TIMEOUT, HttpClientSettings.READ_TIMEOUT
+
+
+def set_http_adapter_factory(adapter_factory: Callable[[], HTTPAdapter]):
+    """Mount adapters from ``adapter_factory`` on every session from now on, e.g. to replay recorded responses."""
+    global _adapter_factory
+    _adapter_factory = adapter_factory
+    close_http_sessions()
+
+
+def close_http_sessions():
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+
+
+def _create_adapter() -> HTTPAdapter:
+    adapter_class = RecordingHTTPAdapter if RecordingSettings.ENABLED else HTTPAdapter
+    return adapter_class(pool_connections=HttpClientSettings.POOL_CONNECTIONS,
+                         pool_maxsize=HttpClientSettings.POOL_MAXSIZE)
+
+
+_adapter_factory: Callable[[], HTTPAdapter] = _create_adapter
+
+
+def _create_session() -> requests.Session:
+    session = requests.Session()
+    adapter = _adapter_factory()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({"Accept-Encoding": HttpClientSettings.ACCEPT_ENCODING})
+    return session
@@ -0,0 +1,115 @@
+# Remembers the sqs messages that were processed successfully, so that their redeliveries are acknowledged without
+# redoing any ongoing or rplatform calls. Backed by the service's database, with an in-memory cache in front of it.
+
+import hashlib
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Hashable, Iterable, List, Optional, Set
+
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+from wms import db, logger
+from wms.common.cache import TTLCache
+from wms.common.constants import IdempotencySettings
+from wms.common.model import ProcessedSqsMessage
+
+IdempotencyKey = Callable[[dict], Optional[Hashable]]
+
+_processed = TTLCache(maxsize=IdempotencySettings.CACHE_MAX_SIZE, ttl=IdempotencySettings.TTL_SECONDS)
+_last_purge = 0.0
+_purge_lock = threading.Lock()
+
+
+def get_idempotency_key(namespace: str, message_id: str, sqs_message: dict,
+                        idempotency_key: IdempotencyKey = None) -> str:
+    """Key of a message: the content key ``idempotency_key`` gives for it, or else its sqs message id."""
+    content_key = None
+    if idempotency_key is not None:
+        try:
+            content_key = idempotency_key(sqs_message)
+        except (KeyError, TypeError, AttributeError):
+            content_key = None
+
+    key = ["content", content_key] if content_key is not None else ["message", message_id]
+    return hashlib.sha1(json.dumps([namespace] + key, default=str).encode()).hexdigest()
+
+
+def get_processed_keys(keys: Iterable[str]) -> Set[str]:
+    """The keys among ``keys`` that were processed already and haven't expired yet."""
+    keys = set(keys)
+    processed = {key for key in keys if _processed.get(key)}
+    missing = keys - processed
+    if not missing:
+        return processed
+
+    try:
+        rows = db.session.query(ProcessedSqsMessage.key) \
+            .filter(ProcessedSqsMessage.key.in_(missing), ProcessedSqsMessage.expires_at > datetime.utcnow()) \
+            .all()
+    except SQLAlchemyError:
+        # better to process a duplicate than to drop a message
+        logger.exception("Processed sqs messages couldn't be looked up")
+        db.session.rollback()
+        return processed
+
+    for (key,) in rows:
+        _processed.set(key, True)
+        processed.add(key)
+    return processed
+
+
+def mark_processed(keys: Iterable[str]):
+    keys = set(keys)
+    if not keys:
+        return
+
+    now = datetime.utcnow()
+    expires_at = now + timedelta(seconds=IdempotencySettings.TTL_SECONDS)
+    try:
+        # another container can record the same keys concurrently, an upsert doesn't race it into an IntegrityError
+        _upsert_processed([{"key": key, "processed_at": now, "expires_at": expires_at} for key in sorted(keys)])
+        _purge_expired()
+        db.session.commit()
+    except SQLAlchemyError:
+        logger.exception("Processed sqs messages couldn't be recorded")
+        db.session.rollback()
+
+    for key in keys:
+        _processed.set(key, True)
+
+
+def _upsert_processed(rows: List[dict]):
+    # imported on first use rather than with the module, which every handler loads
+    from sqlalchemy.dialects import mysql, sqlite
+
+    table = ProcessedSqsMessage.__table__
+    connection = db.session.connection()
+    if connection.dialect.name == "mysql":
+        statement = mysql.insert(table).values(rows)
+        connection.execute(statement.on_duplicate_key_update(expires_at=statement.inserted.expires_at))
+    elif connection.dialect.name == "sqlite":
+        statement = sqlite.insert(table).values(rows)
+        connection.execute(statement.on_conflict_do_update(index_elements=[table.c.key],
+                                                           set_={"expires_at": statement.excluded.expires_at}))
+    else:
+        for row in rows:
+            try:
+                with connection.begin_nested():
+                    connection.execute(table.insert().values(row))
+            except IntegrityError:
+                connection.execute(table.update().where(table.c.key == row["key"]).values(expires_at=row["expires_at"]))
+
+
+def _purge_expired():
+    # at most once per interval and container, the expiry index keeps it cheap
+    global _last_purge
+    with _purge_lock:
+        now = time.monotonic()
+        if now - _last_purge < IdempotencySettings.PURGE_INTERVAL_SECONDS:
+            return
+        _last_purge = now
+
+    ProcessedSqsMessage.query.filter(ProcessedSqsMessage.expires_at <= datetime.utcnow()) \
+        .delete(synchronize_session=False)
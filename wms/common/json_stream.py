@@ -0,0 +1,129 @@
+import codecs
+import json
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+
+class JsonArrayStream:
+    """Iterates the items of a top level json array while its bytes are still coming in.
+
+    Only the item being decoded is held in memory, not the whole document. ``bytes_read`` counts the bytes
+    consumed so far; ``close`` is called once the array is exhausted or the stream is closed early.
+    """
+
+    def __init__(self, chunks: Iterable[bytes], close: Callable[[], None] = None, encoding: str = "utf-8"):
+        self.bytes_read: int = 0
+        self._chunks = chunks
+        self._close = close
+        self._encoding = encoding
+
+    def __iter__(self) -> Iterator[Any]:
+        try:
+            yield from iter_json_array(self._count_bytes(self._chunks), self._encoding)
+        finally:
+            self.close()
+
+    def close(self):
+        if self._close:
+            self._close()
+            self._close = None
+
+    def __enter__(self) -> "JsonArrayStream":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _count_bytes(self, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        for chunk in chunks:
+            self.bytes_read += len(chunk)
+            yield chunk
+
+
+def iter_json_array(chunks: Iterable[bytes], encoding: str = "utf-8") -> Iterator[Any]:
+    # the document has to be one complete json array, with nothing but whitespace around it
+    reader = _JsonArrayReader(chunks, encoding)
+    reader.take("[", "Expected a json array")
+
+    if reader.peek() == "]":
+        reader.take("]")
+    else:
+        while True:
+            if reader.peek() is None:
+                raise ValueError("Truncated json array")
+            yield reader.decode_item()
+            if reader.peek() == "]":
+                reader.take("]")
+                break
+            reader.take(",", "Expected ',' or ']' in json array")
+
+    if (char := reader.peek()) is not None:
+        raise ValueError(f"Truncated json array, followed by {char!r}")
+
+
+class _JsonArrayReader:
+    """The decoded text of the chunks read so far, and how far it has been parsed."""
+
+    def __init__(self, chunks: Iterable[bytes], encoding: str):
+        self._decoder = json.JSONDecoder()
+        self._text_decoder = codecs.getincrementaldecoder(encoding)()
+        self._chunks = iter(chunks)
+        self._buffer, self._position = "", 0
+
+    def peek(self) -> Optional[str]:
+        # the next character that isn't whitespace, or None at the end of the document
+        while True:
+            while self._position < len(self._buffer) and self._buffer[self._position] in " \t\r\n":
+                self._position += 1
+            if self._position < len(self._buffer):
+                return self._buffer[self._position]
+            if not self._read_more():
+                return None
+
+    def take(self, expected: str, error: str = None):
+        char = self.peek()
+        if char is None:
+            raise ValueError("Truncated json array")
+        if char != expected:
+            raise ValueError(f"{error}, got {char!r}")
+        self._position += 1
+
+    def decode_item(self) -> Any:
+        while True:
+            buffer, position = self._buffer, self._position
+            try:
+                item, end = self._decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # the item is incomplete, read at least as much again as is pending to decode in linear time
+                if self._read_more(2 * (len(buffer) - position)):
+                    continue
+                raise
+
+            # a number at the very end of the buffer may continue in the next chunk
+            if isinstance(item, (int, float)) and (end == len(buffer) or buffer[end] in ".eE+-0123456789"):
+                if self._read_more(len(buffer) - position + 1):
+                    continue
+                # the document ended, in the middle of the number or right after it
+                if not buffer[end:].lstrip(".eE+-0123456789"):
+                    raise ValueError("Truncated json array")
+                item, end = self._decoder.raw_decode(self._buffer)
+
+            self._position = end
+            return item
+
+    def _read_more(self, min_length: int = 1) -> bool:
+        # drops what was consumed already and appends chunks until ``min_length`` characters are pending
+        pending = [self._buffer[self._position:]]
+        pending_length = len(pending[0])
+        exhausted = False
+        while pending_length < min_length:
+            chunk = next(self._chunks, None)
+            text = self._text_decoder.decode(b"", final=True) if chunk is None else self._text_decoder.decode(chunk)
+            pending.append(text)
+            pending_length += len(text)
+            if chunk is None:
+                exhausted = True
+                break
+
+        grew = pending_length > len(self._buffer) - self._position
+        self._buffer, self._position = "".join(pending), 0
+        return grew or not exhausted
@@ -0,0 +1,118 @@
+# Lightweight per-batch instrumentation: stage timers and counters are collected for the batch being processed
+# and emitted as one summary line at its end. Outside of a batch every call is a no-op.
+
+import json
+import sys
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from wms import logger
+from wms.common.constants import MetricsSettings
+
+
+class MetricsBackend(ABC):
+    @abstractmethod
+    def emit(self, dimensions: Dict[str, str], metrics: Dict[str, Tuple[float, str]]):
+        pass
+
+
+class NullMetricsBackend(MetricsBackend):
+    def emit(self, dimensions: Dict[str, str], metrics: Dict[str, Tuple[float, str]]):
+        pass
+
+
+class InMemoryMetricsBackend(MetricsBackend):
+    def __init__(self):
+        self.batches: List[Tuple[Dict[str, str], Dict[str, Tuple[float, str]]]] = []
+
+    def emit(self, dimensions: Dict[str, str], metrics: Dict[str, Tuple[float, str]]):
+        self.batches.append((dimensions, metrics))
+
+
+class EmfMetricsBackend(MetricsBackend):
+    """Writes CloudWatch embedded metric format lines to stdout, which lambda ships to CloudWatch Logs."""
+
+    def __init__(self, namespace: str = MetricsSettings.NAMESPACE):
+        self.namespace = namespace
+
+    def emit(self, dimensions: Dict[str, str], metrics: Dict[str, Tuple[float, str]]):
+        document = {
+            "_aws": {
+                "Timestamp": int(time.time() * 1000),
+                "CloudWatchMetrics": [{
+                    "Namespace": self.namespace,
+                    "Dimensions": [list(dimensions)],
+                    "Metrics": [{"Name": name, "Unit": unit} for name, (_, unit) in metrics.items()],
+                }],
+            },
+            **dimensions,
+            **{name: round(value, 3) for name, (value, _) in metrics.items()},
+        }
+        sys.stdout.write(json.dumps(document) + "\n")
+        sys.stdout.flush()
+
+
+class BatchMetrics:
+    def __init__(self):
+        self._values: Dict[str, Tuple[float, str]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, name: str, value: float, unit: str = "Count"):
+        with self._lock:
+            current, _ = self._values.get(name, (0, unit))
+            self._values[name] = (current + value, unit)
+
+    def snapshot(self) -> Dict[str, Tuple[float, str]]:
+        with self._lock:
+            return dict(self._values)
+
+
+_backend: MetricsBackend = NullMetricsBackend() if MetricsSettings.BACKEND == "null" else EmfMetricsBackend()
+_current_batch: ContextVar[Optional[BatchMetrics]] = ContextVar("current_batch_metrics", default=None)
+
+
+def set_metrics_backend(backend: MetricsBackend):
+    global _backend
+    _backend = backend
+
+
+def incr(name: str, value: float = 1, unit: str = "Count"):
+    batch = _current_batch.get()
+    if batch is not None:
+        batch.add(name, value, unit)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time a stage, adding up to ``<name>_ms`` and counting ``<name>_count`` for the current batch."""
+    batch = _current_batch.get()
+    if batch is None:
+        yield
+        return
+
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        batch.add(f"{name}_ms", (time.perf_counter() - started) * 1000, "Milliseconds")
+        batch.add(f"{name}_count", 1)
+
+
+@contextmanager
+def batch_metrics(handler: str) -> Iterator[BatchMetrics]:
+    """Collect the metrics of one sqs batch and emit them as a single summary when it's done."""
+    batch = BatchMetrics()
+    token = _current_batch.set(batch)
+    try:
+        with stage("batch"):
+            yield batch
+    finally:
+        _current_batch.reset(token)
+        try:
+            _backend.emit({"Handler": handler}, batch.snapshot())
+        except Exception:
+            logger.exception("Batch metrics couldn't be emitted")
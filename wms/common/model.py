@@ -0,0 +1,13 @@
+from datetime import datetime
+
+from wms import db
+
+
+class ProcessedSqsMessage(db.Model):
+    """Sqs message that was processed successfully, so that a redelivery of it can be skipped until it expires."""
+    __tablename__ = 'processed_sqs_message'
+
+    # sha1 of the handler and the message id or content key of the message
+    key = db.Column(db.String(40), primary_key=True)
+    processed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
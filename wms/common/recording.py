@@ -0,0 +1,239 @@
+# Records sqs batches for replaying them offline: the event, how it was processed, the integrations it looked up,
+# every http response it got from ongoing and RPLATFORM, and its timings, gzipped into one file per batch.
+# benchmarks/replay.py runs recorded batches again against the recorded responses, without any network.
+#
+# Recordings hold production data, the request headers and so the credentials are left out.
+
+import base64
+import gzip
+import os
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from requests import PreparedRequest, Response
+from requests.adapters import HTTPAdapter
+
+from wms import get_aws_client, logger
+from wms.common import codec
+from wms.common.constants import OngoingSettings, RecordingSettings, YaylohServices
+from wms.common.metrics import BatchMetrics
+
+RECORDING_VERSION = 1
+
+
+class BatchRecording:
+    def __init__(self, event: dict, context, processing: Dict[str, Any]):
+        self.event = event
+        self.processing = processing
+        self.remaining_ms: Optional[int] = context.get_remaining_time_in_millis() if context is not None else None
+        self.integrations: Dict[int, dict] = {}
+        self.exchanges: List[dict] = []
+        self.result: Optional[dict] = None
+        self.seconds: float = 0
+        self._lock = threading.Lock()
+
+    def add_integration(self, retailer_id: int, goods_owner_id: int, warehouse_name: str):
+        with self._lock:
+            self.integrations[retailer_id] = {"retailer_id": retailer_id, "goods_owner_id": goods_owner_id,
+                                              "warehouse_name": warehouse_name}
+
+    def add_exchange(self, request: PreparedRequest, seconds: float, response: Response = None,
+                     error: Exception = None, content: bytes = b"", truncated: bool = False):
+        """Record an exchange. ``content`` is the response body as it was read, which isn't read again here."""
+        exchange = {"method": request.method, "url": request.url, "body": encode_body(request.body),
+                    "seconds": round(seconds, 6)}
+        if response is not None:
+            exchange.update(status=response.status_code, reason=response.reason, headers=dict(response.headers),
+                            content=encode_body(content))
+            if truncated:
+                exchange["truncated"] = True
+        if error is not None:
+            exchange["error"] = f"{type(error).__name__}: {error}"
+
+        with self._lock:
+            self.exchanges.append(exchange)
+
+    def to_document(self, batch: Optional[BatchMetrics]) -> dict:
+        return {
+            "version": RECORDING_VERSION,
+            "recorded_at": datetime.utcnow().isoformat(),
+            "ongoing_api_url": OngoingSettings.API_URL,
+            "rplatform_url": YaylohServices.RPLATFORM,
+            "processing": self.processing,
+            "remaining_ms": self.remaining_ms,
+            "seconds": round(self.seconds, 6),
+            "metrics": {name: value for name, (value, _) in batch.snapshot().items()} if batch else {},
+            "integrations": list(self.integrations.values()),
+            "event": self.event,
+            "result": self.result,
+            "exchanges": self.exchanges,
+        }
+
+
+_current_recording: ContextVar[Optional[BatchRecording]] = ContextVar("current_recording", default=None)
+
+
+def get_current_recording() -> Optional[BatchRecording]:
+    return _current_recording.get()
+
+
+@contextmanager
+def record_batch(event: dict, context, batch: Optional[BatchMetrics], mode: str, processing_func: Callable,
+                 **options) -> Iterator[Optional[BatchRecording]]:
+    """Record the batch, if recording is on and the batch is sampled. ``options`` are the processing options,
+    functions among them are recorded by name."""
+    if not RecordingSettings.ENABLED or random.random() >= RecordingSettings.SAMPLE_RATE:
+        yield None
+        return
+
+    processing = {"mode": mode, "function": qualified_name(processing_func)}
+    for name, value in options.items():
+        processing[name] = qualified_name(value) if callable(value) else value
+
+    recording = BatchRecording(event, context, processing)
+    token = _current_recording.set(recording)
+    started = time.perf_counter()
+    try:
+        yield recording
+    finally:
+        recording.seconds = time.perf_counter() - started
+        _current_recording.reset(token)
+        try:
+            save_recording(recording.to_document(batch))
+        except Exception:
+            logger.exception("Sqs batch recording couldn't be saved")
+
+
+def save_recording(document: dict) -> str:
+    file_name = f"{document['processing']['function'].rsplit(':', 1)[-1]}-" \
+                f"{datetime.utcnow():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}.json.gz"
+    content = gzip.compress(codec.dumps(document), compresslevel=6)
+
+    if RecordingSettings.S3_BUCKET:
+        key = f"{RecordingSettings.S3_PREFIX}{file_name}"
+        get_aws_client("s3").put_object(Bucket=RecordingSettings.S3_BUCKET, Key=key, Body=content)
+        return f"s3://{RecordingSettings.S3_BUCKET}/{key}"
+
+    os.makedirs(RecordingSettings.DIRECTORY, exist_ok=True)
+    path = os.path.join(RecordingSettings.DIRECTORY, file_name)
+    with open(path, "wb") as recording_file:
+        recording_file.write(content)
+    return path
+
+
+def load_recording(path: str) -> dict:
+    with gzip.open(path, "rb") as recording_file:
+        return codec.loads(recording_file.read())
+
+
+def qualified_name(func: Callable) -> str:
+    return f"{func.__module__}:{func.__qualname__}"
+
+
+def encode_body(body) -> Optional[dict]:
+    # text as it is, anything else base64 encoded
+    if body is None:
+        return None
+    if isinstance(body, str):
+        return {"text": body}
+    try:
+        return {"text": bytes(body).decode()}
+    except UnicodeDecodeError:
+        return {"base64": base64.b64encode(body).decode()}
+
+
+def decode_body(body: Optional[dict]) -> bytes:
+    if body is None:
+        return b""
+    if "text" in body:
+        return body["text"].encode()
+    return base64.b64decode(body["base64"])
+
+
+def record_exchange(request: PreparedRequest, seconds: float, response: Response = None, error: Exception = None):
+    """Add an exchange whose response was read already, e.g. by the async client, if a batch is recorded."""
+    recording = _current_recording.get()
+    if recording is None:
+        return
+
+    content = response.content if response is not None else b""
+    recording.add_exchange(request, seconds, response, error, content=content[:RecordingSettings.MAX_BODY_BYTES],
+                           truncated=len(content) > RecordingSettings.MAX_BODY_BYTES)
+
+
+class RecordedBody:
+    """Wraps the raw urllib3 response, copying the body as the caller reads it, up to
+    ``RecordingSettings.MAX_BODY_BYTES``. ``on_done`` gets the copy once the body is read to its end or the response
+    is closed, whichever comes first."""
+
+    def __init__(self, raw, on_done: Callable[[bytes, bool], None]):
+        self._raw = raw
+        self._on_done = on_done
+        self._chunks: List[bytes] = []
+        self._size = 0
+        self._done = False
+
+    def __getattr__(self, name: str):
+        return getattr(self._raw, name)
+
+    def stream(self, *args, **kwargs) -> Iterator[bytes]:
+        for chunk in self._raw.stream(*args, **kwargs):
+            self._copy(chunk)
+            yield chunk
+        self._finish()
+
+    def read(self, amt: int = None, *args, **kwargs) -> bytes:
+        data = self._raw.read(amt, *args, **kwargs)
+        self._copy(data)
+        if amt is None or not data:
+            self._finish()
+        return data
+
+    def close(self):
+        try:
+            self._raw.close()
+        finally:
+            self._finish()
+
+    def _copy(self, chunk: bytes):
+        left = RecordingSettings.MAX_BODY_BYTES - self._size
+        if left > 0 and chunk:
+            self._chunks.append(chunk[:left])
+        self._size += len(chunk)
+
+    def _finish(self):
+        if self._done:
+            return
+        self._done = True
+        self._on_done(b"".join(self._chunks), self._size > RecordingSettings.MAX_BODY_BYTES)
+        self._chunks = []
+
+
+class RecordingHTTPAdapter(HTTPAdapter):
+    """Adds the responses of requests made while a batch is recorded to its recording. Bodies are copied as the
+    caller reads them, streamed ones included, so recording doesn't read them ahead of time or hold them twice."""
+
+    def send(self, request: PreparedRequest, **kwargs) -> Response:
+        recording = _current_recording.get()
+        if recording is None:
+            return super().send(request, **kwargs)
+
+        started = time.perf_counter()
+        try:
+            response = super().send(request, **kwargs)
+        except Exception as err:
+            recording.add_exchange(request, time.perf_counter() - started, error=err)
+            raise
+
+        def add_exchange(content: bytes, truncated: bool):
+            recording.add_exchange(request, time.perf_counter() - started, response, content=content,
+                                   truncated=truncated)
+
+        response.raw = RecordedBody(response.raw, add_exchange)
+        return response
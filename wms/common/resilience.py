@@ -0,0 +1,337 @@
+# Keeps the requests to a remote host within what it can sustain: a token bucket that slows down when the host
+# throttles, jittered exponential backoff for failures that are safe to retry, a circuit breaker that fails fast
+# while the host is down and a deadline, so no request is started that can't finish before the lambda times out.
+
+import asyncio
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable, Dict, Iterator, Optional, Tuple, TypeVar
+
+import requests
+from requests import Response
+
+from wms import logger
+from wms.common import metrics
+from wms.common.constants import OngoingRequestSettings
+
+RETRYABLE_STATUS_CODES = frozenset({500, 502, 503, 504})
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+CONNECTION_ERRORS = (requests.exceptions.ConnectionError, requests.exceptions.Timeout)
+
+R = TypeVar("R")
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+_deadline: ContextVar[Optional[float]] = ContextVar("deadline", default=None)
+
+
+@contextmanager
+def deadline(seconds: float) -> Iterator[None]:
+    """Bound the work done inside to ``seconds``, or to the enclosing deadline if that one is earlier."""
+    expires_at = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(expires_at if current is None else min(current, expires_at))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+@contextmanager
+def lambda_deadline(context=None, headroom: float = OngoingRequestSettings.DEADLINE_HEADROOM_SECONDS) \
+        -> Iterator[None]:
+    """Derive the deadline from the remaining time of the lambda ``context``, if there is one."""
+    if context is None or not hasattr(context, "get_remaining_time_in_millis"):
+        yield
+        return
+
+    with deadline(context.get_remaining_time_in_millis() / 1000 - headroom):
+        yield
+
+
+def remaining_time() -> Optional[float]:
+    expires_at = _deadline.get()
+    return None if expires_at is None else expires_at - time.monotonic()
+
+
+def has_time_for(seconds: float) -> bool:
+    remaining = remaining_time()
+    return remaining is None or remaining > seconds
+
+
+def check_deadline(needed: float = 0):
+    remaining = remaining_time()
+    if remaining is not None and remaining < needed:
+        raise DeadlineExceeded(f"Deadline exceeded, {needed:.2f}s needed and {max(remaining, 0):.2f}s left")
+
+
+def get_deadline_timeout(timeout: Tuple[float, float]) -> Tuple[float, float]:
+    """The (connect, read) ``timeout`` of a request, cut down so that it can't outlive the deadline."""
+    connect_timeout, read_timeout = timeout
+    remaining = remaining_time()
+    if remaining is None:
+        return timeout
+
+    check_deadline()
+    return min(connect_timeout, remaining), min(read_timeout, remaining)
+
+
+def backoff_delay(attempt: int, base: float = OngoingRequestSettings.BACKOFF_BASE_SECONDS,
+                  cap: float = OngoingRequestSettings.BACKOFF_MAX_SECONDS) -> float:
+    # "full jitter", so the retries of concurrent callers don't hit the host in lockstep
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def get_retry_after(response: Response) -> Optional[float]:
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+
+    try:
+        return max((parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class CostEstimator:
+    """Exponentially weighted moving average of the time a unit of work takes, per kind of work."""
+
+    def __init__(self, alpha: float):
+        self.alpha = alpha
+        self._averages: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def estimate(self, key: str) -> Optional[float]:
+        """The average so far, None until the first observation."""
+        return self._averages.get(key)
+
+    def observe(self, key: str, seconds: float):
+        with self._lock:
+            average = self._averages.get(key)
+            self._averages[key] = seconds if average is None else average + self.alpha * (seconds - average)
+
+
+class TokenBucket:
+    """Rate limiter that halves its rate when the host throttles and slowly recovers while requests succeed."""
+
+    def __init__(self, rate: float, burst: int, min_rate: float, max_rate: float):
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._last_throttled = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while (wait := self._take()) > 0:
+            check_deadline(wait)
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        while (wait := self._take()) > 0:
+            check_deadline(wait)
+            await asyncio.sleep(wait)
+
+    def throttled(self, retry_after: Optional[float] = None):
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens = 0.0
+            # concurrent requests get throttled together, back off once for all of them
+            if now - self._last_throttled > 1 / self.rate:
+                self.rate = max(self.min_rate, self.rate / 2)
+                self._last_throttled = now
+            if retry_after:
+                self._blocked_until = max(self._blocked_until, now + retry_after)
+
+    def succeeded(self):
+        with self._lock:
+            # additive increase, about one request/second more for every second at full rate
+            self.rate = min(self.max_rate, self.rate + 1 / self.rate)
+
+    def _take(self) -> float:
+        # takes a token and returns 0, or returns how long to wait before trying again
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            wait = self._blocked_until - now
+            if wait <= 0:
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return 0
+                wait = (1 - self._tokens) / self.rate
+            return wait
+
+    def _refill(self, now: float):
+        self._tokens = min(float(self.burst), self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+
+class CircuitBreaker:
+    """Opens after ``failure_threshold`` consecutive failures and lets one probe through every ``reset_timeout``."""
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self._opened_at is not None
+
+    def before_call(self):
+        with self._lock:
+            if self._opened_at is None:
+                return
+
+            now = time.monotonic()
+            if now - self._opened_at < self.reset_timeout:
+                metrics.incr("circuit_open")
+                raise CircuitOpenError(f"{self.name} is unavailable, not calling it for now")
+            # half open, this call is the probe and the others keep failing fast until it's done
+            self._opened_at = now
+
+    def succeeded(self):
+        with self._lock:
+            if self._opened_at is not None:
+                logger.info(f"{self.name} is available again")
+            self._failures = 0
+            self._opened_at = None
+
+    def failed(self):
+        with self._lock:
+            self._failures += 1
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                if self._opened_at is None:
+                    logger.warning(f"{self.name} failed {self._failures} times in a row, failing fast for a while")
+                self._opened_at = time.monotonic()
+
+
+class RequestScheduler:
+    """Sends the requests to one host through its token bucket and circuit breaker.
+
+    Throttled requests (429) are retried for every method, since the host didn't process them; server errors and
+    connection failures only for idempotent methods. Retries wait for ``Retry-After`` or a jittered backoff and
+    stop when the deadline doesn't leave time for another attempt, returning the last response.
+    """
+
+    def __init__(self, name: str, settings=OngoingRequestSettings):
+        self.name = name
+        self.max_retries = settings.MAX_RETRIES
+        self.bucket = TokenBucket(settings.RATE, settings.BURST, settings.MIN_RATE, settings.MAX_RATE)
+        self.breaker = CircuitBreaker(name, settings.CIRCUIT_FAILURES, settings.CIRCUIT_RESET_SECONDS)
+
+    def send(self, method: str, send_request: Callable[[Tuple[float, float]], Response],
+             timeout: Tuple[float, float]) -> Response:
+        method = method.upper()
+        attempt = 0
+        while True:
+            self.breaker.before_call()
+            self.bucket.acquire()
+            try:
+                response = send_request(get_deadline_timeout(timeout))
+            except CONNECTION_ERRORS as err:
+                if (delay := self._get_failure_retry_delay(method, attempt, err)) is None:
+                    raise
+            else:
+                if (delay := self._get_response_retry_delay(method, attempt, response)) is None:
+                    return response
+                response.close()
+
+            metrics.incr("ongoing_retries")
+            time.sleep(delay)
+            attempt += 1
+
+    async def send_async(self, method: str, send_request: Callable[[Tuple[float, float]], Awaitable[R]],
+                         timeout: Tuple[float, float], connection_errors: Tuple[type, ...]) -> R:
+        """Like ``send``, for a coroutine that returns a read response with ``status_code`` and ``headers``.
+        ``connection_errors`` are the exceptions of its http client that are retried like connection failures."""
+        method = method.upper()
+        attempt = 0
+        while True:
+            self.breaker.before_call()
+            await self.bucket.acquire_async()
+            try:
+                response = await send_request(get_deadline_timeout(timeout))
+            except connection_errors as err:
+                if (delay := self._get_failure_retry_delay(method, attempt, err)) is None:
+                    raise
+            else:
+                if (delay := self._get_response_retry_delay(method, attempt, response)) is None:
+                    return response
+
+            metrics.incr("ongoing_retries")
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def _get_failure_retry_delay(self, method: str, attempt: int, err: Exception) -> Optional[float]:
+        # how long to wait before retrying a request that failed to connect or timed out, None to give up
+        self.breaker.failed()
+        delay = backoff_delay(attempt)
+        if method not in IDEMPOTENT_METHODS or not self._can_retry(attempt, delay):
+            return None
+        logger.warning(f"{self.name} request failed, retrying: {err}")
+        return delay
+
+    def _get_response_retry_delay(self, method: str, attempt: int, response) -> Optional[float]:
+        # how long to wait before retrying a request the host answered, None to hand the response over
+        if response.status_code == 429:
+            metrics.incr("ongoing_throttled")
+            # the host is up, just busy: a throttled probe closes the circuit, the bucket slows down instead
+            self.breaker.succeeded()
+            retry_after = get_retry_after(response)
+            self.bucket.throttled(retry_after)
+            delay = max(retry_after or 0, backoff_delay(attempt))
+        elif response.status_code in RETRYABLE_STATUS_CODES:
+            self.breaker.failed()
+            delay = backoff_delay(attempt)
+            if method not in IDEMPOTENT_METHODS:
+                return None
+        else:
+            self.breaker.succeeded()
+            self.bucket.succeeded()
+            return None
+
+        return delay if self._can_retry(attempt, delay) else None
+
+    def _can_retry(self, attempt: int, delay: float) -> bool:
+        remaining = remaining_time()
+        return attempt < self.max_retries and (remaining is None or remaining > delay)
+
+
+_schedulers: Dict[str, RequestScheduler] = {}
+_schedulers_lock = threading.Lock()
+
+
+def get_request_scheduler(name: str) -> RequestScheduler:
+    scheduler = _schedulers.get(name)
+    if scheduler is None:
+        with _schedulers_lock:
+            scheduler = _schedulers.get(name)
+            if scheduler is None:
+                scheduler = RequestScheduler(name)
+                _schedulers[name] = scheduler
+    return scheduler
@@ -0,0 +1,108 @@
+# Buffers outgoing sqs messages into send_message_batch calls: a batch goes out once it holds 10 messages, the
+# most sqs takes, or when the flush window of its first message has passed.
+
+import threading
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Tuple
+
+from wms import get_aws_client, logger
+from wms.common import metrics
+
+SQS_MAX_BATCH_SIZE = 10
+
+
+class SqsSendError(Exception):
+    pass
+
+
+class SqsBatchSender:
+    def __init__(self, queue_url: str, flush_seconds: float):
+        self.queue_url = queue_url
+        self.flush_seconds = flush_seconds
+        self._entries: List[Tuple[dict, Future]] = []
+        self._timer: Optional[threading.Timer] = None
+        self._lock = threading.Lock()
+
+    def send(self, entries: List[dict]) -> List[Future]:
+        """Queue messages, given as send_message_batch entries without an Id.
+
+        The returned futures resolve to the sqs message ids once their batch has been sent.
+        """
+        futures: List[Future] = [Future() for _ in entries]
+        batches: List[List[Tuple[dict, Future]]] = []
+        with self._lock:
+            for entry, future in zip(entries, futures):
+                self._entries.append((entry, future))
+                if len(self._entries) >= SQS_MAX_BATCH_SIZE:
+                    batches.append(self._take_batch())
+
+            if self._entries and self._timer is None:
+                if self.flush_seconds > 0:
+                    self._timer = threading.Timer(self.flush_seconds, self.flush)
+                    self._timer.daemon = True
+                    self._timer.start()
+                else:
+                    batches.append(self._take_batch())
+
+        for batch in batches:
+            self._send_batch(batch)
+        return futures
+
+    def flush(self):
+        while True:
+            with self._lock:
+                batch = self._take_batch()
+            if not batch:
+                return
+            self._send_batch(batch)
+
+    def _take_batch(self) -> List[Tuple[dict, Future]]:
+        batch, self._entries = self._entries[:SQS_MAX_BATCH_SIZE], self._entries[SQS_MAX_BATCH_SIZE:]
+        if not self._entries and self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        return batch
+
+    def _send_batch(self, batch: List[Tuple[dict, Future]]):
+        futures = {str(position): future for position, (_, future) in enumerate(batch)}
+        try:
+            with metrics.stage("sqs_send"):
+                response = get_aws_client("sqs").send_message_batch(
+                    QueueUrl=self.queue_url,
+                    Entries=[dict(entry, Id=str(position)) for position, (entry, _) in enumerate(batch)])
+        except Exception as err:
+            logger.exception(f"Sqs messages couldn't be sent to {self.queue_url}")
+            for future in futures.values():
+                future.set_exception(err)
+            return
+
+        for successful in response.get("Successful", []):
+            futures[successful["Id"]].set_result(successful["MessageId"])
+        for failed in response.get("Failed", []):
+            logger.warning(f"Sqs message couldn't be sent to {self.queue_url}: {failed}")
+            futures[failed["Id"]].set_exception(SqsSendError(failed.get("Message") or failed.get("Code")))
+
+
+def build_sqs_entry(body: str, attributes: Dict[str, dict] = None, group_id: str = None,
+                    deduplication_id: str = None) -> dict:
+    entry = {"MessageBody": body, "MessageAttributes": attributes or {}}
+    if group_id is not None:
+        entry["MessageGroupId"] = group_id
+    if deduplication_id is not None:
+        entry["MessageDeduplicationId"] = deduplication_id
+    return entry
+
+
+_senders: Dict[str, SqsBatchSender] = {}
+_senders_lock = threading.Lock()
+
+
+def get_sqs_batch_sender(queue_url: str, flush_seconds: float) -> SqsBatchSender:
+    sender = _senders.get(queue_url)
+    if sender is None:
+        with _senders_lock:
+            sender = _senders.get(queue_url)
+            if sender is None:
+                sender = SqsBatchSender(queue_url, flush_seconds)
+                _senders[queue_url] = sender
+    return sender
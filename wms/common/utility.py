@@ -1,48 +1,391 @@
 import base64
-import json
+import contextvars
+import dataclasses
 import re
-from typing import Callable
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Any, Callable, Dict, Hashable, Iterable, Iterator, List, Mapping, Optional, Tuple, Union, \
+    get_args, get_origin, get_type_hints
 
-from wms import create_app_for_triggered_event, logger
+from wms import get_triggered_event_app, logger
+from wms.common import codec, idempotency, metrics, recording
+from wms.common.constants import IdempotencySettings, SqsBatchSettings
+from wms.common.idempotency import IdempotencyKey
+from wms.common.resilience import CostEstimator, has_time_for, lambda_deadline
+from wms.integration.write_back import batch_write_back
 
 
 def get_app_context():
-    app = create_app_for_triggered_event()
-    app.app_context().push()
+    # popping the context at the end of the batch also removes the batch's scoped db session
+    return get_triggered_event_app().app_context()
 
 
-def process_sqs_messages_return_batch_failures(event: dict, sqs_processing_func: Callable) -> str:
-    get_app_context()
+def process_sqs_messages_return_batch_failures(event: dict, sqs_processing_func: Callable,
+                                               ordering_key: Callable[[dict], Hashable] = None,
+                                               max_workers: int = None, context=None,
+                                               idempotency_key: IdempotencyKey = None) -> dict:
+    """Run ``sqs_processing_func`` for every record and report the failed ones back to sqs.
 
-    batch_item_failures = []
-    for record in event['Records']:
+    With more than one worker, records are processed concurrently, each in its own app context and db session.
+    Records sharing an ``ordering_key`` still run one after the other in arrival order; once one of them fails,
+    the rest are reported as failed too, so that redelivery keeps their relative order.
+    The remaining time of the lambda ``context`` bounds the ongoing requests made while processing, and records
+    that likely can't finish in the time left, going by the handler's recent time per message including the
+    write-back at the end of the batch, aren't started but reported as failed, so that sqs redelivers them.
+    Messages processed before, by message id or by the content key ``idempotency_key`` gives, are acknowledged
+    without processing them again.
+    Inspections added to ``get_batch_write_back()`` while processing are written back once the whole batch was
+    processed, before the messages are acknowledged.
+    When recording is on, the batch is recorded for replaying it, see wms.common.recording.
+    """
+    if not SqsBatchSettings.PRESERVE_ORDER:
+        ordering_key = None
+
+    with metrics.batch_metrics(sqs_processing_func.__name__) as batch, lambda_deadline(context), \
+            recording.record_batch(event, context, batch, "messages", sqs_processing_func, ordering_key=ordering_key,
+                                   max_workers=max_workers, idempotency_key=idempotency_key) as batch_recording, \
+            batch_write_back() as write_back:
+        with metrics.stage("sqs_parse"):
+            parsed_records = _parse_records(event['Records'])
+
+        deduplication = _deduplicate(parsed_records, sqs_processing_func.__name__, idempotency_key)
+        lanes = _split_records_into_lanes(deduplication.records, ordering_key)
+
+        admission = _Admission(sqs_processing_func.__name__)
+
+        def process_lane(lane, app_context):
+            return _process_lane(lane, sqs_processing_func, ordering_key, app_context, admission)
+
+        failed_message_ids = _run_tasks(process_lane, lanes, max_workers)
+        with admission.finishing():
+            failed_message_ids = deduplication.done(failed_message_ids + write_back.flush())
+        return _recorded(batch_recording, _batch_item_failures(event, failed_message_ids))
+
+
+def process_sqs_message_groups_return_batch_failures(event: dict, group_key: Callable[[dict], Hashable],
+                                                     sqs_group_processing_func: Callable[[Dict[str, dict]], Iterable],
+                                                     max_workers: int = None, context=None,
+                                                     idempotency_key: IdempotencyKey = None) -> dict:
+    """Hand the records sharing a ``group_key`` to ``sqs_group_processing_func`` at once.
+
+    The function receives the group's messages keyed by message id, in arrival order, and returns the ids of
+    the messages it failed to process. If it raises, every message of the group is reported as failed.
+    With more than one worker, groups are processed concurrently, each in its own app context and db session.
+    Messages processed before are skipped, groups started only while there's time for them and the batch's
+    inspections written back at its end, like in ``process_sqs_messages_return_batch_failures``.
+    """
+    with metrics.batch_metrics(sqs_group_processing_func.__name__) as batch, lambda_deadline(context), \
+            recording.record_batch(event, context, batch, "groups", sqs_group_processing_func, group_key=group_key,
+                                   max_workers=max_workers, idempotency_key=idempotency_key) as batch_recording, \
+            batch_write_back() as write_back:
+        failed_message_ids: List[str] = []
+        groups: Dict[Hashable, Dict[str, dict]] = {}
+        with metrics.stage("sqs_parse"):
+            parsed_records = _parse_records(event['Records'])
+
+        deduplication = _deduplicate(parsed_records, sqs_group_processing_func.__name__, idempotency_key)
+        for record, sqs_message in deduplication.records:
+            try:
+                if sqs_message is None:
+                    raise ValueError("unparsable message")
+                key = group_key(sqs_message)
+            except Exception:
+                logger.exception(f"Sqs message couldn't be parsed: {record['messageId']}")
+                failed_message_ids.append(record['messageId'])
+                continue
+
+            groups.setdefault(key, {})[record['messageId']] = sqs_message
+
+        cost_key = sqs_group_processing_func.__name__
+        admission = _Admission(cost_key)
+
+        def process_group(sqs_messages: Dict[str, dict], app_context: Optional[Callable]) -> List[str]:
+            if not admission.admit(len(sqs_messages)):
+                return _unstarted(list(sqs_messages))
+
+            started = time.perf_counter()
+            try:
+                with metrics.stage("group"):
+                    if app_context:
+                        with app_context():
+                            return list(sqs_group_processing_func(sqs_messages))
+                    return list(sqs_group_processing_func(sqs_messages))
+            except Exception:
+                logger.exception(f"Sqs messages couldn't be processed: {list(sqs_messages)}")
+                return list(sqs_messages)
+            finally:
+                _message_costs.observe(cost_key, (time.perf_counter() - started) / len(sqs_messages))
+
+        failed_message_ids += _run_tasks(process_group, list(groups.values()), max_workers)
+        with admission.finishing():
+            failed_message_ids = deduplication.done(failed_message_ids + write_back.flush())
+        return _recorded(batch_recording, _batch_item_failures(event, failed_message_ids))
+
+
+def _run_tasks(task_func: Callable[[Any, Optional[Callable]], List[str]], tasks: list, max_workers: int = None) \
+        -> List[str]:
+    # runs every task in one shared app context, or concurrently handing each task the app context factory
+    max_workers = SqsBatchSettings.MAX_WORKERS if max_workers is None else max_workers
+
+    if max_workers <= 1 or len(tasks) <= 1:
+        with get_app_context():
+            return [message_id for task in tasks for message_id in task_func(task, None)]
+
+    app = get_triggered_event_app()
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(tasks))) as executor:
+        # every task runs in a copy of this context, so that it reports to the batch's metrics
+        futures = [executor.submit(contextvars.copy_context().run, task_func, task, app.app_context)
+                   for task in tasks]
+        return [message_id for future in futures for message_id in future.result()]
+
+
+def _batch_item_failures(event: dict, failed_message_ids: List[str]) -> dict:
+    record_positions = {record['messageId']: position for position, record in enumerate(event['Records'])}
+    failed_message_ids = sorted(set(failed_message_ids), key=record_positions.get)
+
+    metrics.incr("messages", len(record_positions))
+    metrics.incr("failed_messages", len(failed_message_ids))
+
+    return {'batchItemFailures': [{'itemIdentifier': message_id} for message_id in failed_message_ids]}
+
+
+def _recorded(batch_recording: Optional[recording.BatchRecording], result: dict) -> dict:
+    if batch_recording is not None:
+        batch_recording.result = result
+    return result
+
+
+def _parse_records(records: List[dict]) -> List[Tuple[dict, Optional[dict]]]:
+    parsed_records = []
+    for record in records:
         try:
-            sqs_message: dict = json.loads(record["body"])
-            sqs_processing_func(sqs_message)
+            sqs_message: Optional[dict] = codec.loads(record["body"])
+        except Exception:
+            logger.exception(f"Sqs message couldn't be parsed: {record['messageId']}")
+            sqs_message = None
+        parsed_records.append((record, sqs_message))
+    return parsed_records
+
+
+class _Deduplication:
+    """Outcome of checking a batch against the processed messages: the records left to process."""
+
+    def __init__(self, records: List[Tuple[dict, Optional[dict]]], keys: Dict[str, str] = None,
+                 duplicates: Dict[str, str] = None):
+        self.records = records
+        self.keys = keys or {}
+        # message id of a duplicate within the batch -> message id of the record processed in its place
+        self.duplicates = duplicates or {}
+
+    def done(self, failed_message_ids: List[str]) -> List[str]:
+        """Record the messages that succeeded and return the failed ones, including duplicates of failed ones."""
+        failed = set(failed_message_ids)
+        failed_message_ids = list(failed_message_ids) + [message_id for message_id, first in self.duplicates.items()
+                                                         if first in failed]
+        succeeded = [key for message_id, key in self.keys.items() if message_id not in failed]
+        if succeeded:
+            with metrics.stage("idempotency"), get_app_context():
+                idempotency.mark_processed(succeeded)
+        return failed_message_ids
+
+
+def _deduplicate(parsed_records: List[Tuple[dict, Optional[dict]]], namespace: str,
+                 idempotency_key: Optional[IdempotencyKey]) -> _Deduplication:
+    if not IdempotencySettings.ENABLED:
+        return _Deduplication(parsed_records)
+
+    keys = {record['messageId']: idempotency.get_idempotency_key(namespace, record['messageId'], sqs_message,
+                                                                 idempotency_key)
+            for record, sqs_message in parsed_records if sqs_message is not None}
+    with metrics.stage("idempotency"), get_app_context():
+        processed = idempotency.get_processed_keys(keys.values())
+
+    records = []
+    duplicates: Dict[str, str] = {}
+    first_message_ids: Dict[str, str] = {}
+    for record, sqs_message in parsed_records:
+        message_id = record['messageId']
+        key = keys.get(message_id)
+        if key in processed:
+            continue
+        if key in first_message_ids:
+            duplicates[message_id] = first_message_ids[key]
+            continue
+        if key is not None:
+            first_message_ids[key] = message_id
+        records.append((record, sqs_message))
+
+    metrics.incr("duplicate_messages", len(parsed_records) - len(records))
+    return _Deduplication(records, {message_id: keys[message_id] for message_id in first_message_ids.values()},
+                          duplicates)
+
+
+def _split_records_into_lanes(parsed_records: List[Tuple[dict, Optional[dict]]],
+                              ordering_key: Optional[Callable[[dict], Hashable]]) -> \
+        List[List[Tuple[dict, Optional[dict]]]]:
+    lanes: dict = {}
+    for position, (record, sqs_message) in enumerate(parsed_records):
+        try:
+            if sqs_message is None:
+                raise ValueError("unparsable message")
+            key = ordering_key(sqs_message) if ordering_key else position
+        except Exception:
+            logger.exception(f"Sqs message couldn't be parsed: {record['messageId']}")
+            sqs_message, key = None, ('unparsable', position)
+
+        lanes.setdefault(key, []).append((record, sqs_message))
+
+    return list(lanes.values())
+
+
+def _process_lane(lane: List[Tuple[dict, Optional[dict]]], sqs_processing_func: Callable,
+                  ordering_key: Optional[Callable[[dict], Hashable]], app_context: Optional[Callable],
+                  admission: '_Admission') -> List[str]:
+    cost_key = sqs_processing_func.__name__
+    failed_message_ids = []
+    for position, (record, sqs_message) in enumerate(lane):
+        if sqs_message is None or (ordering_key and failed_message_ids):
+            failed_message_ids.append(record['messageId'])
+            continue
+
+        if not admission.admit(1):
+            return failed_message_ids + _unstarted([record['messageId'] for record, _ in lane[position:]])
+
+        started = time.perf_counter()
+        try:
+            with metrics.stage("message"):
+                if app_context:
+                    with app_context():
+                        sqs_processing_func(sqs_message)
+                else:
+                    sqs_processing_func(sqs_message)
         except Exception:
             logger.exception(f"Sqs message couldn't be processed: {record['messageId']}")
-            batch_item_failures.append({'itemIdentifier': record['messageId']})
+            failed_message_ids.append(record['messageId'])
+        finally:
+            _message_costs.observe(cost_key, time.perf_counter() - started)
+
+    return failed_message_ids
+
+
+# recent time per message of every handler, to tell whether a record can still finish before the lambda times out
+_message_costs = CostEstimator(alpha=SqsBatchSettings.COST_EWMA_ALPHA)
+
+
+class _Admission:
+    """Admits the records of a batch while there's time for them, and for what the batch still does at its end
+    for every record admitted: the write-back of their inspections and the recording of the processed ones."""
+
+    def __init__(self, cost_key: str):
+        self.cost_key = cost_key
+        self.finish_cost_key = f"{cost_key}:finish"
+        self._admitted = 0
+        self._lock = threading.Lock()
+
+    def admit(self, message_count: int) -> bool:
+        seconds_per_message = _message_costs.estimate(self.cost_key)
+        finish_seconds_per_message = _message_costs.estimate(self.finish_cost_key) or 0
+        with self._lock:
+            # nothing to go by before the container has processed a message of the handler, so it's tried
+            if seconds_per_message is not None:
+                needed = seconds_per_message * message_count \
+                    + finish_seconds_per_message * (self._admitted + message_count)
+                if not has_time_for(needed * SqsBatchSettings.COST_MARGIN):
+                    return False
+            self._admitted += message_count
+            return True
 
-    return json.dumps({'batchItemFailures': batch_item_failures})
+    @contextmanager
+    def finishing(self) -> Iterator[None]:
+        started = time.perf_counter()
+        yield
+        if self._admitted:
+            _message_costs.observe(self.finish_cost_key, (time.perf_counter() - started) / self._admitted)
 
 
-def camel_case_to_snake_case(camel_case_object):
+def _unstarted(message_ids: List[str]) -> List[str]:
+    # left for sqs to redeliver, rather than having the whole batch time out
+    logger.warning(f"Not enough time left to process sqs messages: {message_ids}")
+    metrics.incr("unstarted_messages", len(message_ids))
+    return message_ids
+
+
+_CAMEL_CASE_BOUNDARY = re.compile(r'(?<!^)(?=[A-Z])')
+
+
+@lru_cache(maxsize=4096)
+def _snake_case(camel_case: str) -> str:
+    # ongoing uses a small set of keys over and over again, each is converted once
+    return _CAMEL_CASE_BOUNDARY.sub('_', camel_case).lower()
+
+
+def camel_case_to_snake_case(camel_case_object, into: type = None):
+    """Convert the keys of ongoing json to snake case, all the way down through dicts and lists.
+
+    With a dataclass ``into``, a dict is built into it instead, in the same pass: keys are matched to its fields
+    as they are or in snake case, unknown keys are left out, and fields typed as (optional) dataclasses or lists of
+    them are built too.
+    """
     if isinstance(camel_case_object, str):
-        pattern = re.compile(r'(?<!^)(?=[A-Z])')
-        return pattern.sub('_', camel_case_object).lower()
+        return _snake_case(camel_case_object)
+
+    return _convert(camel_case_object, into)
+
+
+def _convert(value, into: Optional[type]):
+    if isinstance(value, dict):
+        if into is not None:
+            return _build(value, into)
+        return {_snake_case(key) if isinstance(key, str) else key: _convert(entry, None)
+                for key, entry in value.items()}
+
+    if isinstance(value, list):
+        return [_convert(entry, into) for entry in value]
+
+    return value
+
+
+def _build(camel_case_dict: dict, into: type):
+    fields = _get_build_fields(into)
+    kwargs = {}
+    for key, value in camel_case_dict.items():
+        field = fields.get(key)
+        if field is None:
+            field = _match_field(into, key)
+        if field:
+            field_name, field_type = field
+            kwargs[field_name] = _convert(value, field_type) if field_type or isinstance(value, (dict, list)) else value
+    return into(**kwargs)
+
+
+_BuildFields = Mapping[str, Tuple[str, Optional[type]]]
+
 
-    if isinstance(camel_case_object, dict):
-        snake_case: dict = {}
-        for k, v in camel_case_object.items():
-            v = camel_case_to_snake_case(v) if isinstance(v, dict) else v
-            snake_case[camel_case_to_snake_case(k)] = v
-        return snake_case
+@lru_cache(maxsize=None)
+def _get_build_fields(into: type) -> _BuildFields:
+    # per field, the dataclass its dicts are built into, if any. Read-only, it's shared by every thread
+    hints = get_type_hints(into)
+    build_fields = {}
+    for field in dataclasses.fields(into):
+        field_type = hints.get(field.name)
+        if get_origin(field_type) is Union:
+            # Optional[X], a null is passed through as it is
+            field_types = [arg for arg in get_args(field_type) if arg is not type(None)]
+            field_type = field_types[0] if len(field_types) == 1 else None
+        if get_origin(field_type) is list:
+            field_type = get_args(field_type)[0]
+        build_fields[field.name] = (field.name, field_type if dataclasses.is_dataclass(field_type) else None)
+    return MappingProxyType(build_fields)
 
-    if isinstance(camel_case_object, list):
-        return [camel_case_to_snake_case(camel_case_entry) for camel_case_entry in camel_case_object if
-                not isinstance(camel_case_entry, str)]
 
-    return camel_case_object
+@lru_cache(maxsize=4096)
+def _match_field(into: type, key: Hashable) -> tuple:
+    # the field of a key that isn't a field name as it is, or an empty tuple if it isn't a field in snake case either
+    return (_get_build_fields(into).get(_snake_case(key)) if isinstance(key, str) else None) or ()
 
 
 def string_to_base64_string(string_to_encode: str):
@@ -4,6 +4,8 @@ from typing import List
 
 @dataclass
 class InspectionDetail:
+    __slots__ = ("ext_internal_order_detail_id", "order_detail_id", "inspection_result", "comment", "last_changed")
+
     ext_internal_order_detail_id: int
     order_detail_id: int
     inspection_result: str
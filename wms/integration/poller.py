@@ -0,0 +1,140 @@
+# Scheduled poller of every Ongoing integration, pulling the returns that came in since the last poll through the
+# incremental returned orders sync. Goods owners can be split over several invocations by hash range, and within
+# one invocation they are synced concurrently, a few per warehouse at a time, until the deadline.
+
+import contextvars
+import hashlib
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Deque, Dict, List
+
+from ymodel.integration.warehouse_integration import OngoingIntegration, RetailerWarehouseIntegration
+
+from wms import db, get_triggered_event_app, logger
+from wms.common import metrics
+from wms.common.constants import OrderReplicaSettings, RetailerWarehouseIntegrationType, ReturnsPollerSettings
+from wms.common.resilience import has_time_for, lambda_deadline
+from wms.common.utility import get_app_context
+from wms.ongoing.integration import OngoingCredentials, cache_ongoing_credentials
+from wms.ongoing.sync import sync_returned_outgoing_orders, sync_shipped_outgoing_orders
+
+
+def poll_ongoing_returns(event: dict, context=None) -> dict:
+    """Scheduled entry point, ``event`` may carry ``shard_index`` and ``shard_count`` to poll one shard only."""
+    # zappa hands the kwargs of a scheduled event over in the event
+    options: dict = event.get("kwargs") or event
+    shard_index = int(options.get("shard_index", 0))
+    shard_count = int(options.get("shard_count", 1))
+
+    with metrics.batch_metrics("poll_ongoing_returns"), lambda_deadline(context):
+        with metrics.stage("integration_lookup"), get_app_context():
+            integrations = [credentials for credentials in load_ongoing_integrations()
+                            if in_shard(credentials.goods_owner_id, shard_index, shard_count)]
+
+        summary = sync_integrations(integrations)
+        logger.info(f"Polled shard {shard_index}/{shard_count} of the ongoing integrations: {summary}")
+        return summary
+
+
+def load_ongoing_integrations() -> List[OngoingCredentials]:
+    # one query for all of them, which also primes the integration cache the syncs look them up in
+    ongoing_type = RetailerWarehouseIntegrationType.ONGOING
+    rows = db.session.query(RetailerWarehouseIntegration.retailer_id, OngoingIntegration) \
+        .join(OngoingIntegration, OngoingIntegration.warehouse_integration_id == RetailerWarehouseIntegration.id) \
+        .filter(RetailerWarehouseIntegration.warehouse_integration_type_id == ongoing_type) \
+        .all()
+
+    integrations = []
+    for retailer_id, ongoing_integration in rows:
+        credentials = OngoingCredentials(retailer_id=retailer_id,
+                                         goods_owner_id=ongoing_integration.goods_owner_id,
+                                         warehouse_name=ongoing_integration.warehouse_name,
+                                         username=ongoing_integration.username,
+                                         password=ongoing_integration.password)
+        cache_ongoing_credentials(credentials)
+        integrations.append(credentials)
+    return integrations
+
+
+def in_shard(goods_owner_id: int, shard_index: int, shard_count: int) -> bool:
+    # a stable hash range, so a goods owner stays in its shard across invocations and containers
+    hash_value = int.from_bytes(hashlib.sha1(str(goods_owner_id).encode()).digest()[:4], "big")
+    return hash_value * shard_count >> 32 == shard_index
+
+
+def sync_integrations(integrations: List[OngoingCredentials], max_workers: int = None,
+                      warehouse_concurrency: int = None) -> Dict[str, int]:
+    """Sync every integration, round robin over the warehouses and never more than ``warehouse_concurrency``
+    at a time per warehouse. Integrations not started before the deadline are counted as skipped."""
+    max_workers = max_workers or ReturnsPollerSettings.MAX_WORKERS
+    warehouse_concurrency = warehouse_concurrency or ReturnsPollerSettings.WAREHOUSE_CONCURRENCY
+
+    queues: Dict[str, Deque[OngoingCredentials]] = {}
+    for credentials in integrations:
+        queues.setdefault(credentials.warehouse_name, deque()).append(credentials)
+
+    summary = {"synced": 0, "failed": 0, "skipped": 0, "inspections": 0}
+    running: Dict[str, int] = {warehouse_name: 0 for warehouse_name in queues}
+    in_flight: Dict[Future, OngoingCredentials] = {}
+    app = get_triggered_event_app()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while queues or in_flight:
+            if queues and not has_time_for(ReturnsPollerSettings.MIN_SYNC_SECONDS):
+                summary["skipped"] += sum(len(queue) for queue in queues.values())
+                queues.clear()
+
+            _start_integrations(executor, app, queues, running, in_flight, max_workers, warehouse_concurrency)
+            if in_flight:
+                _finish_integrations(in_flight, running, summary)
+
+    metrics.incr("integrations_synced", summary["synced"])
+    metrics.incr("integrations_failed", summary["failed"])
+    metrics.incr("integrations_skipped", summary["skipped"])
+    metrics.incr("inspections", summary["inspections"])
+    return summary
+
+
+def _start_integrations(executor: ThreadPoolExecutor, app, queues: Dict[str, Deque[OngoingCredentials]],
+                        running: Dict[str, int], in_flight: Dict[Future, OngoingCredentials], max_workers: int,
+                        warehouse_concurrency: int):
+    # one integration per warehouse per round, so a big warehouse doesn't hold up the others
+    started = True
+    while started and len(in_flight) < max_workers:
+        started = False
+        for warehouse_name in list(queues):
+            if len(in_flight) >= max_workers:
+                break
+            if running[warehouse_name] >= warehouse_concurrency:
+                continue
+
+            credentials = queues[warehouse_name].popleft()
+            if not queues[warehouse_name]:
+                del queues[warehouse_name]
+            running[warehouse_name] += 1
+            future = executor.submit(contextvars.copy_context().run, _sync_integration, app, credentials)
+            in_flight[future] = credentials
+            started = True
+
+
+def _finish_integrations(in_flight: Dict[Future, OngoingCredentials], running: Dict[str, int],
+                         summary: Dict[str, int]):
+    # waits for at least one integration
+    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+    for future in done:
+        credentials = in_flight.pop(future)
+        running[credentials.warehouse_name] -= 1
+        try:
+            summary["inspections"] += future.result()
+            summary["synced"] += 1
+        except Exception:
+            logger.exception(f"Returns of retailer_id={credentials.retailer_id} couldn't be synced")
+            summary["failed"] += 1
+
+
+def _sync_integration(app, credentials: OngoingCredentials) -> int:
+    with metrics.stage("integration_sync"), app.app_context():
+        inspections = sync_returned_outgoing_orders(credentials.retailer_id)
+        if OrderReplicaSettings.ENABLED:
+            sync_shipped_outgoing_orders(credentials.retailer_id)
+        return inspections
@@ -1,4 +1,5 @@
-from wms.ongoing.controller import update_inspection_status_for_return_orders
+from wms.integration.write_back import batch_write_back
+from wms.ongoing.controller import update_inspection_status_for_return_on_delivery_orders
 
 message = {
     "article": {
@@ -42,4 +43,6 @@ message = {
     "isDeleted": False
 }
 
-update_inspection_status_for_return_orders(message)
\ No newline at end of file
+with batch_write_back() as write_back:
+    update_inspection_status_for_return_on_delivery_orders({"1": message})
+    write_back.flush()
@@ -0,0 +1,106 @@
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+from wms import logger
+from wms.common import codec, metrics
+from wms.common.constants import WriteBackSettings, YaylohServices
+from wms.common.http import get_http_session, get_http_timeout
+from wms.common.resilience import get_deadline_timeout, has_time_for
+from wms.integration.interface import Inspection
+
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+
+def get_inspected_url(retailer_id: int) -> str:
+    return f"{YaylohServices.RPLATFORM}/wms/retailer-id/{retailer_id}/order_details/inspected/"
+
+
+def post_inspection(retailer_id: int, inspection: Union[Inspection, dict]):
+    url = get_inspected_url(retailer_id)
+    with metrics.stage("rplatform_post"):
+        response = get_http_session(url).post(url, data=codec.dumps(inspection), headers=JSON_HEADERS,
+                                              timeout=get_deadline_timeout(get_http_timeout()))
+
+    response.raise_for_status()
+
+
+class WriteBackError(Exception):
+    pass
+
+
+class InspectionWriteBack:
+    """Collects the inspections of a batch and writes them back to RPLATFORM at its end, concurrently.
+
+    Inspections are added as dataclasses or dicts, each with the ids of the sqs messages it came from, so that
+    ``flush`` can report which messages failed to be written back.
+    """
+
+    def __init__(self):
+        self._inspections: Dict[int, List[Tuple[Tuple[str, ...], Union[Inspection, dict]]]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, retailer_id: int, inspection: Union[Inspection, dict], *message_ids: str):
+        with self._lock:
+            self._inspections.setdefault(retailer_id, []).append((message_ids, inspection))
+
+    def flush(self, max_workers: int = None) -> List[str]:
+        """Send everything collected so far and return the ids of the messages whose inspections failed.
+
+        Posts run on up to ``max_workers`` threads. Inspections that there's no time left for before the deadline
+        aren't posted, their messages are reported as failed.
+        """
+        with self._lock:
+            inspections, self._inspections = self._inspections, {}
+
+        posts = [(retailer_id, message_ids, inspection)
+                 for retailer_id, retailer_inspections in inspections.items()
+                 for message_ids, inspection in retailer_inspections]
+        max_workers = WriteBackSettings.MAX_WORKERS if max_workers is None else max_workers
+        if max_workers <= 1 or len(posts) <= 1:
+            return [message_id for post in posts for message_id in _write_back(*post)]
+
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(posts))) as executor:
+            # every post runs in a copy of this context, for the deadline and the batch's metrics
+            futures = [executor.submit(contextvars.copy_context().run, _write_back, *post) for post in posts]
+            return [message_id for future in futures for message_id in future.result()]
+
+
+def _write_back(retailer_id: int, message_ids: Tuple[str, ...], inspection: Union[Inspection, dict]) -> List[str]:
+    # the ids of the messages the inspection failed for
+    if not has_time_for(WriteBackSettings.MIN_POST_SECONDS):
+        logger.warning(f"Not enough time left to write back the inspection of sqs messages: {list(message_ids)}")
+        metrics.incr("unsent_inspections")
+        return list(message_ids)
+
+    try:
+        post_inspection(retailer_id, inspection)
+    except Exception:
+        logger.exception(f"Inspection couldn't be written back for sqs messages: {list(message_ids)}")
+        return list(message_ids)
+    return []
+
+
+_batch_write_back: ContextVar[Optional[InspectionWriteBack]] = ContextVar("batch_write_back", default=None)
+
+
+@contextmanager
+def batch_write_back() -> Iterator[InspectionWriteBack]:
+    """Share one InspectionWriteBack between every message and group of an sqs batch, the batch helpers in
+    wms.common.utility flush it once all of them were processed."""
+    write_back = InspectionWriteBack()
+    token = _batch_write_back.set(write_back)
+    try:
+        yield write_back
+    finally:
+        _batch_write_back.reset(token)
+
+
+def get_batch_write_back() -> InspectionWriteBack:
+    write_back = _batch_write_back.get()
+    if write_back is None:
+        raise RuntimeError("Inspections are written back per sqs batch, but no batch is being processed")
+    return write_back
@@ -0,0 +1,292 @@
+# asyncio counterpart of OngoingApi for fan-out workloads, e.g. polling many goods owners from one lambda.
+# All clients share one aiohttp connector per event loop and every warehouse gets a cap on concurrent requests,
+# so hundreds of requests can be in flight without a thread each. Requests go through the same per-warehouse
+# RequestScheduler as OngoingApi's, are bounded by the lambda deadline and end up in batch recordings. Synchronous
+# code drives it through SyncOngoingApi or run_sync / run_all_sync, which run the coroutines on a shared
+# background event loop.
+
+import asyncio
+import contextvars
+import threading
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from http import HTTPStatus
+from typing import Any, AsyncIterator, Awaitable, Dict, Iterable, List, Optional, Tuple, TypeVar
+
+import aiohttp
+import requests
+from requests.structures import CaseInsensitiveDict
+from werkzeug.exceptions import abort
+from yarl import URL
+
+from wms import logger
+from wms.common import codec, metrics
+from wms.common.constants import AsyncHttpClientSettings, HttpClientSettings
+from wms.common.http import get_http_timeout
+from wms.common.recording import record_exchange
+from wms.common.resilience import CircuitOpenError, DeadlineExceeded, get_request_scheduler
+from wms.common.utility import string_to_base64_string
+from wms.ongoing.controller import RETURN_ORDER_NUMBERS_PER_REQUEST
+from wms.ongoing.integration import OngoingCredentials, get_ongoing_credentials
+from wms.ongoing.utility import get_return_order_payload
+
+T = TypeVar("T")
+
+# retried like requests' connection errors and timeouts
+CONNECTION_ERRORS = (aiohttp.ClientConnectionError, asyncio.TimeoutError)
+
+
+class _LoopState:
+    def __init__(self):
+        connector = aiohttp.TCPConnector(limit=AsyncHttpClientSettings.POOL_SIZE,
+                                         ttl_dns_cache=AsyncHttpClientSettings.DNS_CACHE_SECONDS)
+        timeout = aiohttp.ClientTimeout(sock_connect=HttpClientSettings.CONNECT_TIMEOUT,
+                                        sock_read=HttpClientSettings.READ_TIMEOUT)
+        self.session = aiohttp.ClientSession(connector=connector, timeout=timeout,
+                                             headers={"Accept-Encoding": HttpClientSettings.ACCEPT_ENCODING})
+        self.warehouse_limits: Dict[str, asyncio.Semaphore] = {}
+
+    def get_warehouse_limit(self, base_url: str) -> asyncio.Semaphore:
+        limit = self.warehouse_limits.get(base_url)
+        if limit is None:
+            limit = asyncio.Semaphore(AsyncHttpClientSettings.WAREHOUSE_CONCURRENCY)
+            self.warehouse_limits[base_url] = limit
+        return limit
+
+
+# aiohttp sessions and asyncio primitives are bound to the loop they were created on, so every state belongs to
+# whoever runs the loop and is closed by them: the background loop has one for as long as it runs, callers running
+# their own loop open one with client_session()
+_client_state: ContextVar[Optional[_LoopState]] = ContextVar("ongoing_client_state", default=None)
+_background_state: Optional[_LoopState] = None
+
+
+def _get_loop_state() -> _LoopState:
+    state = _client_state.get()
+    if state is None:
+        raise RuntimeError("Ongoing requests have to be made within client_session() or through run_sync")
+    return state
+
+
+@asynccontextmanager
+async def client_session() -> AsyncIterator[None]:
+    """Share one session between the requests made within, for callers that run their own event loop."""
+    state = _LoopState()
+    token = _client_state.set(state)
+    try:
+        yield
+    finally:
+        _client_state.reset(token)
+        await state.session.close()
+
+
+class AsyncOngoingApi:
+    def __init__(self, retailer_id: int, credentials: OngoingCredentials = None):
+        # the credentials lookup hits the database, create clients before entering the event loop
+        credentials = credentials or get_ongoing_credentials(retailer_id)
+
+        if not credentials:
+            abort(HTTPStatus.BAD_REQUEST, f"Ongoing integration for {retailer_id=} does not exist!")
+
+        self.retailer_id: int = retailer_id
+        self.goods_owner_id: int = credentials.goods_owner_id
+        self.warehouse_name: str = credentials.warehouse_name
+        self.base_url: str = credentials.base_url
+
+        auth_token: str = string_to_base64_string(f'{credentials.username}:{credentials.password}')
+        self.headers = {
+            "Content-type": "application/json",
+            "Authorization":
+                f"Basic {auth_token}"
+        }
+
+        self._orders: str = f"{self.base_url}/orders"
+        self._return_order: str = f"{self.base_url}/returnOrders"
+
+    async def get_order(self, order_number: str) -> List[dict]:
+        params = {
+            "goodsOwnerId": self.goods_owner_id,
+            "orderNumber": order_number
+        }
+        return await self._make_request("get", self._orders, params=params)
+
+    async def get_outgoing_orders_returned_since(self, from_date: str) -> List[dict]:
+        params = {
+            "goodsOwnerId": self.goods_owner_id,
+            "lastReturnedFrom": from_date
+        }
+        return await self._make_request("get", self._orders, params=params)
+
+    async def get_outgoing_order_between_dates(self, from_date: str, to_date: str) -> List[dict]:
+        params = {
+            "goodsOwnerId": self.goods_owner_id,
+            "orderCreatedTimeFrom": from_date,
+            "orderCreatedTimeTo": to_date
+        }
+        return await self._make_request("get", self._orders, params=params)
+
+    async def create_return_order(self, order_id: int) -> Any:
+        payload = get_return_order_payload(self.goods_owner_id, order_id)
+        return await self._make_request("put", self._return_order, payload=payload)
+
+    async def get_return_orders(self, return_order_numbers: List[str]) -> List[dict]:
+        chunks = [return_order_numbers[i:i + RETURN_ORDER_NUMBERS_PER_REQUEST]
+                  for i in range(0, len(return_order_numbers), RETURN_ORDER_NUMBERS_PER_REQUEST)]
+        pages = await asyncio.gather(*[
+            self._make_request("get", self._return_order,
+                               params={"goodsOwnerId": self.goods_owner_id, "returnOrderNumbers": chunk})
+            for chunk in chunks
+        ])
+
+        return_orders: List[dict] = []
+        for page in pages:
+            return_orders += page
+        return return_orders
+
+    async def _make_request(self, req_type: str, url: str, params: dict = None, payload: dict = None) -> Any:
+        state = _get_loop_state()
+        # prepared like OngoingApi's requests, so that they come out the same, in recordings too
+        request = requests.Request(req_type.upper(), url, headers=self.headers, params=params,
+                                   data=None if payload is None else codec.dumps(payload)).prepare()
+
+        async def send_request(timeout: Tuple[float, float]) -> requests.Response:
+            return await _send(state, request, timeout)
+
+        async with state.get_warehouse_limit(self.base_url):
+            try:
+                with metrics.stage("ongoing_request"):
+                    # throttling, retries and failing fast are shared with OngoingApi per warehouse
+                    response = await get_request_scheduler(self.base_url).send_async(
+                        request.method, send_request, get_http_timeout(), CONNECTION_ERRORS)
+                metrics.incr("ongoing_bytes", len(response.content), "Bytes")
+                response.raise_for_status()
+
+            except requests.exceptions.HTTPError as err:
+                logger.warning("Ongoing api unavailable")
+                logger.info(err.response.content)
+                raise
+
+            except (CircuitOpenError, DeadlineExceeded) as err:
+                logger.warning(err)
+                raise
+
+            except Exception as err:
+                logger.exception(err)
+                raise
+
+        with metrics.stage("ongoing_json"):
+            return codec.loads(response.content) if response.content else None
+
+
+async def _send(state: _LoopState, request: requests.PreparedRequest, timeout: Tuple[float, float]) \
+        -> requests.Response:
+    # reads the whole response into a requests.Response, which the scheduler and the recording know how to handle
+    connect_timeout, read_timeout = timeout
+    started = time.perf_counter()
+    try:
+        async with state.session.request(request.method, URL(request.url, encoded=True), headers=request.headers,
+                                         data=request.body,
+                                         timeout=aiohttp.ClientTimeout(sock_connect=connect_timeout,
+                                                                       sock_read=read_timeout)) as aiohttp_response:
+            response = requests.Response()
+            response.status_code = aiohttp_response.status
+            response.reason = aiohttp_response.reason
+            response.headers = CaseInsensitiveDict(aiohttp_response.headers)
+            response._content = await aiohttp_response.read()
+    except Exception as err:
+        record_exchange(request, time.perf_counter() - started, error=err)
+        raise
+
+    response.url = request.url
+    response.request = request
+    record_exchange(request, time.perf_counter() - started, response)
+    return response
+
+
+class SyncOngoingApi:
+    """Blocking façade over AsyncOngoingApi, so that synchronous handlers share its pool and warehouse limits."""
+
+    def __init__(self, retailer_id: int, credentials: OngoingCredentials = None):
+        self.api = AsyncOngoingApi(retailer_id, credentials)
+        self.retailer_id: int = retailer_id
+        self.goods_owner_id: int = self.api.goods_owner_id
+        self.warehouse_name: str = self.api.warehouse_name
+        self.base_url: str = self.api.base_url
+
+    def get_order(self, order_number: str) -> List[dict]:
+        return run_sync(self.api.get_order(order_number))
+
+    def get_outgoing_orders_returned_since(self, from_date: str) -> List[dict]:
+        return run_sync(self.api.get_outgoing_orders_returned_since(from_date))
+
+    def get_outgoing_order_between_dates(self, from_date: str, to_date: str) -> List[dict]:
+        return run_sync(self.api.get_outgoing_order_between_dates(from_date, to_date))
+
+    def create_return_order(self, order_id: int) -> Any:
+        return run_sync(self.api.create_return_order(order_id))
+
+    def get_return_orders(self, return_order_numbers: List[str]) -> List[dict]:
+        return run_sync(self.api.get_return_orders(return_order_numbers))
+
+
+_background_loop: Optional[asyncio.AbstractEventLoop] = None
+_background_loop_lock = threading.Lock()
+
+
+def get_background_loop() -> asyncio.AbstractEventLoop:
+    """The event loop that runs the coroutines of synchronous callers, started on first use."""
+    global _background_loop
+    if _background_loop is None:
+        with _background_loop_lock:
+            if _background_loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="ongoing-async-client", daemon=True).start()
+                _background_loop = loop
+    return _background_loop
+
+
+async def _with_context(context: contextvars.Context, coroutine: Awaitable[T]) -> T:
+    # tasks of the background loop don't inherit the caller's context, carry it over so e.g. batch metrics add up
+    global _background_state
+    for var, value in context.items():
+        var.set(value)
+
+    # only ever touched on the background loop's thread
+    if _background_state is None:
+        _background_state = _LoopState()
+    _client_state.set(_background_state)
+    return await coroutine
+
+
+def run_sync(coroutine: Awaitable[T], timeout: float = None) -> T:
+    """Run a coroutine on the background loop and wait for its result."""
+    future = asyncio.run_coroutine_threadsafe(_with_context(contextvars.copy_context(), coroutine),
+                                              get_background_loop())
+    return future.result(timeout)
+
+
+def run_all_sync(coroutines: Iterable[Awaitable[T]], timeout: float = None) -> List[Any]:
+    """Run coroutines concurrently, returning their results or raised exceptions in the same order."""
+    async def gather():
+        return await asyncio.gather(*coroutines, return_exceptions=True)
+
+    return run_sync(gather(), timeout)
+
+
+def close_background_loop(timeout: float = 5):
+    global _background_loop
+    with _background_loop_lock:
+        loop, _background_loop = _background_loop, None
+    if loop is None:
+        return
+
+    asyncio.run_coroutine_threadsafe(_close_background_state(), loop).result(timeout)
+    loop.call_soon_threadsafe(loop.stop)
+
+
+async def _close_background_state():
+    global _background_state
+    state, _background_state = _background_state, None
+    if state is not None:
+        await state.session.close()
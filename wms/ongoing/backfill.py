@@ -0,0 +1,95 @@
+# Writes the inspections of the returns over a range of days back again, e.g. after RPLATFORM was down. Every
+# retailer and day is a chunk of its own, run in a process pool, and finished chunks are checkpointed in the
+# database, so that a rerun only does what's left.
+
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from wms import db, logger
+from wms.common.constants import ReturnedOrdersSyncSettings
+from wms.common.utility import get_app_context
+from wms.integration.interface import Inspection
+from wms.ongoing.controller import iter_returned_outgoing_orders
+from wms.ongoing.model import BackfillCheckpoint
+from wms.ongoing.sync import write_back_inspections
+
+BackfillChunk = Tuple[int, date]
+
+
+@dataclass
+class BackfillResult:
+    retailer_id: int
+    day: date
+    inspections: int = 0
+    seconds: float = 0
+    error: Optional[str] = None
+
+
+def iter_days(from_day: date, to_day: date) -> Iterator[date]:
+    day = from_day
+    while day <= to_day:
+        yield day
+        day += timedelta(days=1)
+
+
+def get_pending_chunks(retailer_ids: List[int], from_day: date, to_day: date, restart: bool = False) \
+        -> List[BackfillChunk]:
+    chunks = [(retailer_id, day) for retailer_id in retailer_ids for day in iter_days(from_day, to_day)]
+    if restart:
+        return chunks
+
+    checkpoints = BackfillCheckpoint.query.filter(BackfillCheckpoint.retailer_id.in_(retailer_ids),
+                                                  BackfillCheckpoint.day.between(from_day, to_day))
+    done = {(checkpoint.retailer_id, checkpoint.day) for checkpoint in checkpoints}
+    return [chunk for chunk in chunks if chunk not in done]
+
+
+def backfill_returns_for_day(retailer_id: int, day: date) -> BackfillResult:
+    """Write back the inspections of the orders returned on ``day``. Runs in a worker process."""
+    started = time.perf_counter()
+    result = BackfillResult(retailer_id, day)
+    try:
+        with get_app_context():
+            handoff = write_back_inspections(retailer_id)
+            pending: List[Inspection] = []
+            for inspection in iter_returned_outgoing_orders(retailer_id, day.isoformat(),
+                                                            (day + timedelta(days=1)).isoformat()):
+                pending.append(inspection)
+                if len(pending) >= ReturnedOrdersSyncSettings.HANDOFF_SIZE:
+                    handoff(pending)
+                    result.inspections += len(pending)
+                    pending = []
+
+            if pending:
+                handoff(pending)
+                result.inspections += len(pending)
+    except Exception as err:
+        logger.exception(f"Returns of {retailer_id=} on {day} couldn't be backfilled")
+        result.error = f"{type(err).__name__}: {err}"
+
+    result.seconds = time.perf_counter() - started
+    return result
+
+
+def save_checkpoint(result: BackfillResult):
+    db.session.merge(BackfillCheckpoint(retailer_id=result.retailer_id, day=result.day,
+                                        inspections=result.inspections))
+    db.session.commit()
+
+
+def run_backfill(chunks: List[BackfillChunk], processes: int, on_result: Callable[[BackfillResult], None]):
+    """Backfill the chunks, handing every result to ``on_result`` in the calling process as it comes in."""
+    if processes <= 1 or len(chunks) <= 1:
+        for retailer_id, day in chunks:
+            on_result(backfill_returns_for_day(retailer_id, day))
+        return
+
+    # forked workers would inherit the connections this process pooled for the checkpoints, it reconnects instead
+    db.engine.dispose()
+    with ProcessPoolExecutor(max_workers=min(processes, len(chunks))) as executor:
+        futures = [executor.submit(backfill_returns_for_day, retailer_id, day) for retailer_id, day in chunks]
+        for future in as_completed(futures):
+            on_result(future.result())
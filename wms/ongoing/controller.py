@@ -1,41 +1,58 @@
-from dataclasses import asdict
-from datetime import timedelta, datetime
+import time
+from datetime import date, timedelta, datetime
 from http import HTTPStatus
-from typing import List
+from typing import Callable, Dict, Iterator, List, Set, Union
 from typing import Optional
 
 import requests
 from requests import Response
 from werkzeug.exceptions import abort
-from ymodel.integration.warehouse_integration import OngoingIntegration, RetailerWarehouseIntegration
 
 from wms import logger
-from wms.common.constants import YaylohServices, RetailerWarehouseIntegrationType
-from wms.common.utility import process_sqs_messages_return_batch_failures, string_to_base64_string
+from wms.common import codec, metrics
+from wms.common.cache import TTLCache
+from wms.common.constants import IntegrationCacheSettings, OrderReplicaSettings
+from wms.common.http import get_http_session, get_http_timeout
+from wms.common.json_stream import JsonArrayStream
+from wms.common.resilience import CircuitOpenError, DeadlineExceeded, get_request_scheduler
+from wms.common.utility import camel_case_to_snake_case, process_sqs_messages_return_batch_failures, \
+    process_sqs_message_groups_return_batch_failures, string_to_base64_string
 from wms.integration.interface import InspectionDetail, Inspection
-from wms.ongoing.interface import Order, OrderDetail, OngoingReturnOrder
-from wms.ongoing.utility import is_successful
+from wms.integration.write_back import get_batch_write_back, post_inspection
+from wms.ongoing.inspection import InspectionClassifier, build_returned_order_inspection, get_inspection_classifier
+from wms.ongoing.integration import OngoingCredentials, get_ongoing_credentials, get_retailer_id_from_goods_owner_id
+from wms.ongoing.interface import Order, OngoingPicking, OngoingReturnOrder
+from wms.ongoing.order_index import find_order_by_goods_owner_order_id
+from wms.ongoing.replica import find_replicated_order
+from wms.ongoing.utility import is_successful, get_date_obj, get_return_order_payload
+
+
+RETURN_ORDER_NUMBERS_PER_REQUEST = 50
+STREAM_CHUNK_SIZE = 64 * 1024
+ORDERS_PAGE_SIZE = 200
 
 
 class OngoingApi:
-    def __init__(self, retailer_id: int):
-        warehouse_integration = RetailerWarehouseIntegration.get_first(retailer_id=retailer_id,
-                                                                       warehouse_integration_type_id=RetailerWarehouseIntegrationType.ONGOING)
-        ongoing_integration = OngoingIntegration.get(warehouse_integration.id)
+    def __init__(self, retailer_id: int, credentials: OngoingCredentials = None):
+        credentials = credentials or get_ongoing_credentials(retailer_id)
 
-        if not ongoing_integration:
+        if not credentials:
             abort(HTTPStatus.BAD_REQUEST, f"Ongoing integration for {retailer_id=} does not exist!")
 
-        self.goods_owner_id: int = ongoing_integration.goods_owner_id
-        self.base_url: str = f"https://api.ongoingsystems.se/{ongoing_integration.warehouse_name}/api/v1"
+        self.retailer_id: int = retailer_id
+        self.goods_owner_id: int = credentials.goods_owner_id
+        self.warehouse_name: str = credentials.warehouse_name
+        self.base_url: str = credentials.base_url
 
-        auth_token: str = string_to_base64_string(f'{ongoing_integration.username}:{ongoing_integration.password}')
+        auth_token: str = string_to_base64_string(f'{credentials.username}:{credentials.password}')
         self.headers = {
             "Content-type": "application/json",
             "Authorization":
                 f"Basic {auth_token}"
         }
 
+        self._session = get_http_session(self.base_url)
+
         self._orders: str = f"{self.base_url}/orders"
         self._return_order: str = f"{self.base_url}/returnOrders"
 
@@ -62,84 +79,138 @@ class OngoingApi:
 
         return self._make_request("get", self._orders, params=params)
 
+    def stream_outgoing_orders_returned_since(self, from_date: str, order_id_from: int = None,
+                                              max_orders: int = None, to_date: str = None) -> JsonArrayStream:
+        params = {
+            "goodsOwnerId": self.goods_owner_id,
+            "lastReturnedFrom": from_date
+        }
+        if to_date:
+            params["lastReturnedTo"] = to_date
+        return self._stream_order_page(params, order_id_from, max_orders)
+
+    def iter_outgoing_orders_returned_since(self, from_date: str, page_size: int = ORDERS_PAGE_SIZE,
+                                            to_date: str = None) -> Iterator[dict]:
+        def stream_page(page_from_date: str, order_id_from: Optional[int], max_orders: int) -> JsonArrayStream:
+            return self.stream_outgoing_orders_returned_since(page_from_date, order_id_from, max_orders, to_date)
+
+        return self._iter_order_pages(stream_page, from_date, page_size)
+
+    def stream_outgoing_orders_shipped_since(self, from_date: str, order_id_from: int = None,
+                                             max_orders: int = None) -> JsonArrayStream:
+        params = {
+            "goodsOwnerId": self.goods_owner_id,
+            "shippedTimeFrom": from_date
+        }
+        return self._stream_order_page(params, order_id_from, max_orders)
+
+    def iter_outgoing_orders_shipped_since(self, from_date: str, page_size: int = ORDERS_PAGE_SIZE) \
+            -> Iterator[dict]:
+        return self._iter_order_pages(self.stream_outgoing_orders_shipped_since, from_date, page_size)
+
+    def stream_outgoing_order_between_dates(self, from_date: str, to_date: str) -> JsonArrayStream:
+        params = {
+            "goodsOwnerId": self.goods_owner_id,
+            "orderCreatedTimeFrom": from_date,
+            "orderCreatedTimeTo": to_date
+        }
+        return self._stream_orders(params)
+
     def get_order_by_goods_owner_order_id(self, ext_internal_order_id: str, order_date: datetime) -> Optional[Order]:
         # since Ongoing stores the Shopify Order_id and yayloh has Shopify order_number,
         # we have to search in a date range around order date
         # todo enrich service can call integration to get order object from oms integration
+        if OrderReplicaSettings.ENABLED \
+                and (order := find_replicated_order(self.warehouse_name, self.goods_owner_id, ext_internal_order_id)):
+            return order
+
+        if isinstance(order_date, str):
+            order_date = get_date_obj(order_date)
 
-        from_date: str = (order_date - timedelta(minutes=5)).strftime("%Y-%m-%d")
-        to_date: str = (order_date + timedelta(minutes=5)).strftime("%Y-%m-%d")
-
-        response = self.get_outgoing_order_between_dates(from_date, to_date)
-        if is_successful(response):
-            for i in response.json():
-                order = i.get("orderInfo")
-                if order.get("goodsOwnerOrderId") == ext_internal_order_id:
-                    order_lines: List[OrderDetail] = [
-                        OrderDetail(
-                            order_line.get("rowNumber"),
-                            order_line.get("articleSystemId"),
-                            order_line.get("articleNumber"),
-                            order_line.get("articleName"),
-                            order_line.get("productCode"),
-                            order_line.get("pickedArticleItems")[0].get("returnDate"),
-                            order_line.get("pickedArticleItems")[0].get("returnCause")
-                        )
-                        for order_line in i.get("orderLines")]
-
-                    return(
-                        Order(
-                            order.get("orderNumber"),
-                            order.get("goodsOwnerOrderId"),
-                            order.get("orderRemark"),
-                            order.get("shippedTime"),
-                            order_lines
-                        )
-                    )
+        from_day: date = (order_date - timedelta(minutes=5)).date()
+        to_day: date = (order_date + timedelta(minutes=5)).date()
+
+        for day in sorted({from_day, to_day}):
+            if order := find_order_by_goods_owner_order_id(self, ext_internal_order_id, day):
+                return order
         return None
 
     def create_return_order(self, order_id: int):
-        payload = {
-            "goodsOwnerId": self.goods_owner_id,
-            "returnOrderNumber": "string",
-            "customerOrder": {
-                "orderId": order_id
-            },
-            "returnOrderLines": [
-                {
-                    "returnOrderRowNumber": "string",
-                    "customerOrderLine": {
-                        "orderLineId": 0
-                      },
-                      "toBeReturnedNumberOfItems": 0
-                    }
-                  ]
-                }
-
+        payload = get_return_order_payload(self.goods_owner_id, order_id)
         return self._make_request("put", self._return_order, payload=payload)
 
     def get_return_orders(self, return_order_numbers: List[str]) -> List[dict]:
-        params = {
-            "goodsOwnerId": self.goods_owner_id,
-            "returnOrderNumbers": return_order_numbers
-        }
-
-        response = self._make_request("get", self._return_order, params=params)
+        return_orders: List[dict] = []
+        # keep the query string of large batches within url length limits
+        for i in range(0, len(return_order_numbers), RETURN_ORDER_NUMBERS_PER_REQUEST):
+            params = {
+                "goodsOwnerId": self.goods_owner_id,
+                "returnOrderNumbers": return_order_numbers[i:i + RETURN_ORDER_NUMBERS_PER_REQUEST]
+            }
 
-        response.raise_for_status()
+            response = self._make_request("get", self._return_order, params=params)
 
-        return response.json()
+            response.raise_for_status()
 
-    def _make_request(self, req_type: str, url: str, params: dict = None, payload: dict = None) -> Response:
+            with metrics.stage("ongoing_json"):
+                return_orders += codec.loads(response.content)
+
+        return return_orders
+
+    def _stream_order_page(self, params: dict, order_id_from: Optional[int], max_orders: Optional[int]) \
+            -> JsonArrayStream:
+        if order_id_from is not None:
+            params["orderIdFrom"] = order_id_from
+        if max_orders:
+            params["maxOrdersToGet"] = max_orders
+        return self._stream_orders(params)
+
+    @staticmethod
+    def _iter_order_pages(stream_page: Callable[[str, Optional[int], int], JsonArrayStream], from_date: str,
+                          page_size: int) -> Iterator[dict]:
+        # pages through the orders in order id order
+        order_id_from: Optional[int] = None
+        while True:
+            page_length = 0
+            with stream_page(from_date, order_id_from, page_size) as page:
+                for ongoing_order in page:
+                    page_length += 1
+                    order_id_from = max(order_id_from or 0, ongoing_order["orderInfo"]["orderId"] + 1)
+                    yield ongoing_order
+
+            metrics.incr("orders_scanned", page_length)
+            if page_length < page_size:
+                return
+
+    def _stream_orders(self, params: dict) -> JsonArrayStream:
+        # order listings can be huge, so they are parsed one order at a time while downloading
+        response = self._make_request("get", self._orders, params=params, stream=True)
+        if not is_successful(response):
+            response.close()
+            return JsonArrayStream([b"[]"])
+
+        def close():
+            metrics.incr("ongoing_bytes", orders.bytes_read, "Bytes")
+            response.close()
+
+        orders = JsonArrayStream(_time_download(response.iter_content(chunk_size=STREAM_CHUNK_SIZE)), close=close)
+        return orders
+
+    def _make_request(self, req_type: str, url: str, params: dict = None, payload: dict = None,
+                      stream: bool = False) -> Response:
         response: Response = Response()
         response.headers = {}
         try:
-            if req_type == "get":
-                response = requests.get(url, headers=self.headers, params=params)
-            elif req_type == "post":
-                response = requests.post(url, headers=self.headers, json=payload)
-            elif req_type == "delete":
-                response = requests.delete(url, headers=self.headers)
+            def send_request(timeout) -> Response:
+                return self._session.request(req_type.upper(), url, headers=self.headers, params=params,
+                                             data=None if payload is None else codec.dumps(payload),
+                                             timeout=timeout, stream=stream)
+
+            with metrics.stage("ongoing_request"):
+                # throttling, retries and failing fast are handled per warehouse
+                response = get_request_scheduler(self.base_url).send(req_type, send_request, get_http_timeout())
+            if not stream:
+                metrics.incr("ongoing_bytes", len(response.content), "Bytes")
 
             response.raise_for_status()
             return response
@@ -149,104 +220,241 @@ class OngoingApi:
             logger.info(err.response.content)
             response.raise_for_status()
 
+        except (CircuitOpenError, DeadlineExceeded) as err:
+            logger.warning(err)
+            raise
+
         except Exception as err:
             logger.exception(err)
-            response.raise_for_status()
+            raise
+
+
+def _time_download(chunks: Iterator[bytes]) -> Iterator[bytes]:
+    # a streamed response is downloaded while it's parsed, after _make_request timed its headers
+    chunks = iter(chunks)
+    while True:
+        started = time.perf_counter()
+        chunk = next(chunks, None)
+        metrics.incr("ongoing_request_ms", (time.perf_counter() - started) * 1000, "Milliseconds")
+        if chunk is None:
+            return
+        yield chunk
+
+
+_ongoing_apis = TTLCache(maxsize=IntegrationCacheSettings.MAX_SIZE, ttl=IntegrationCacheSettings.TTL_SECONDS)
+
 
+def get_ongoing_api(retailer_id: int) -> OngoingApi:
+    # keyed on the credentials, so an invalidated and changed integration gets a fresh client
+    credentials = get_ongoing_credentials(retailer_id)
+    if not credentials:
+        return OngoingApi(retailer_id)
 
-def get_returned_outgoing_orders(retailer_id: int, from_date: str) -> List[Inspection]:
-    raw_orders: List[Inspection] = []
-    response = OngoingApi(retailer_id).get_outgoing_orders_returned_since(from_date)
-    if is_successful(response):
-        for i in response.json():
-            order = i.get("orderInfo")
-            inspection_lines: List[InspectionDetail] = []
-            for order_line in i.get("orderLines"):
-                # 'orderRemark': '220221 kan lagerföras' means it can be put back to sell
-                if "220221" in order.get("orderRemark"):
-                    inspection_result = "OK"
-                else:
-                    inspection_result = "Not OK"
-                inspect_line = InspectionDetail(
-                    ext_internal_order_detail_id=order_line.get("rowNumber"),
-                    order_detail_id=None,
-                    inspection_result=inspection_result,
-                    comment=order.get("orderRemark"),
-                    last_changed=order_line.get("pickedArticleItems")[0].get("returnDate")
-                )
-                inspection_lines.append(inspect_line)
-
-                raw_orders.append(
-                    Inspection(
-                        ext_order_id=None,
-                        ext_internal_order_id=order.get("goodsOwnerOrderId"),
-                        inspected_order_details=inspection_lines
-                    )
-                )
-        return raw_orders
-
-
-def return_request_queue_listener(event: dict):
-    process_sqs_messages_return_batch_failures(event, push_to_ongoing)
+    return _ongoing_apis.get_or_set(credentials, lambda: OngoingApi(retailer_id, credentials))
+
+
+def get_returned_outgoing_orders(retailer_id: int, from_date: str, to_date: str = None) -> List[Inspection]:
+    return list(iter_returned_outgoing_orders(retailer_id, from_date, to_date))
+
+
+def iter_returned_outgoing_orders(retailer_id: int, from_date: str, to_date: str = None) -> Iterator[Inspection]:
+    ongoing_api = get_ongoing_api(retailer_id)
+    classify = get_inspection_classifier(ongoing_api.warehouse_name)
+    for ongoing_order in ongoing_api.iter_outgoing_orders_returned_since(from_date, to_date=to_date):
+        with metrics.stage("transform"):
+            inspection = build_returned_order_inspection(ongoing_order, classify)
+        yield inspection
+
+
+def return_request_queue_listener(event: dict, context=None):
+    # return requests carry no id of their own and an order can legitimately be returned again, so only
+    # redeliveries of the same sqs message are skipped
+    return process_sqs_messages_return_batch_failures(event, push_to_ongoing, ordering_key=return_request_order_key,
+                                                      context=context)
+
+
+def return_request_order_key(sqs_message: dict) -> tuple:
+    return sqs_message['retailer_id'], sqs_message['ext_internal_order_id']
 
 
 def push_to_ongoing(sqs_message: dict):
     # this function will do the following
     # 1. get "ongoing order" object for a yayloh return request
-    ongoing_api = OngoingApi(sqs_message['retailer_id'])
+    ongoing_api = get_ongoing_api(sqs_message['retailer_id'])
     ongoing_order = ongoing_api.get_order_by_goods_owner_order_id(sqs_message['ext_internal_order_id'],
                                                                   sqs_message['order_date'])
     # 2. create an "ongoing return order"
     ongoing_api.create_return_order(ongoing_order.ext_internal_order_id)
 
 
-def ongoing_return_order_webhook(event: dict):
-    process_sqs_messages_return_batch_failures(event, update_inspection_status_for_return_orders)
+def ongoing_return_order_webhook(event: dict, context=None):
+    return process_sqs_message_groups_return_batch_failures(event, ongoing_webhook_goods_owner_key,
+                                                            update_inspection_status_for_goods_owner_return_orders,
+                                                            context=context, idempotency_key=ongoing_webhook_event_key)
 
 
-def ongoing_return_on_delivery_order_webhook(event: dict):
-    process_sqs_messages_return_batch_failures(event, update_inspection_status_for_return_on_delivery_orders)
+def ongoing_return_on_delivery_order_webhook(event: dict, context=None):
+    return process_sqs_message_groups_return_batch_failures(event, ongoing_webhook_goods_owner_key,
+                                                            update_inspection_status_for_return_on_delivery_orders,
+                                                            context=context, idempotency_key=ongoing_picking_event_key)
 
 
-def get_retailer_id_from_goods_owner_id(goods_owner_id: int) -> int:
-    ongoing_integration = OngoingIntegration.get_first(goods_owner_id=goods_owner_id)
-    warehouse_integration = RetailerWarehouseIntegration.get(ongoing_integration.warehouse_integration_id)
-    return warehouse_integration.retailer_id
+def ongoing_webhook_goods_owner_key(sqs_message: dict) -> int:
+    return sqs_message['goodsOwnerId']
+
+
+def ongoing_webhook_event_key(sqs_message: dict) -> Optional[tuple]:
+    # a webhook event ongoing sends again keeps its id, without one only the sqs message id identifies a duplicate
+    event_id = sqs_message.get('webhookEventId')
+    if event_id is None:
+        return None
+
+    return_order: dict = sqs_message.get('returnOrder') or {}
+    return sqs_message['goodsOwnerId'], event_id, return_order.get('returnOrderNumber')
+
+
+def ongoing_picking_event_key(sqs_message: dict) -> Optional[tuple]:
+    # one picking event can be sent for several article items, each with a picking id of its own
+    event_id = sqs_message.get('webhookEventId')
+    if event_id is None:
+        return None
+
+    return sqs_message['goodsOwnerId'], event_id, sqs_message.get('webhookPickingId')
 
 
 def update_inspection_status_for_return_orders(sqs_message: dict):
     # this function will do the following
-    inspection_dict = {}
-
     # 1. parse webhook payload
     retailer_id = get_retailer_id_from_goods_owner_id(sqs_message['goodsOwnerId'])
     return_order = parse_return_order_webhook_payload(sqs_message)
-    customer_order_info: dict = sqs_message['customerOrderInfo']
 
     # 2. get "ongoing return order" and corresponding yayloh order object
-    ongoing_api = OngoingApi(retailer_id)
-    if return_orders := ongoing_api.get_return_orders([return_order.returnOrderNumber]):
-        # 3. get "return order status from ongoing"
+    ongoing_api = get_ongoing_api(retailer_id)
+    return_orders = ongoing_api.get_return_orders([return_order.returnOrderNumber])
+
+    # 3. get "return order status from ongoing" and 4. call yayloh to update inspection status
+    post_inspection(retailer_id, get_return_order_inspection(sqs_message, return_orders))
+
+
+def update_inspection_status_for_goods_owner_return_orders(sqs_messages: Dict[str, dict]) -> List[str]:
+    # same as update_inspection_status_for_return_orders, but fetches the return orders of
+    # every message of one goods owner with as few ongoing requests as possible
+    failed_message_ids: List[str] = []
+    goods_owner_id: int = next(iter(sqs_messages.values()))['goodsOwnerId']
+    retailer_id = get_retailer_id_from_goods_owner_id(goods_owner_id)
+
+    return_order_numbers: Dict[str, str] = {}
+    for message_id, sqs_message in sqs_messages.items():
+        try:
+            return_order_numbers[message_id] = parse_return_order_webhook_payload(sqs_message).returnOrderNumber
+        except Exception:
+            logger.exception(f"Sqs message couldn't be parsed: {message_id}")
+            failed_message_ids.append(message_id)
+
+    ongoing_api = get_ongoing_api(retailer_id)
+    return_orders_by_number: Dict[str, dict] = {
+        return_order['returnOrderInfo']['returnOrderNumber']: return_order
+        for return_order in ongoing_api.get_return_orders(list(dict.fromkeys(return_order_numbers.values())))
+    }
+
+    write_back = get_batch_write_back()
+    for message_id, return_order_number in return_order_numbers.items():
+        try:
+            return_order: Optional[dict] = return_orders_by_number.get(return_order_number)
+            inspection = get_return_order_inspection(sqs_messages[message_id], [return_order] if return_order else [])
+            write_back.add(retailer_id, inspection, message_id)
+        except Exception:
+            logger.exception(f"Sqs message couldn't be processed: {message_id}")
+            failed_message_ids.append(message_id)
+
+    return failed_message_ids
+
+
+def get_return_order_inspection(sqs_message: dict, return_orders: List[dict]) -> Union[Inspection, dict]:
+    customer_order_info: dict = sqs_message['customerOrderInfo']
+    if not return_orders:
+        return {}
+
+    with metrics.stage("transform"):
         inspection_details: List[InspectionDetail] = get_ongoing_inspection_statuses(return_orders)
         inspection: Inspection = Inspection(ext_order_id=customer_order_info['orderNumber'],
                                             ext_internal_order_id=customer_order_info['orderId'],
                                             inspected_order_details=inspection_details)
-        inspection_dict = asdict(inspection)
+        return inspection
+
+
+def update_inspection_status_for_return_on_delivery_orders(sqs_messages: Dict[str, dict]) -> List[str]:
+    # this function will do the following, for every message of one goods owner
+    # 1. parse the picking webhook payloads of the returned article items
+    failed_message_ids: List[str] = []
+    goods_owner_id: int = next(iter(sqs_messages.values()))['goodsOwnerId']
+    retailer_id = get_retailer_id_from_goods_owner_id(goods_owner_id)
 
-    # 4. Call yayloh to update inspection status
-    response = requests.post(url=f"{YaylohServices.RPLATFORM}/wms/retailer-id/{retailer_id}/order_details/inspected/",
-                             json=inspection_dict)
+    message_ids_by_order_number: Dict[str, List[str]] = {}
+    # rows of each order the webhooks were sent for, None for an order with a webhook that doesn't say
+    row_numbers_by_order_number: Dict[str, Optional[Set[str]]] = {}
+    for message_id, sqs_message in sqs_messages.items():
+        try:
+            picking = parse_picking_webhook_payload(sqs_message)
+        except Exception:
+            logger.exception(f"Sqs message couldn't be parsed: {message_id}")
+            failed_message_ids.append(message_id)
+            continue
+
+        # picking webhooks are sent for every change of an article item, only the returns are of interest
+        if picking.isReturned and not picking.isDeleted:
+            order_number = picking.order.orderNumber
+            message_ids_by_order_number.setdefault(order_number, []).append(message_id)
+            row_numbers = row_numbers_by_order_number.setdefault(order_number, set())
+            order_line = picking.order.orderLine
+            if row_numbers is None or order_line is None or order_line.rowNumber is None:
+                row_numbers_by_order_number[order_number] = None
+            else:
+                row_numbers.add(str(order_line.rowNumber))
+
+    # 2. get every returned "ongoing order" once, however many of its items were returned in the batch
+    ongoing_api = get_ongoing_api(retailer_id)
+    classify = get_inspection_classifier(ongoing_api.warehouse_name)
+    write_back = get_batch_write_back()
+    for order_number, message_ids in message_ids_by_order_number.items():
+        try:
+            # 3. build the inspection from the returned article items of the lines the webhooks were sent for
+            inspection = get_picked_return_inspection(ongoing_api, order_number, classify,
+                                                      row_numbers_by_order_number[order_number])
+        except Exception:
+            logger.exception(f"Sqs messages couldn't be processed: {message_ids}")
+            failed_message_ids += message_ids
+            continue
 
-    response.raise_for_status()
+        # 4. call yayloh to update the inspection status, once per order at the end of the batch
+        write_back.add(retailer_id, inspection, *message_ids)
 
+    return failed_message_ids
 
-def update_inspection_status_for_return_on_delivery_orders(sqs_message: dict):
-    pass
-    # return_on_delivery_order = account.ongoing_api.get_order(order.orderNumber)
+
+def get_picked_return_inspection(ongoing_api: OngoingApi, order_number: str, classify: InspectionClassifier,
+                                 row_numbers: Optional[Set[str]]) -> Inspection:
+    goods_owner_id: int = ongoing_api.goods_owner_id
+    response = ongoing_api.get_order(order_number)
+    with metrics.stage("ongoing_json"):
+        ongoing_orders: List[dict] = codec.loads(response.content)
+    if not ongoing_orders:
+        raise LookupError(f"Ongoing order {order_number} of {goods_owner_id=} does not exist")
+
+    with metrics.stage("transform"):
+        inspection = build_returned_order_inspection(ongoing_orders[0], classify, row_numbers)
+    if not inspection.inspected_order_details:
+        # retried, until ongoing's order has caught up with the webhook
+        raise LookupError(f"Ongoing order {order_number} of {goods_owner_id=} has no returned article items")
+    return inspection
 
 
 def parse_return_order_webhook_payload(sqs_message: dict) -> OngoingReturnOrder:
-    return OngoingReturnOrder(**sqs_message['returnOrder'])
+    return camel_case_to_snake_case(sqs_message['returnOrder'], into=OngoingReturnOrder)
+
+
+def parse_picking_webhook_payload(sqs_message: dict) -> OngoingPicking:
+    return camel_case_to_snake_case(sqs_message, into=OngoingPicking)
 
 
 def get_ongoing_inspection_statuses(return_orders: List[dict]) -> List[InspectionDetail]:
@@ -0,0 +1,64 @@
+# Turns returned outgoing orders from Ongoing into yayloh inspections. Whether a returned order can be put
+# back to sell is decided once per order by the classifier registered for its warehouse.
+
+from typing import Callable, Collection, Dict, List
+
+from wms.integration.interface import Inspection, InspectionDetail
+
+InspectionClassifier = Callable[[dict], str]
+
+
+def remark_contains(code: str) -> InspectionClassifier:
+    def classify(ongoing_order: dict) -> str:
+        return "OK" if code in (ongoing_order.get("orderInfo").get("orderRemark") or "") else "Not OK"
+
+    return classify
+
+
+# 'orderRemark': '220221 kan lagerföras' means it can be put back to sell
+DEFAULT_INSPECTION_CLASSIFIER: InspectionClassifier = remark_contains("220221")
+
+_inspection_classifiers: Dict[str, InspectionClassifier] = {}
+
+
+def register_inspection_classifier(warehouse_name: str, classifier: InspectionClassifier):
+    _inspection_classifiers[warehouse_name] = classifier
+
+
+def get_inspection_classifier(warehouse_name: str) -> InspectionClassifier:
+    return _inspection_classifiers.get(warehouse_name, DEFAULT_INSPECTION_CLASSIFIER)
+
+
+def build_returned_order_inspection(ongoing_order: dict,
+                                    classify: InspectionClassifier = DEFAULT_INSPECTION_CLASSIFIER,
+                                    row_numbers: Collection[str] = None) -> Inspection:
+    """Inspect the lines of the order with a returned article item, only the ones in ``row_numbers`` if given."""
+    order = ongoing_order.get("orderInfo")
+    inspection_result: str = classify(ongoing_order)
+    comment: str = order.get("orderRemark")
+
+    inspection_lines: List[InspectionDetail] = []
+    for order_line in ongoing_order.get("orderLines") or []:
+        if row_numbers is not None and str(order_line.get("rowNumber")) not in row_numbers:
+            continue
+
+        # lines that weren't picked have no items, and only some of the picked items may have come back
+        return_dates = [picked_article_item["returnDate"]
+                        for picked_article_item in order_line.get("pickedArticleItems") or []
+                        if picked_article_item.get("returnDate")]
+        if not return_dates:
+            continue
+
+        inspection_lines.append(InspectionDetail(
+            ext_internal_order_detail_id=order_line.get("rowNumber"),
+            order_detail_id=None,
+            inspection_result=inspection_result,
+            comment=comment,
+            last_changed=max(return_dates)
+        ))
+
+    return Inspection(
+        ext_order_id=None,
+        ext_internal_order_id=order.get("goodsOwnerOrderId"),
+        inspected_order_details=inspection_lines
+    )
@@ -0,0 +1,107 @@
+# Retailer <-> Ongoing goods owner lookups are needed for every sqs message but almost never change,
+# so they are cached for the lifetime of the (warm) lambda container.
+
+from dataclasses import dataclass
+from typing import Optional
+
+from ymodel.integration.warehouse_integration import OngoingIntegration, RetailerWarehouseIntegration
+
+from wms.common import metrics
+from wms.common.cache import TTLCache
+from wms.common.constants import IntegrationCacheSettings, OngoingSettings, RetailerWarehouseIntegrationType
+from wms.common.recording import get_current_recording
+
+
+@dataclass(frozen=True)
+class OngoingCredentials:
+    retailer_id: int
+    goods_owner_id: int
+    warehouse_name: str
+    username: str
+    password: str
+
+    @property
+    def base_url(self) -> str:
+        return f"{OngoingSettings.API_URL}/{self.warehouse_name}/api/v1"
+
+
+_credentials_by_retailer_id = TTLCache(maxsize=IntegrationCacheSettings.MAX_SIZE,
+                                       ttl=IntegrationCacheSettings.TTL_SECONDS)
+_retailer_id_by_goods_owner_id = TTLCache(maxsize=IntegrationCacheSettings.MAX_SIZE,
+                                          ttl=IntegrationCacheSettings.TTL_SECONDS)
+
+# cached for a retailer without an ongoing integration, so messages for it don't each query the database
+_MISSING_INTEGRATION = object()
+
+
+def get_ongoing_credentials(retailer_id: int) -> Optional[OngoingCredentials]:
+    if (credentials := _credentials_by_retailer_id.get(retailer_id)) is not None:
+        metrics.incr("integration_cache_hits")
+    else:
+        metrics.incr("integration_cache_misses")
+        with metrics.stage("integration_lookup"):
+            credentials = _credentials_by_retailer_id.get_or_set(retailer_id,
+                                                                 lambda: _load_ongoing_credentials(retailer_id))
+    if credentials is _MISSING_INTEGRATION:
+        return None
+
+    # a replay sets the integrations of a recorded batch up again, without the credentials
+    if credentials and (recording := get_current_recording()):
+        recording.add_integration(credentials.retailer_id, credentials.goods_owner_id, credentials.warehouse_name)
+    return credentials
+
+
+def get_retailer_id_from_goods_owner_id(goods_owner_id: int) -> int:
+    if retailer_id := _retailer_id_by_goods_owner_id.get(goods_owner_id):
+        metrics.incr("integration_cache_hits")
+        return retailer_id
+
+    metrics.incr("integration_cache_misses")
+    with metrics.stage("integration_lookup"):
+        return _retailer_id_by_goods_owner_id.get_or_set(goods_owner_id, lambda: _load_retailer_id(goods_owner_id))
+
+
+def cache_ongoing_credentials(credentials: OngoingCredentials):
+    _credentials_by_retailer_id.set(credentials.retailer_id, credentials)
+    _retailer_id_by_goods_owner_id.set(credentials.goods_owner_id, credentials.retailer_id)
+
+
+def invalidate_integration_cache(retailer_id: int = None, goods_owner_id: int = None):
+    """Drop cached integration data, everything if neither id is given."""
+    if retailer_id is None and goods_owner_id is None:
+        _credentials_by_retailer_id.clear()
+        _retailer_id_by_goods_owner_id.clear()
+        return
+
+    if goods_owner_id is not None:
+        retailer_id = _retailer_id_by_goods_owner_id.pop(goods_owner_id, retailer_id)
+
+    if retailer_id is not None:
+        credentials = _credentials_by_retailer_id.pop(retailer_id)
+        if isinstance(credentials, OngoingCredentials):
+            _retailer_id_by_goods_owner_id.pop(credentials.goods_owner_id)
+
+
+def _load_ongoing_credentials(retailer_id: int) -> Optional[OngoingCredentials]:
+    warehouse_integration = RetailerWarehouseIntegration.get_first(
+        retailer_id=retailer_id, warehouse_integration_type_id=RetailerWarehouseIntegrationType.ONGOING)
+    ongoing_integration = OngoingIntegration.get(warehouse_integration.id) if warehouse_integration else None
+    if not ongoing_integration:
+        # get_or_set doesn't cache None, the miss is cached here with its own ttl
+        _credentials_by_retailer_id.set(retailer_id, _MISSING_INTEGRATION,
+                                        ttl=IntegrationCacheSettings.MISSING_TTL_SECONDS)
+        return None
+
+    credentials = OngoingCredentials(retailer_id=retailer_id,
+                                     goods_owner_id=ongoing_integration.goods_owner_id,
+                                     warehouse_name=ongoing_integration.warehouse_name,
+                                     username=ongoing_integration.username,
+                                     password=ongoing_integration.password)
+    _retailer_id_by_goods_owner_id.set(credentials.goods_owner_id, retailer_id)
+    return credentials
+
+
+def _load_retailer_id(goods_owner_id: int) -> int:
+    ongoing_integration = OngoingIntegration.get_first(goods_owner_id=goods_owner_id)
+    warehouse_integration = RetailerWarehouseIntegration.get(ongoing_integration.warehouse_integration_id)
+    return warehouse_integration.retailer_id
@@ -4,11 +4,21 @@
 #       The latter has api structure for logging return reasons.
 
 from dataclasses import dataclass
-from typing import List
+from typing import List, Optional
 
 
 @dataclass
 class OrderDetail:
+    __slots__ = (
+        "ext_internal_order_detail_id",
+        "article_id",
+        "sku_number",
+        "product_name",
+        "product_code",
+        "return_date",
+        "return_reason",
+    )
+
     ext_internal_order_detail_id: str
     article_id: str
     sku_number: str
@@ -20,6 +30,8 @@ class OrderDetail:
 
 @dataclass
 class Order:
+    __slots__ = ("order_number", "ext_internal_order_id", "warehouse_remark", "shipped_on", "order_lines")
+
     order_number: str
     ext_internal_order_id: str
     warehouse_remark: str
@@ -36,12 +48,36 @@ class OngoingArticle:
 
 @dataclass
 class OngoingReturnOrderLine:
+    __slots__ = ("returnOrderLineId", "returnOrderRowNumber")
+
     returnOrderLineId: int
     returnOrderRowNumber: str
 
 
 @dataclass
 class OngoingReturnOrder:
+    __slots__ = ("returnOrderId", "returnOrderNumber", "returnOrderLine")
+
     returnOrderId: int
     returnOrderNumber: str
     returnOrderLine: OngoingReturnOrderLine
+
+
+@dataclass
+class OngoingPickingOrderLine:
+    orderLineId: Optional[int] = None
+    rowNumber: Optional[str] = None
+
+
+@dataclass
+class OngoingPickingOrder:
+    orderId: int
+    orderNumber: str
+    orderLine: Optional[OngoingPickingOrderLine] = None
+
+
+@dataclass
+class OngoingPicking:
+    order: OngoingPickingOrder
+    isReturned: bool = False
+    isDeleted: bool = False
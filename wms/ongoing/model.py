@@ -0,0 +1,90 @@
+from datetime import datetime
+
+from wms import db
+from wms.ongoing.interface import Order, OrderDetail
+
+
+class OngoingSyncState(db.Model):
+    """High-water mark of an incremental sync from Ongoing, per warehouse, goods owner and kind of sync."""
+    __tablename__ = 'ongoing_sync_state'
+
+    RETURNED_ORDERS = 'returned_orders'
+    SHIPPED_ORDERS = 'shipped_orders'
+
+    # ongoing's ids are only unique within a warehouse
+    warehouse_name = db.Column(db.String(64), primary_key=True)
+    goods_owner_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    sync_type = db.Column(db.String(32), primary_key=True)
+    # iso timestamp the next sync starts from
+    watermark = db.Column(db.String(40), nullable=True)
+    # fingerprints of the orders sitting exactly on the watermark, which the next sync will see again
+    boundary = db.Column(db.JSON, nullable=True)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    @classmethod
+    def get_or_create(cls, warehouse_name: str, goods_owner_id: int, sync_type: str) -> 'OngoingSyncState':
+        state = cls.query.get((warehouse_name, goods_owner_id, sync_type))
+        if state is None:
+            state = cls(warehouse_name=warehouse_name, goods_owner_id=goods_owner_id, sync_type=sync_type, boundary={})
+            db.session.add(state)
+        return state
+
+
+class BackfillCheckpoint(db.Model):
+    """A day of returns that a backfill has written back for a retailer, so that a rerun can skip it."""
+    __tablename__ = 'backfill_checkpoint'
+
+    retailer_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    day = db.Column(db.Date, primary_key=True)
+    inspections = db.Column(db.Integer, nullable=False, default=0)
+    completed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class OngoingOrder(db.Model):
+    """Replica of a shipped Ongoing outgoing order, so it can be looked up by the goods owner's order id.
+
+    Ongoing's ids are only unique within a warehouse, so an order is identified by its warehouse and goods owner. Return
+    data isn't replicated: it's added to an order after it shipped, so a replica of it would go stale.
+    """
+    __tablename__ = 'ongoing_order'
+    __table_args__ = (
+        db.UniqueConstraint('warehouse_name', 'goods_owner_id', 'order_id', name='uq_ongoing_order_goods_owner_order'),
+        db.Index('ix_ongoing_order_goods_owner_order_id', 'warehouse_name', 'goods_owner_id', 'goods_owner_order_id'),
+        db.Index('ix_ongoing_order_order_number', 'warehouse_name', 'goods_owner_id', 'order_number'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    warehouse_name = db.Column(db.String(64), nullable=False)
+    goods_owner_id = db.Column(db.Integer, nullable=False)
+    # ongoing's orderId
+    order_id = db.Column(db.Integer, nullable=False)
+    order_number = db.Column(db.String(64), nullable=True)
+    goods_owner_order_id = db.Column(db.String(64), nullable=True)
+    order_remark = db.Column(db.Text, nullable=True)
+    shipped_time = db.Column(db.String(40), nullable=True)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    lines = db.relationship('OngoingOrderLine', order_by='OngoingOrderLine.id', cascade='all, delete-orphan',
+                            lazy='selectin')
+
+    def to_order(self) -> Order:
+        return Order(self.order_number, self.goods_owner_order_id, self.order_remark, self.shipped_time,
+                     [line.to_order_detail() for line in self.lines])
+
+
+class OngoingOrderLine(db.Model):
+    __tablename__ = 'ongoing_order_line'
+
+    id = db.Column(db.Integer, primary_key=True)
+    ongoing_order_id = db.Column(db.Integer, db.ForeignKey('ongoing_order.id', ondelete='CASCADE'), nullable=False,
+                                 index=True)
+    row_number = db.Column(db.String(64), nullable=True)
+    article_system_id = db.Column(db.Integer, nullable=True)
+    article_number = db.Column(db.String(128), nullable=True)
+    article_name = db.Column(db.String(255), nullable=True)
+    product_code = db.Column(db.String(128), nullable=True)
+
+    def to_order_detail(self) -> OrderDetail:
+        # without return date and cause, which only ongoing has up to date
+        return OrderDetail(self.row_number, self.article_system_id, self.article_number, self.article_name,
+                           self.product_code, None, None)
@@ -0,0 +1,75 @@
+# Ongoing can only search outgoing orders by its own order number, so looking an order up by goodsOwnerOrderId
+# means downloading every order created that day. The download is indexed once per goods owner and day and
+# shared by every message handled by the (warm) lambda container.
+
+import time
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Dict, Optional
+
+from wms.common import metrics
+from wms.common.cache import TTLCache
+from wms.common.constants import OrderIndexSettings
+from wms.ongoing.interface import Order
+from wms.ongoing.utility import parse_order
+
+
+@dataclass
+class DayOrderIndex:
+    orders: Dict[str, Order]
+    size: int
+    built_at: float = field(default_factory=time.monotonic)
+
+
+_day_order_indexes = TTLCache(maxsize=OrderIndexSettings.MAX_BYTES, ttl=OrderIndexSettings.TTL_SECONDS,
+                              sizeof=lambda index: index.size)
+
+
+def find_order_by_goods_owner_order_id(ongoing_api, goods_owner_order_id: str, day: date) -> Optional[Order]:
+    if OrderIndexSettings.MAX_BYTES <= 0:
+        return scan_day_for_order(ongoing_api, goods_owner_order_id, day)
+
+    key = (ongoing_api.base_url, ongoing_api.goods_owner_id, day)
+    index: Optional[DayOrderIndex] = _day_order_indexes.get(key)
+    metrics.incr("order_index_hits" if index else "order_index_misses")
+    if index is None:
+        index = _day_order_indexes.get_or_set(key, lambda: build_day_order_index(ongoing_api, day))
+
+    if goods_owner_order_id not in index.orders \
+            and time.monotonic() - index.built_at > OrderIndexSettings.MISS_REFRESH_SECONDS:
+        _day_order_indexes.pop(key)
+        index = _day_order_indexes.get_or_set(key, lambda: build_day_order_index(ongoing_api, day))
+
+    return index.orders.get(goods_owner_order_id)
+
+
+def build_day_order_index(ongoing_api, day: date) -> DayOrderIndex:
+    day_str: str = day.strftime("%Y-%m-%d")
+    orders: Dict[str, Order] = {}
+    with ongoing_api.stream_outgoing_order_between_dates(day_str, day_str) as ongoing_orders:
+        for ongoing_order in ongoing_orders:
+            order: Order = parse_order(ongoing_order)
+            # a reused goodsOwnerOrderId finds the first order listed, as scan_day_for_order and the order replica do
+            orders.setdefault(order.ext_internal_order_id, order)
+
+    metrics.incr("orders_scanned", len(orders))
+    return DayOrderIndex(orders=orders, size=ongoing_orders.bytes_read)
+
+
+def scan_day_for_order(ongoing_api, goods_owner_order_id: str, day: date) -> Optional[Order]:
+    # without an index, stop downloading as soon as the order is found
+    day_str: str = day.strftime("%Y-%m-%d")
+    orders_scanned = 0
+    try:
+        with ongoing_api.stream_outgoing_order_between_dates(day_str, day_str) as ongoing_orders:
+            for ongoing_order in ongoing_orders:
+                orders_scanned += 1
+                if ongoing_order.get("orderInfo", {}).get("goodsOwnerOrderId") == goods_owner_order_id:
+                    return parse_order(ongoing_order)
+        return None
+    finally:
+        metrics.incr("orders_scanned", orders_scanned)
+
+
+def invalidate_order_indexes():
+    _day_order_indexes.clear()
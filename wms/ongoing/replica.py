@@ -0,0 +1,76 @@
+# Ongoing only searches outgoing orders by its own order number. Shipped orders practically don't change anymore,
+# so a replica of them, kept up to date by an incremental sync, answers goodsOwnerOrderId lookups with one indexed
+# query instead of a day of downloaded orders. Returns do change a shipped order, so its return data is left out
+# and has to come from ongoing.
+
+from typing import Iterable, Optional
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from wms import db, logger
+from wms.common import metrics
+from wms.ongoing.interface import Order
+from wms.ongoing.model import OngoingOrder, OngoingOrderLine
+
+
+def replicate_orders(warehouse_name: str, goods_owner_id: int, ongoing_orders: Iterable[dict]) -> int:
+    """Insert or update the given Ongoing orders, in the current db session. Returns the number of orders."""
+    ongoing_orders = list(ongoing_orders)
+    if not ongoing_orders:
+        return 0
+
+    order_ids = [ongoing_order["orderInfo"]["orderId"] for ongoing_order in ongoing_orders]
+    existing = {order.order_id: order for order in OngoingOrder.query.filter(
+        OngoingOrder.warehouse_name == warehouse_name, OngoingOrder.goods_owner_id == goods_owner_id,
+        OngoingOrder.order_id.in_(order_ids))}
+
+    for ongoing_order in ongoing_orders:
+        order_info: dict = ongoing_order["orderInfo"]
+        order: Optional[OngoingOrder] = existing.get(order_info["orderId"])
+        if order is None:
+            order = OngoingOrder(warehouse_name=warehouse_name, goods_owner_id=goods_owner_id,
+                                 order_id=order_info["orderId"])
+            db.session.add(order)
+            existing[order.order_id] = order
+
+        order.order_number = order_info.get("orderNumber")
+        order.goods_owner_order_id = order_info.get("goodsOwnerOrderId")
+        order.order_remark = order_info.get("orderRemark")
+        order.shipped_time = order_info.get("shippedTime")
+        order.lines = [_build_order_line(order_line) for order_line in ongoing_order.get("orderLines") or []]
+
+    return len(ongoing_orders)
+
+
+def find_replicated_order(warehouse_name: str, goods_owner_id: int, goods_owner_order_id: str) -> Optional[Order]:
+    return _find_order(OngoingOrder.query.filter_by(warehouse_name=warehouse_name, goods_owner_id=goods_owner_id,
+                                                    goods_owner_order_id=goods_owner_order_id))
+
+
+def get_replicated_order(warehouse_name: str, goods_owner_id: int, order_number: str) -> Optional[Order]:
+    return _find_order(OngoingOrder.query.filter_by(warehouse_name=warehouse_name, goods_owner_id=goods_owner_id,
+                                                    order_number=order_number))
+
+
+def _find_order(query) -> Optional[Order]:
+    try:
+        with metrics.stage("order_replica"):
+            # an order id can come back on a later order, e.g. a reshipment. The first order wins, as in the day
+            # order index: ongoing lists orders by orderId, so that's the lowest one
+            order: Optional[OngoingOrder] = query.order_by(OngoingOrder.order_id).first()
+    except SQLAlchemyError:
+        # the replica is only a shortcut, ongoing is still there
+        logger.exception("Ongoing order replica couldn't be queried")
+        db.session.rollback()
+        return None
+
+    metrics.incr("order_replica_hits" if order else "order_replica_misses")
+    return order.to_order() if order else None
+
+
+def _build_order_line(order_line: dict) -> OngoingOrderLine:
+    return OngoingOrderLine(row_number=order_line.get("rowNumber"),
+                            article_system_id=order_line.get("articleSystemId"),
+                            article_number=order_line.get("articleNumber"),
+                            article_name=order_line.get("articleName"),
+                            product_code=order_line.get("productCode"))
@@ -0,0 +1,134 @@
+# Incremental syncs from Ongoing: every goods owner keeps a high-water mark per kind of sync, e.g. the last return
+# it has handed off, so polling only costs work proportional to what came in since.
+
+import hashlib
+import json
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from wms import db, logger
+from wms.common.constants import OrderReplicaSettings, ReturnedOrdersSyncSettings
+from wms.integration.interface import Inspection
+from wms.integration.write_back import InspectionWriteBack, WriteBackError
+from wms.ongoing.controller import get_ongoing_api
+from wms.ongoing.inspection import build_returned_order_inspection, get_inspection_classifier
+from wms.ongoing.model import OngoingSyncState
+from wms.ongoing.replica import replicate_orders
+from wms.ongoing.utility import get_date_obj
+
+
+def sync_returned_outgoing_orders(retailer_id: int, handoff: Callable[[List[Inspection]], None] = None,
+                                  initial_from: str = None) -> int:
+    """Hand off the inspections of every order returned since the last sync and advance the mark.
+
+    The mark is only advanced once every inspection was handed off, a failed hand-off is synced again next time.
+    Returns the number of inspections handed off.
+    """
+    ongoing_api = get_ongoing_api(retailer_id)
+    handoff = handoff or write_back_inspections(retailer_id)
+    classify = get_inspection_classifier(ongoing_api.warehouse_name)
+
+    state = OngoingSyncState.get_or_create(ongoing_api.warehouse_name, ongoing_api.goods_owner_id,
+                                           OngoingSyncState.RETURNED_ORDERS)
+    from_date: str = state.watermark or initial_from or \
+        (datetime.utcnow() - timedelta(days=ReturnedOrdersSyncSettings.INITIAL_LOOKBACK_DAYS)).isoformat()
+    previous_watermark: Optional[datetime] = get_date_obj(state.watermark) if state.watermark else None
+    previous_boundary: Dict[str, str] = state.boundary or {}
+
+    watermark: Optional[datetime] = previous_watermark
+    boundary: Dict[str, str] = dict(previous_boundary)
+    pending: List[Inspection] = []
+    handed_off = 0
+
+    for ongoing_order in ongoing_api.iter_outgoing_orders_returned_since(from_date):
+        goods_owner_order_id = str(ongoing_order["orderInfo"].get("goodsOwnerOrderId"))
+        returned_at: Optional[datetime] = get_last_returned_time(ongoing_order)
+        fingerprint: str = get_order_fingerprint(ongoing_order)
+
+        if returned_at is not None and (watermark is None or returned_at > watermark):
+            watermark, boundary = returned_at, {}
+        if returned_at is not None and returned_at == watermark:
+            boundary[goods_owner_order_id] = fingerprint
+
+        # orders on the previous mark were seen by the last sync, unless they changed since
+        if returned_at is not None and returned_at == previous_watermark \
+                and previous_boundary.get(goods_owner_order_id) == fingerprint:
+            continue
+
+        pending.append(build_returned_order_inspection(ongoing_order, classify))
+        if len(pending) >= ReturnedOrdersSyncSettings.HANDOFF_SIZE:
+            handoff(pending)
+            handed_off += len(pending)
+            pending = []
+
+    if pending:
+        handoff(pending)
+        handed_off += len(pending)
+
+    if watermark is not None:
+        state.watermark = watermark.isoformat()
+        state.boundary = boundary
+    db.session.commit()
+
+    logger.info(f"Synced {handed_off} returned order inspections for {retailer_id=} up to {state.watermark}")
+    return handed_off
+
+
+def sync_shipped_outgoing_orders(retailer_id: int, initial_from: str = None) -> int:
+    """Copy the orders shipped since the last sync into the order replica and advance the mark.
+
+    Orders are upserted, so the ones shipped exactly on the mark, which the next sync sees again, do no harm.
+    Returns the number of orders replicated.
+    """
+    ongoing_api = get_ongoing_api(retailer_id)
+
+    state = OngoingSyncState.get_or_create(ongoing_api.warehouse_name, ongoing_api.goods_owner_id,
+                                           OngoingSyncState.SHIPPED_ORDERS)
+    from_date: str = state.watermark or initial_from or \
+        (datetime.utcnow() - timedelta(days=OrderReplicaSettings.INITIAL_LOOKBACK_DAYS)).isoformat()
+    watermark: Optional[datetime] = get_date_obj(state.watermark) if state.watermark else None
+    pending: List[dict] = []
+    replicated = 0
+
+    for ongoing_order in ongoing_api.iter_outgoing_orders_shipped_since(from_date):
+        if shipped_time := ongoing_order["orderInfo"].get("shippedTime"):
+            shipped_at: datetime = get_date_obj(shipped_time)
+            watermark = shipped_at if watermark is None else max(watermark, shipped_at)
+
+        pending.append(ongoing_order)
+        if len(pending) >= OrderReplicaSettings.COMMIT_SIZE:
+            replicated += replicate_orders(ongoing_api.warehouse_name, ongoing_api.goods_owner_id, pending)
+            db.session.commit()
+            pending = []
+
+    replicated += replicate_orders(ongoing_api.warehouse_name, ongoing_api.goods_owner_id, pending)
+    if watermark is not None:
+        state.watermark = watermark.isoformat()
+    db.session.commit()
+
+    logger.info(f"Replicated {replicated} shipped orders for {retailer_id=} up to {state.watermark}")
+    return replicated
+
+
+def get_last_returned_time(ongoing_order: dict) -> Optional[datetime]:
+    return_dates = [get_date_obj(picked_article_item["returnDate"])
+                    for order_line in ongoing_order.get("orderLines") or []
+                    for picked_article_item in order_line.get("pickedArticleItems") or []
+                    if picked_article_item.get("returnDate")]
+    return max(return_dates) if return_dates else None
+
+
+def get_order_fingerprint(ongoing_order: dict) -> str:
+    return hashlib.sha1(json.dumps(ongoing_order, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def write_back_inspections(retailer_id: int) -> Callable[[List[Inspection]], None]:
+    def handoff(inspections: List[Inspection]):
+        write_back = InspectionWriteBack()
+        for inspection in inspections:
+            write_back.add(retailer_id, inspection, str(inspection.ext_internal_order_id))
+
+        if failed_order_ids := write_back.flush():
+            raise WriteBackError(f"Inspections of orders {failed_order_ids} couldn't be written back")
+
+    return handoff
@@ -1,8 +1,13 @@
-from dateutil.parser import parse
+from typing import List
+
 from requests import Response
 
+from wms.ongoing.interface import Order, OrderDetail
+
 
 def get_date_obj(dt):
+    # dateutil is only needed by a few code paths, keep it out of the handlers' import time
+    from dateutil.parser import parse
     return parse(dt)
 
 
@@ -20,3 +25,48 @@ def trim_it(string):
 
 def remove_hashtag(ext_order_id: str) -> str:
     return ext_order_id.replace('#', '')
+
+
+def get_return_order_payload(goods_owner_id: int, order_id: int) -> dict:
+    return {
+        "goodsOwnerId": goods_owner_id,
+        "returnOrderNumber": "string",
+        "customerOrder": {
+            "orderId": order_id
+        },
+        "returnOrderLines": [
+            {
+                "returnOrderRowNumber": "string",
+                "customerOrderLine": {
+                    "orderLineId": 0
+                },
+                "toBeReturnedNumberOfItems": 0
+            }
+        ]
+    }
+
+
+def parse_order(ongoing_order: dict) -> Order:
+    order = ongoing_order.get("orderInfo")
+    order_lines: List[OrderDetail] = []
+    for order_line in ongoing_order.get("orderLines"):
+        picked_article_item: dict = (order_line.get("pickedArticleItems") or [{}])[0]
+        order_lines.append(
+            OrderDetail(
+                order_line.get("rowNumber"),
+                order_line.get("articleSystemId"),
+                order_line.get("articleNumber"),
+                order_line.get("articleName"),
+                order_line.get("productCode"),
+                picked_article_item.get("returnDate"),
+                picked_article_item.get("returnCause")
+            )
+        )
+
+    return Order(
+        order.get("orderNumber"),
+        order.get("goodsOwnerOrderId"),
+        order.get("orderRemark"),
+        order.get("shippedTime"),
+        order_lines
+    )
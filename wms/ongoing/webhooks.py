@@ -0,0 +1,112 @@
+# Receives Ongoing's return order and picking webhooks and queues them for the sqs handlers in
+# wms.ongoing.controller. Webhooks are only checked for the fields the handlers group and look them up by,
+# everything else happens asynchronously.
+
+import hashlib
+import hmac
+import json
+from http import HTTPStatus
+from typing import Callable, Hashable, List, Optional
+
+from flask import Blueprint, jsonify, request
+from werkzeug.exceptions import abort
+
+from wms import logger
+from wms.common import codec
+from wms.common.constants import WebhookSettings
+from wms.common.sqs import build_sqs_entry, get_sqs_batch_sender
+from wms.ongoing.controller import ongoing_picking_event_key, ongoing_webhook_event_key
+
+bp = Blueprint("ongoing_webhooks", __name__, url_prefix="/ongoing/webhooks")
+
+
+@bp.route("/return-orders", methods=["POST"])
+def receive_return_order_webhooks():
+    return _enqueue_webhooks("return_order", WebhookSettings.RETURN_ORDER_QUEUE_URL, validate_return_order_webhook,
+                             ongoing_webhook_event_key)
+
+
+@bp.route("/picking", methods=["POST"])
+def receive_picking_webhooks():
+    return _enqueue_webhooks("picking", WebhookSettings.PICKING_QUEUE_URL, validate_picking_webhook,
+                             ongoing_picking_event_key)
+
+
+def validate_return_order_webhook(webhook: dict) -> Optional[str]:
+    return_order = webhook.get("returnOrder")
+    if not isinstance(return_order, dict) or not return_order.get("returnOrderNumber"):
+        return "returnOrder.returnOrderNumber is missing"
+    return None
+
+
+def validate_picking_webhook(webhook: dict) -> Optional[str]:
+    order = webhook.get("order")
+    if not isinstance(order, dict) or not order.get("orderId"):
+        return "order.orderId is missing"
+    if not order.get("orderNumber"):
+        return "order.orderNumber is missing"
+    return None
+
+
+def get_deduplication_id(webhook: dict, body: str, event_key: Callable[[dict], Optional[Hashable]]) -> str:
+    # ongoing resends a webhook with the same event key, which sqs then drops within its 5 minute window. It's the
+    # handler's idempotency key, so that a webhook sqs drops is one the handler would have skipped too
+    key = event_key(webhook)
+    return hashlib.sha1((body if key is None else json.dumps(key, default=str)).encode()).hexdigest()
+
+
+def _authorize():
+    # the queues feed production handlers, without a token configured nothing is accepted
+    if not WebhookSettings.TOKEN:
+        logger.error("No token configured for ongoing webhooks, set ONGOING_WEBHOOK_TOKEN")
+        abort(HTTPStatus.SERVICE_UNAVAILABLE)
+    if not hmac.compare_digest(request.args.get("token", ""), WebhookSettings.TOKEN):
+        abort(HTTPStatus.UNAUTHORIZED)
+
+
+def _get_webhooks(validate: Callable[[dict], Optional[str]]) -> List[dict]:
+    # a single webhook or a list of them
+    payload = request.get_json(silent=True)
+    webhooks: list = payload if isinstance(payload, list) else [payload]
+    for webhook in webhooks:
+        if not isinstance(webhook, dict):
+            abort(HTTPStatus.BAD_REQUEST, "A webhook has to be a json object")
+        if not isinstance(webhook.get("goodsOwnerId"), int):
+            abort(HTTPStatus.BAD_REQUEST, "goodsOwnerId is missing")
+        if error := validate(webhook):
+            abort(HTTPStatus.BAD_REQUEST, error)
+    return webhooks
+
+
+def _enqueue_webhooks(webhook_type: str, queue_url: Optional[str], validate: Callable[[dict], Optional[str]],
+                      event_key: Callable[[dict], Optional[Hashable]]):
+    _authorize()
+
+    if not queue_url:
+        logger.error(f"No sqs queue configured for ongoing {webhook_type} webhooks")
+        abort(HTTPStatus.SERVICE_UNAVAILABLE)
+
+    webhooks: List[dict] = _get_webhooks(validate)
+
+    fifo = queue_url.endswith(".fifo")
+    entries: List[dict] = []
+    for webhook in webhooks:
+        body = codec.dumps(webhook).decode()
+        attributes = {
+            "goodsOwnerId": {"DataType": "Number", "StringValue": str(webhook["goodsOwnerId"])},
+            "webhookType": {"DataType": "String", "StringValue": webhook_type},
+        }
+        entries.append(build_sqs_entry(
+            body, attributes,
+            # a fifo queue keeps the webhooks of a goods owner in order
+            group_id=str(webhook["goodsOwnerId"]) if fifo else None,
+            deduplication_id=get_deduplication_id(webhook, body, event_key) if fifo else None))
+
+    futures = get_sqs_batch_sender(queue_url, WebhookSettings.FLUSH_SECONDS).send(entries)
+    try:
+        message_ids = [future.result(WebhookSettings.SEND_TIMEOUT_SECONDS) for future in futures]
+    except Exception:
+        # ongoing retries webhooks that weren't accepted
+        abort(HTTPStatus.SERVICE_UNAVAILABLE)
+
+    return jsonify({"queued": len(message_ids)}), HTTPStatus.ACCEPTED